@@ -0,0 +1,158 @@
+"""基准测试：测量每回合的延迟分解（模型 / 环境 / 屏幕解析）和每小时局数
+
+在 PTY 中运行脚本化的假游戏（benchmarks/fake_game.py），模型请求发往本地模拟服务器
+（benchmarks/mock_llm_server.py），因此结果只反映框架本身的开销和设定的模型延迟。
+对每个并发数分别运行一次批量游戏，结果连同当前 git 提交写入 benchmarks/results/。
+
+    python -m benchmarks.bench --games 20 --workers 1,4 --latency 0.5 --delay 0.02
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_llm_server import start_server
+from src.batch import run_async_batch, run_batch
+
+PHASES = ("total", "model", "env", "parse")
+
+
+def percentile(values, p):
+    """最近秩百分位数，values 为空时返回 0"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def latency_breakdown(results):
+    """汇总所有回合的各阶段耗时（毫秒）"""
+    samples = {phase: [] for phase in PHASES}
+    for result in results:
+        for timing in result.get("turn_timings") or []:
+            samples["total"].append((timing["model"] + timing["env"] + timing["parse"]) * 1000)
+            for phase in PHASES[1:]:
+                samples[phase].append(timing[phase] * 1000)
+    return {
+        phase: {
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "mean": sum(values) / len(values) if values else 0.0,
+        }
+        for phase, values in samples.items()
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_bench(games, workers, model="gpt-mock", latency=0.5, jitter=0.0, delay=0.02, plan_mode=False,
+              chunk_delay=0.0, processor_options=None, use_async=False):
+    """对每个并发数运行一次批量游戏，返回基准结果，processor_options 为额外的处理器配置（如 stream）
+
+    use_async 为 True 时所有对局在一个进程的事件循环中进行（AsyncTextEnv），并发数为同时进行的局数。
+    """
+    server = None
+    if model != "solver":
+        server = start_server(latency=latency, jitter=jitter, chunk_delay=chunk_delay)
+        host, port = server.server_address
+        os.environ["OPENAI_BASE_URL"] = f"http://{host}:{port}/v1"
+        os.environ["OPENAI_API_KEY"] = "mock"
+    runs = []
+    try:
+        for worker_count in workers:
+            with tempfile.TemporaryDirectory() as log_dir:
+                config = {
+                    "environment": "text",
+                    "model": model,
+                    "screen_refresh": False,
+                    "plan_mode": plan_mode,
+                    "log_dir": log_dir,
+                    "env_options": {
+                        "game_command": [sys.executable, "-m", "benchmarks.fake_game", "--delay", str(delay)],
+                    },
+                }
+                config.update(processor_options or {})
+                if use_async:
+                    results, summary = run_async_batch(config, games, worker_count)
+                else:
+                    results, summary = run_batch(config, games, worker_count)
+            runs.append({
+                "workers": worker_count,
+                "summary": summary,
+                "turns": sum(len(r.get("turn_timings") or []) for r in results),
+                "errors": [r["error"] for r in results if r["error"]],
+                "latency_ms": latency_breakdown(results),
+            })
+    finally:
+        if server is not None:
+            server.shutdown()
+    return {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {
+            "games": games,
+            "model": model,
+            "latency": latency,
+            "jitter": jitter,
+            "delay": delay,
+            "plan_mode": plan_mode,
+            "chunk_delay": chunk_delay,
+            "processor_options": processor_options or {},
+            "async": use_async,
+        },
+        "runs": runs,
+    }
+
+
+def print_report(report):
+    for run in report["runs"]:
+        summary = run["summary"]
+        print(f"\nworkers={run['workers']}  games/hour={summary['games_per_hour']:.0f}  "
+              f"turns={run['turns']}  errors={len(run['errors'])}")
+        print(f"{'phase':<8}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}  (ms)")
+        for phase, stats in run["latency_ms"].items():
+            print(f"{phase:<8}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}{stats['mean']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量每回合延迟分解和每小时局数")
+    parser.add_argument("--games", type=int, default=20, help="每个并发数下的局数")
+    parser.add_argument("--workers", type=str, default="1,4", help="逗号分隔的并发数列表")
+    parser.add_argument("--model", type=str, default="gpt-mock", help="模型名称，solver 表示不调用模型")
+    parser.add_argument("--latency", type=float, default=0.5, help="模拟模型的平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="模拟模型延迟的抖动范围（秒）")
+    parser.add_argument("--delay", type=float, default=0.02, help="假游戏每个动画步骤的等待时间（秒）")
+    parser.add_argument("--plan-mode", action="store_true", help="使用计划模式")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="模拟模型每段输出的生成时间（秒）")
+    parser.add_argument("--stream", action="store_true", help="使用流式调用")
+    parser.add_argument("--action-first", action="store_true", help="使用行动优先的回复格式")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="在一个进程的事件循环中并发进行（AsyncTextEnv）")
+    parser.add_argument("--output-dir", type=str, default="benchmarks/results", help="结果目录")
+    args = parser.parse_args()
+
+    workers = [int(w) for w in args.workers.split(",") if w]
+    processor_options = {"stream": args.stream, "action_first": args.action_first}
+    report = run_bench(args.games, workers, args.model, args.latency, args.jitter, args.delay, args.plan_mode,
+                       args.chunk_delay, processor_options, args.use_async)
+    print_report(report)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    commit = (report["commit"] or "unknown")[:8]
+    path = os.path.join(args.output_dir, f"bench_{time.strftime('%Y%m%d_%H%M%S')}_{commit}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""模拟 BuckshotRouletteCLI 终端交互的脚本化游戏进程
+
+由 TextEnv 在 PTY 中启动，输出与 TextEnv 解析逻辑一致的菜单、牌桌和提示，
+游戏规则由 SimEnv 驱动。--delay 控制每个动画步骤的等待时间，用于模拟真实游戏的节奏。
+
+    python -m benchmarks.fake_game --seed 1 --delay 0.05
+"""
+import argparse
+import time
+
+from src.environment.parser import DOUBLE_PROMPT, RESTART_PROMPT, TURN_PROMPT
+from src.environment.sim_env import SimEnv, bullet_name, render_table
+
+CLEAR = "\x1b[2J\x1b[H"
+
+ITEM_NAMES_CN = {
+    "magnifying_glass": "放大镜",
+    "cigarette_pack": "香烟",
+    "beer": "啤酒",
+    "handsaw": "手锯",
+    "handcuffs": "手铐",
+    "burner_phone": "一次性手机",
+    "inverter": "逆转器",
+    "adrenaline": "肾上腺素",
+    "expired_medicine": "过期药品",
+}
+
+
+class FakeGame:
+    def __init__(self, seed=None, delay=0.05, max_games=1, startup_delay=0.0):
+        self.env = SimEnv(seed=seed, on_event=self.on_event)
+        self.delay = delay
+        self.max_games = max_games
+        self.startup_delay = startup_delay
+
+    def say(self, text):
+        print(text, flush=True)
+        if self.delay:
+            time.sleep(self.delay)
+
+    def on_event(self, kind, data):
+        """把 SimEnv 的事件输出为游戏文本"""
+        if kind == "round":
+            self.say(f"新的一轮开始了，每人 {data['max_health']} 点生命值")
+        elif kind == "load":
+            self.say(f"装填子弹：实弹{data['live']}颗 空包弹{data['blank']}颗")
+        elif kind == "shot":
+            shooter = "你" if data["shooter"] == "player" else "庄家"
+            target = "自己" if (data["target"] == "player") == (data["shooter"] == "player") else "对方"
+            self.say(f"{shooter}朝{target}开枪，打出了一颗{bullet_name(data['is_live'])}")
+        elif kind == "item":
+            self._say_item(data)
+        elif kind == "skip":
+            self.say("庄家被铐住了，跳过回合" if data["who"] == "dealer" else "你被铐住了，跳过回合")
+        elif kind == "round_end":
+            self.say("庄家倒下了" if data["winner"] == "player" else "你倒下了")
+
+    def _say_item(self, data):
+        item = data["item"]
+        if data["user"] == "dealer":
+            if item == "inverter":
+                self.say("庄家拼命砸碎了一个逆转器")
+            elif item == "beer":
+                self.say(f"庄家喝下啤酒，退出的子弹是一颗{bullet_name(data['is_live'])}")
+            else:
+                self.say(f"庄家使用了{ITEM_NAMES_CN[item]}")
+            return
+        if item == "magnifying_glass":
+            self.say("你举起放大镜看向枪膛……")
+            self.say(bullet_name(data["is_live"]))
+        elif item == "beer":
+            self.say(f"你喝下啤酒，退出了{bullet_name(data['is_live'])}")
+        elif item == "burner_phone":
+            if "position" in data:
+                self.say(f"第{data['position']}发是...")
+                self.say(bullet_name(data["is_live"]))
+            else:
+                self.say("真遗憾...")
+        elif item == "expired_medicine":
+            self.say("你吃下了过期药品，" + ("恢复了 2 点生命值" if data["healed"] else "失去了 1 点生命值"))
+        else:
+            self.say(f"你使用了{ITEM_NAMES_CN[item]}")
+
+    def draw(self):
+        """清屏并绘制牌桌"""
+        print(CLEAR, flush=True)
+        print(render_table(self.env.get_current_game_state()), flush=True)
+
+    def play_game(self):
+        """进行一局，直到分出胜负"""
+        env = self.env
+        env.start_game()
+        while not env.is_closed():
+            self.draw()
+            command = input(TURN_PROMPT).strip()
+            items = env.get_current_game_state()["player_items"]
+            if command == "+":
+                target = input("选择射击目标: 0.庄家 1.自己 ").strip()
+                if target in ("0", "1"):
+                    env.shoot("dealer" if target == "0" else "self")
+            elif command.isdigit() and int(command) < len(items):
+                item = items[int(command)]
+                if input(f"确认使用{ITEM_NAMES_CN[item]}？1.是 0.否 ").strip() != "1":
+                    continue
+                try:
+                    if item == "adrenaline":
+                        target = input("请输入要偷取的庄家道具编号: ").strip()
+                        env.use([command, target])
+                    else:
+                        env.use([command])
+                except ValueError as e:
+                    self.say(f"无效操作: {e}")
+            else:
+                self.say("无效输入")
+        return env.get_game_result()["result"]
+
+    def run(self):
+        # 模拟真实游戏启动和加载菜单的耗时
+        time.sleep(self.startup_delay)
+        print("恶魔轮盘", flush=True)
+        print("1.游戏规则 2.开始游戏", flush=True)
+        input("请选择: ")
+        input("请输入你的名字: ")
+        while True:
+            games = 0
+            while True:
+                result = self.play_game()
+                games += 1
+                if result != "win":
+                    break
+                if input(f"你赢了！{DOUBLE_PROMPT} 0.加倍 1.放弃 ").strip() != "0" or games >= self.max_games:
+                    break
+            # 选择重新开始时在同一个进程中直接开始新的一局
+            if input(f"游戏结束。{RESTART_PROMPT} 1.是 0.否 ").strip() != "1":
+                break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="脚本化的恶魔轮盘终端游戏")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--delay", type=float, default=0.05, help="每个动画步骤的等待时间（秒）")
+    parser.add_argument("--max-games", type=int, default=1, help="加倍后最多继续的局数")
+    parser.add_argument("--startup-delay", type=float, default=0.0, help="启动后显示菜单前的等待时间（秒）")
+    args = parser.parse_args()
+    try:
+        FakeGame(seed=args.seed, delay=args.delay, max_games=args.max_games, startup_delay=args.startup_delay).run()
+    except (EOFError, KeyboardInterrupt):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""兼容 OpenAI Chat Completions 接口的本地模拟服务器
+
+按配置的延迟（latency ± jitter 秒）返回回复，回复根据观察中的子弹数量给出合法的
+“Reasoning: ...\nAction: shoot ...”，用于在不调用真实模型的情况下测量框架自身的开销。
+流式请求（stream=True）以 SSE 逐段返回，每段间隔 chunk_delay 秒，模拟逐 token 生成。
+请求带 response_format（json_schema）或 tools 时以 JSON 内容或工具调用返回同样的行动。
+返回的用量中 prompt_tokens_details.cached_tokens 模拟服务商的前缀缓存（之前请求过的最长消息前缀）。
+bad_rate 为以一定概率返回格式错误或不合法行动的比例，用于测试行动修正和重新询问。
+error_rate 为以一定概率返回 429 或 500 的比例，slow_rate 为以一定概率额外延迟 slow_latency 秒的比例，
+用于测试 ModelRouter 的重试、对冲和备用模型。
+
+    python -m benchmarks.mock_llm_server --port 8765 --latency 0.5 --jitter 0.1 --chunk-delay 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BULLETS_PATTERN = re.compile(r'实弹(\d+)发，空包弹(\d+)发|弹 实(\d+) 空(\d+)')
+MAGNIFIER_PATTERN = re.compile(r'你的道具列表：\n(?:\d+\.\w+\n)*?(\d+)\.magnifying_glass|你: .*?magnifying_glass\[(\d+)')
+# 模拟推理部分的长度
+REASONING = "按子弹数量选择目标。" * 8
+CHUNK_SIZE = 4
+
+
+def content_text(content):
+    """消息内容可能是字符串，也可能是带 cache_control 的内容块列表"""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content or ""
+
+
+def mock_reply(messages):
+    """根据最后一条观察给出行动：实弹不少于空包弹时射击庄家，否则射击自己
+
+    系统提示要求计划模式时，有放大镜则先查看再按结果射击。
+    """
+    text = ""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            text = content_text(message.get("content"))
+            break
+    system = content_text(messages[0].get("content")) if messages else ""
+    plan_mode = "Plan:" in system
+    # 系统提示中行动在推理之前时，按行动优先的格式回复
+    action_first = "Action: <你的行动>\nReasoning:" in system
+    magnifier = MAGNIFIER_PATTERN.search(text)
+    if plan_mode and magnifier and "看到了一颗" not in text:
+        return f"Reasoning: 先查看当前子弹。\nPlan:\n1. use {magnifier.group(1) or magnifier.group(2)}\n2. if live then shoot dealer else shoot self"
+    if "看到了一颗实弹" in text:
+        target = "dealer"
+    elif "看到了一颗空包弹" in text:
+        target = "self"
+    else:
+        match = BULLETS_PATTERN.search(text)
+        live, blank = (int(match.group(1) or match.group(3)), int(match.group(2) or match.group(4))) if match else (1, 0)
+        target = "dealer" if live >= blank else "self"
+    if plan_mode:
+        return f"Reasoning: {REASONING}\nPlan:\n1. shoot {target}"
+    if action_first:
+        return f"Action: shoot {target}\nReasoning: {REASONING}"
+    return f"Reasoning: {REASONING}\nAction: shoot {target}"
+
+
+# 格式错误（可在本地修正）或不合法（需要重新询问）的行动
+BAD_ACTIONS = (
+    lambda action: f"`{action}`",
+    lambda action: action.replace("shoot", "Shoot the") + ".",
+    lambda action: "use 9",
+    lambda action: "",
+)
+
+
+def corrupt_reply(content, rng):
+    """把回复中的行动替换为随机一种错误写法"""
+    reasoning, _, action = content.rpartition("Action: ")
+    bad = rng.choice(BAD_ACTIONS)(action)
+    return f"{reasoning}Action: {bad}" if bad else reasoning.rstrip()
+
+
+def structured_arguments(content):
+    """把文本回复转换为结构化输出的 JSON 参数"""
+    reasoning, _, action = content.rpartition("Action: ")
+    return json.dumps({"reasoning": reasoning.replace("Reasoning: ", "").strip(), "action": action.strip()},
+                      ensure_ascii=False)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        with server.lock:
+            delay = server.latency + server.rng.uniform(-server.jitter, server.jitter)
+            if server.slow_rate > 0 and server.rng.random() < server.slow_rate:
+                delay += server.slow_latency
+            failed = server.error_rate > 0 and server.rng.random() < server.error_rate
+            status = server.rng.choice((429, 500))
+        if failed:
+            with server.lock:
+                server.requests += 1
+                server.errors += 1
+            self.send_error_reply(status)
+            return
+        if delay > 0:
+            time.sleep(delay)
+        content = mock_reply(request.get("messages", []))
+        retry = "你上一次给出的行动无效" in content_text((request.get("messages") or [{}])[-1].get("content"))
+        with server.lock:
+            bad = not retry and server.bad_rate > 0 and server.rng.random() < server.bad_rate
+        if bad:
+            content = corrupt_reply(content, server.rng)
+        prompt_tokens = sum(len(content_text(m.get("content"))) for m in request.get("messages", [])) // 2
+        completion_tokens = len(content) // 2
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": self.cached_prefix_tokens(request.get("messages", []))},
+        }
+        with server.lock:
+            server.requests += 1
+        if request.get("stream"):
+            self.send_stream(request, content, usage)
+            return
+        # 非流式请求等待整段回复“生成”完毕
+        time.sleep(server.chunk_delay * -(-len(content) // CHUNK_SIZE))
+        message = {"role": "assistant", "content": content}
+        if request.get("tools"):
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": "call_mock",
+                "type": "function",
+                "function": {"name": request["tools"][0]["function"]["name"], "arguments": structured_arguments(content)},
+            }]}
+        elif (request.get("response_format") or {}).get("type") == "json_schema":
+            message["content"] = structured_arguments(content)
+        body = json.dumps({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消了请求（如对冲请求中较慢的一个）
+            pass
+
+
+    def send_error_reply(self, status):
+        body = json.dumps({"error": {"message": "mock error", "type": "server_error", "code": status}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def cached_prefix_tokens(self, messages):
+        """模拟服务商的前缀缓存：返回之前请求过的最长消息前缀的 token 数，并记住本次的所有前缀"""
+        server = self.server
+        cached = 0
+        length = 0
+        with server.lock:
+            for i, message in enumerate(messages):
+                length += len(content_text(message.get("content"))) // 2
+                key = json.dumps(
+                    [[m.get("role"), content_text(m.get("content"))] for m in messages[:i + 1]], ensure_ascii=False
+                )
+                if key in server.prefixes:
+                    cached = length
+                else:
+                    server.prefixes.add(key)
+        return cached
+
+    def send_stream(self, request, content, usage):
+        """以 SSE 逐段发送回复，客户端提前断开时停止"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish_reason=None, usage_=None):
+            data = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [] if usage_ else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage_:
+                data["usage"] = usage_
+            self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            chunk({"role": "assistant", "content": ""})
+            for i in range(0, len(content), CHUNK_SIZE):
+                if self.server.chunk_delay:
+                    time.sleep(self.server.chunk_delay)
+                chunk({"content": content[i:i + CHUNK_SIZE]})
+            chunk({}, finish_reason="stop")
+            if (request.get("stream_options") or {}).get("include_usage"):
+                chunk({}, usage_=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_server(host="127.0.0.1", port=0, latency=0.5, jitter=0.0, seed=None, chunk_delay=0.0, bad_rate=0.0,
+                 error_rate=0.0, slow_rate=0.0, slow_latency=5.0):
+    """在后台线程中启动模拟服务器，返回 server，server.server_address 为实际监听地址"""
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.chunk_delay = chunk_delay
+    server.bad_rate = bad_rate
+    server.error_rate = error_rate
+    server.slow_rate = slow_rate
+    server.slow_latency = slow_latency
+    server.prefixes = set()
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.errors = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的模拟模型服务器")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="平均响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟的随机抖动范围（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="流式回复每段之间的间隔（秒）")
+    parser.add_argument("--bad-rate", type=float, default=0.0, help="返回错误行动的比例")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 429/500 的比例")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="额外延迟 slow-latency 秒的请求比例")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="慢请求的额外延迟（秒）")
+    args = parser.parse_args()
+    server = start_server(args.host, args.port, args.latency, args.jitter, chunk_delay=args.chunk_delay,
+                          bad_rate=args.bad_rate, error_rate=args.error_rate, slow_rate=args.slow_rate,
+                          slow_latency=args.slow_latency)
+    host, port = server.server_address
+    print(f"模拟模型服务器运行于 http://{host}:{port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""求解器耗时上界检查：在道具很多的局面上测量单次决策的耗时和展开的状态数
+
+每个局面用新的求解器（空置换表）决策一次，有局面超过 --max-seconds 时以非零状态退出，
+可在修改 src/solver.py 后运行。
+
+    python -m benchmarks.solver_bound --max-seconds 2
+"""
+import argparse
+import sys
+import time
+
+from src.solver import ITEM_TYPES, ExpectimaxSolver
+
+
+def bound_state(player_items, dealer_items, health=4, live=4, blank=4):
+    return {
+        "player_health": health,
+        "dealer_health": health,
+        "max_health": health,
+        "bullet_types": {"live_shell": live, "blank": blank},
+        "player_items": list(player_items),
+        "dealer_items": list(dealer_items),
+        "use_info": "",
+    }
+
+
+# 道具栏最多 8 个道具
+CASES = {
+    "four_items": bound_state(["handsaw", "beer", "magnifying_glass", "inverter"], []),
+    "six_types": bound_state(ITEM_TYPES[:6], ITEM_TYPES[:6]),
+    "full_inventory": bound_state(ITEM_TYPES[:8], ITEM_TYPES[1:]),
+    "full_duplicates": bound_state(["beer", "beer", "burner_phone", "burner_phone", "magnifying_glass",
+                                    "expired_medicine", "adrenaline", "adrenaline"], ITEM_TYPES[1:]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查求解器单次决策的耗时上界")
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="单次决策允许的最长耗时（秒）")
+    parser.add_argument("--max-nodes", type=int, default=None, help="求解器的搜索预算，默认使用求解器的默认值")
+    args = parser.parse_args()
+
+    failed = False
+    for name, state in CASES.items():
+        solver = ExpectimaxSolver() if args.max_nodes is None else ExpectimaxSolver(max_nodes=args.max_nodes)
+        start = time.perf_counter()
+        action = solver.decide(state)
+        elapsed = time.perf_counter() - start
+        ok = elapsed <= args.max_seconds
+        failed = failed or not ok
+        print(f"{name:<16}{action:<18}{elapsed:>8.3f}s  nodes={solver.nodes:<8}{'ok' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
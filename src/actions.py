@@ -0,0 +1,162 @@
+import re
+
+# 合法行动的格式：use <道具编号> [<庄家道具编号>] 或 shoot self/dealer
+ACTION_PATTERN = re.compile(r'^(use \d+(?: \d+)?|shoot (?:self|dealer))$')
+
+
+def validate_action(action, state):
+    """检查行动在当前状态下是否合法，合法返回 None，否则返回错误说明"""
+    if not ACTION_PATTERN.match(action):
+        return f"行动格式错误: {action}"
+    parts = action.split()
+    if parts[0] == "shoot":
+        return None
+    player_items = state["player_items"]
+    index = int(parts[1])
+    if index >= len(player_items):
+        return f"道具编号 {index} 超出范围，你只有 {len(player_items)} 个道具"
+    if player_items[index] == "adrenaline":
+        if len(parts) != 3:
+            return "使用肾上腺素需要指定要偷取的庄家道具编号"
+        dealer_items = state["dealer_items"]
+        target = int(parts[2])
+        if target >= len(dealer_items):
+            return f"庄家道具编号 {target} 超出范围，庄家只有 {len(dealer_items)} 个道具"
+        if dealer_items[target] == "adrenaline":
+            return "不能偷取庄家的肾上腺素"
+    elif len(parts) == 3:
+        return f"只有肾上腺素需要指定庄家道具编号，{player_items[index]} 不需要"
+    return None
+
+
+def legal_actions(state):
+    """列出当前状态下所有合法的行动"""
+    actions = ["shoot dealer", "shoot self"]
+    stealable = [j for j, item in enumerate(state["dealer_items"]) if item != "adrenaline"]
+    for i, item in enumerate(state["player_items"]):
+        if item == "adrenaline":
+            actions.extend(f"use {i} {j}" for j in stealable)
+        else:
+            actions.append(f"use {i}")
+    return actions
+
+
+def extract_action(response):
+    """取出回复中最后一个 Action: 之后的第一行，没有 Action: 时返回 None"""
+    if ACTION_MARK not in response:
+        return None
+    rest = response.split(ACTION_MARK)[-1].strip()
+    return _clean(rest.split("\n", 1)[0]) if rest else ""
+
+
+def action_schema(state):
+    """结构化输出（JSON / 工具调用）的参数格式，action 只能取当前合法的行动"""
+    return {
+        "type": "object",
+        "properties": {
+            "reasoning": {"type": "string"},
+            "action": {"type": "string", "enum": legal_actions(state)},
+        },
+        "required": ["reasoning", "action"],
+        "additionalProperties": False,
+    }
+
+
+# 本地修正时识别的射击目标和道具写法
+SHOOT_TARGETS = {
+    "self": "self", "myself": "self", "me": "self", "自己": "self",
+    "dealer": "dealer", "庄家": "dealer", "对方": "dealer",
+}
+LOOSE_SHOOT_PATTERN = re.compile(r'(?:shoot|射击)\s*(?:the\s+|at\s+)?(myself|self|me|dealer|自己|庄家|对方)')
+LOOSE_USE_PATTERN = re.compile(r'use\s+(?:item\s+)?#?(\w+)(?:\s+(?:and\s+|to\s+steal\s+|steal\s+)?#?(\w+))?')
+
+
+def _item_index(token, items):
+    """道具编号或道具名称转为编号，无法识别时返回 None"""
+    if token is None:
+        return None
+    if token.isdigit():
+        return int(token)
+    return items.index(token) if token in items else None
+
+
+def repair_action(text, state):
+    """把格式不规范的行动（多余的符号、大小写、道具名称代替编号、自然语言写法）修正为合法行动
+
+    在 text 中取最后一处可以识别的行动，修正后仍不合法或无法识别时返回 None。
+    """
+    text = re.sub(r'[`*"\'.,;:!。，；：！]', " ", text.lower())
+    text = " ".join(text.split())
+    candidates = []
+    for match in LOOSE_SHOOT_PATTERN.finditer(text):
+        candidates.append((match.start(), f"shoot {SHOOT_TARGETS[match.group(1)]}"))
+    for match in LOOSE_USE_PATTERN.finditer(text):
+        index = _item_index(match.group(1), state["player_items"])
+        if index is None:
+            continue
+        action = f"use {index}"
+        if index < len(state["player_items"]) and state["player_items"][index] == "adrenaline":
+            target = _item_index(match.group(2), state["dealer_items"])
+            if target is not None:
+                action += f" {target}"
+        candidates.append((match.start(), action))
+    for _, action in sorted(candidates, reverse=True):
+        if validate_action(action, state) is None:
+            return action
+    return None
+
+
+# 不可能再被后续文本延长的行动，流式输出时不必等到换行
+COMPLETE_ACTION_PATTERN = re.compile(r'shoot (?:self|dealer)')
+ACTION_MARK = "Action:"
+
+
+def _clean(text):
+    return " ".join(text.strip().strip("`").split())
+
+
+class ActionStreamParser:
+    """在流式回复中尽早找出完整的 Action: 行
+
+    feed() 每次加入新的文本片段，找到一行完整的行动（遇到换行，或 shoot self/dealer 这种
+    不会再变长的行动）时返回它，否则返回 None。回复结束时调用 finish() 取得最后未换行的行动。
+    同一个行动只返回一次，调用方校验不通过时可以继续 feed 等待后面的 Action: 行。
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.scan_from = 0
+        self.start = None
+
+    def feed(self, text):
+        self.buffer += text
+        while True:
+            if self.start is None:
+                index = self.buffer.find(ACTION_MARK, self.scan_from)
+                if index < 0:
+                    self.scan_from = max(len(self.buffer) - len(ACTION_MARK) + 1, 0)
+                    return None
+                self.start = index + len(ACTION_MARK)
+            rest = self.buffer[self.start:]
+            newline = rest.find("\n")
+            if newline >= 0:
+                action = _clean(rest[:newline])
+                self.scan_from = self.start + newline
+                self.start = None
+                if action:
+                    return action
+                continue
+            action = _clean(rest)
+            if COMPLETE_ACTION_PATTERN.fullmatch(action):
+                self.scan_from = len(self.buffer)
+                self.start = None
+                return action
+            return None
+
+    def finish(self):
+        """回复结束，返回最后一个未换行的行动"""
+        if self.start is None:
+            return None
+        action = _clean(self.buffer[self.start:])
+        self.start = None
+        return action or None
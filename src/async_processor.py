@@ -0,0 +1,144 @@
+import asyncio
+import copy
+import time
+
+from src.actions import validate_action
+from src.model import acall_openai_chat, last_call_attempts
+from src.processor import InteractionProcessor
+from src.speculation import speculative_states
+
+
+class AsyncInteractionProcessor(InteractionProcessor):
+    """InteractionProcessor 的异步版本，配合 AsyncTextEnv 使用
+
+    play、act 和模型调用都是协程，决策逻辑（求解器、计划、规则、缓存、上下文）与同步版本相同。
+    多局游戏可以作为多个任务在同一个事件循环中并发进行。暂不支持流式调用。
+    """
+
+    def __init__(self, env, **kwargs):
+        if kwargs.get("stream"):
+            raise ValueError("AsyncInteractionProcessor does not support stream")
+        super().__init__(env, **kwargs)
+
+    async def act(self, action):
+        action = action.split()
+        if action[0] == "shoot":
+            self.log(f"Shooting {action[1]}")
+            await self.env.shoot(action[1])
+
+        elif action[0] == "use":
+            item = self.resolve_item(action[1:])
+            if item is not None:
+                await self.env.use(action[1:], item)
+
+    async def achat(self, messages, **options):
+        """chat 的异步版本"""
+        if self.router is not None:
+            return await self.router.acall(messages, model=self.model, **options)
+        return await acall_openai_chat(messages, model=self.model, with_usage=True, **options)
+
+    async def speculative_chat(self, messages, options):
+        message, usage = await self.achat(messages, **options)
+        return message, usage, last_call_attempts()
+
+    def launch_speculation(self, speculation, target, use_info, mark):
+        speculation.task = asyncio.create_task(self.speculate_next(speculation, target, use_info, mark))
+
+    async def speculate_next(self, speculation, target, use_info, mark):
+        """speculate_next 的异步版本，没有采用的推测调用会被真正取消"""
+        line, state = await self.env.wait_for_shot(timeout=self.env.wait_timeout, since=mark)
+        if line is None:
+            return
+        candidates = speculative_states(state, target, "实弹" in line, use_info, self.speculate)
+        for _, next_state in candidates:
+            context = copy.deepcopy(self.context)
+            messages = self.build_messages(next_state, context)
+            task = asyncio.create_task(self.speculative_chat(messages, self.output_options(next_state)))
+            if not speculation.add(next_state, context, task):
+                task.cancel()
+                return
+            self.tracer.count("speculative_calls")
+
+    async def query_model(self, state):
+        """把当前状态发给模型，返回解析出的行动"""
+        hit = self.take_speculation(state)
+        if hit is not None:
+            context, task = hit
+            try:
+                result = await task
+            except Exception as e:
+                self.log(f"推测调用失败: {e}")
+                self.tracer.count("speculation_errors")
+            else:
+                response = self.use_speculation(context, result)
+                return await self.ensure_valid(self.parse_response(response, state), state)
+        messages = self.build_messages(state)
+        with self.tracer.span("llm_call", model=self.model, stream=False) as span:
+            message, usage = await self.achat(messages, **self.output_options(state))
+            self.record_call(span, usage)
+        response = self.response_text(message)
+        self.log("AI Response:", response)
+        self.record_decision(source="model", response=response)
+        return await self.ensure_valid(self.parse_response(response, state), state)
+
+    async def ensure_valid(self, action, state):
+        """行动不合法时只把错误发给模型重新询问，最多 action_retries 次，仍然不合法时由求解器决策"""
+        error = validate_action(action, state)
+        for _ in range(self.action_retries):
+            if error is None:
+                return action
+            self.log(f"行动无效（{error}），重新询问")
+            self.tracer.count("action_retries")
+            messages = self.retry_messages(state, error)
+            with self.tracer.span("llm_call", model=self.model, retry=True) as span:
+                message, usage = await self.achat(messages, **self.output_options(state))
+                self.record_call(span, usage)
+            action = self.parse_retry(self.response_text(message), state)
+            error = validate_action(action, state)
+        if error is None:
+            return action
+        return self.fallback_action(state, error)
+
+    async def play(self):
+        """进行一局游戏，返回本局结果统计"""
+        start_time = time.time()
+        error = None
+        self.decisions = 0
+        self.action_errors = 0
+        self.consecutive_errors = 0
+        self.turn_timings = []
+        self.trajectory_rows = []
+        if await self.env.start_game():
+            self.begin_game()
+            while not self.env.is_closed():
+                state = self.observe()
+                decision_state = None
+                with self.tracer.span("decision", index=self.decisions) as decision_span:
+                    decide_start = time.perf_counter()
+                    action = self.local_decision(state)
+                    if action is None:
+                        # 执行行动时环境会原地修改状态，缓存需要行动前的状态
+                        decision_state = copy.deepcopy(state)
+                        action = await self.query_model(state)
+                    else:
+                        self.cancel_speculation()
+                    self.log("AI Action:", action)
+                    decision_span.set(action=action)
+                    before = self.before_action(state, decide_start)
+                    try:
+                        self.log("等待行动...")
+                        with self.tracer.span("action", action=action):
+                            self.start_speculation(action, state)
+                            await self.act(action)
+                        self.after_action(action, before, decision_state)
+                    except ValueError as e:
+                        if self.on_action_error(e):
+                            error = str(e)
+                            break
+
+        else:
+            self.log("游戏开始失败")
+            error = "游戏开始失败"
+
+        self.stop_speculation()
+        return self.game_result(start_time, error)
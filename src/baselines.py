@@ -0,0 +1,13 @@
+import random
+
+from src.actions import legal_actions
+
+
+class RandomPolicy:
+    """在合法行动中均匀随机选择的基线策略，用于和模型、求解器对比"""
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def decide(self, game_state):
+        return self.rng.choice(legal_actions(game_state))
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def game_env_kwargs(config, game_id):
+    """每局使用的环境参数：单独的日志文件、录制文件和模拟环境种子"""
+    log_dir = config.get("log_dir", "/tmp")
+    env_kwargs = {"log_path": os.path.join(log_dir, f"game_output_{game_id}.log")}
+    if config.get("record_dir") and config["environment"] == "text":
+        env_kwargs["record_path"] = os.path.join(config["record_dir"], f"game_{game_id}.brrec")
+    if config["environment"] == "sim":
+        # 模拟环境按局编号派生种子，保证批量结果可复现
+        env_kwargs["seed"] = config.get("seed", 0) + game_id
+    return env_kwargs
+
+
+def failed_result(processor, error):
+    """对局中途抛出异常时的结果"""
+    return {
+        "result": "unfinished",
+        "rounds": 0,
+        "wins": 0,
+        "decisions": processor.decisions,
+        "wall_time": 0.0,
+        "error": f"{type(error).__name__}: {error}",
+    }
+
+
+def write_trajectory(config, processor, result):
+    """把本局的决策记录交给当前进程的 TrajectoryWriter"""
+    from src.main import get_trajectory_writer
+
+    writer = get_trajectory_writer(config)
+    if writer is not None:
+        writer.write_game(processor.trajectory_rows, result, game_id=result["game_id"])
+
+
+def play_one(config, game_id):
+    """在当前进程中进行一局游戏，返回本局结果
+
+    每局使用独立的环境和日志文件；配置了 sessions 时使用当前进程常驻的游戏进程。
+    """
+    from src.main import get_session_manager, make_env, make_processor
+
+    sessions = get_session_manager(config)
+    if sessions is not None:
+        # 使用常驻的游戏进程，结束后交还给 SessionManager 开始下一局
+        env = sessions.acquire()
+        log_path = env.output_file
+    else:
+        env_kwargs = game_env_kwargs(config, game_id)
+        env = make_env(config, **env_kwargs)
+        log_path = env_kwargs["log_path"]
+    processor = make_processor(env, config, verbose=False, policy_seed=config.get("seed", 0) + game_id)
+    try:
+        result = processor.play()
+    except Exception as e:
+        result = failed_result(processor, e)
+    finally:
+        if sessions is not None:
+            sessions.release(env)
+        else:
+            env.close()
+    result["game_id"] = game_id
+    result["log_path"] = log_path
+    write_trajectory(config, processor, result)
+    return result
+
+
+async def aplay_one(config, game_id):
+    """play_one 的异步版本，在当前事件循环中用 AsyncTextEnv 进行一局游戏"""
+    from src.main import make_env, make_processor
+
+    env_kwargs = game_env_kwargs(config, game_id)
+    env = make_env(config, use_async=True, **env_kwargs)
+    processor = make_processor(env, config, verbose=False, policy_seed=config.get("seed", 0) + game_id)
+    try:
+        result = await processor.play()
+    except Exception as e:
+        result = failed_result(processor, e)
+    finally:
+        env.close()
+    result["game_id"] = game_id
+    result["log_path"] = env_kwargs["log_path"]
+    write_trajectory(config, processor, result)
+    return result
+
+
+def print_progress(result, done, games):
+    print(
+        f"[{done}/{games}] game {result['game_id']}: {result['result']}, "
+        f"rounds={result['rounds']}, decisions={result['decisions']}, "
+        f"time={result['wall_time']:.1f}s"
+        + (f", error={result['error']}" if result["error"] else "")
+    )
+
+
+def summarize(results, wall_time):
+    """汇总批量运行的结果"""
+    total = len(results)
+    wins = sum(1 for r in results if r["result"] == "win")
+    losses = sum(1 for r in results if r["result"] == "loss")
+    return {
+        "games": total,
+        "wins": wins,
+        "losses": losses,
+        "unfinished": total - wins - losses,
+        "win_rate": wins / total if total else 0.0,
+        "avg_rounds": sum(r["rounds"] for r in results) / total if total else 0.0,
+        "avg_decisions": sum(r["decisions"] for r in results) / total if total else 0.0,
+        "avg_game_time": sum(r["wall_time"] for r in results) / total if total else 0.0,
+        "wall_time": wall_time,
+        "games_per_hour": total / wall_time * 3600 if wall_time > 0 else 0.0,
+    }
+
+
+def run_batch(config, games, workers, output=None):
+    """用 workers 个进程并行进行 games 局游戏，每局使用独立的环境、PTY 和日志文件
+
+    output 不为空时，每局结束后将结果以 JSONL 形式追加写入该文件。
+    """
+    results = []
+    start_time = time.time()
+    out_file = open(output, "a", encoding="utf-8") if output else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(play_one, config, game_id) for game_id in range(games)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print_progress(result, len(results), games)
+                if out_file:
+                    out_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out_file.flush()
+    finally:
+        if out_file:
+            out_file.close()
+
+    results.sort(key=lambda r: r["game_id"])
+    summary = summarize(results, time.time() - start_time)
+    print("批量运行结果:", json.dumps(summary, ensure_ascii=False, indent=2))
+    return results, summary
+
+
+def run_async_batch(config, games, concurrency, output=None):
+    """在当前进程的一个事件循环中同时进行最多 concurrency 局游戏（AsyncTextEnv + 异步模型调用）
+
+    与 run_batch 相比不需要每局一个进程和读取线程，适合大量并发、主要时间在等待模型的场景。
+    """
+    from src.main import close_trajectory_writer
+
+    if config.get("sessions"):
+        raise ValueError("sessions are not supported in async batch mode")
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_game(game_id):
+            async with semaphore:
+                return await aplay_one(config, game_id)
+
+        tasks = [asyncio.create_task(run_game(game_id)) for game_id in range(games)]
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            results.append(result)
+            print_progress(result, len(results), games)
+            if out_file:
+                out_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out_file.flush()
+
+    results = []
+    start_time = time.time()
+    out_file = open(output, "a", encoding="utf-8") if output else None
+    try:
+        asyncio.run(run_all())
+    finally:
+        if out_file:
+            out_file.close()
+        close_trajectory_writer()
+
+    results.sort(key=lambda r: r["game_id"])
+    summary = summarize(results, time.time() - start_time)
+    print("批量运行结果:", json.dumps(summary, ensure_ascii=False, indent=2))
+    return results, summary
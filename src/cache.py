@@ -0,0 +1,150 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonical_state(state):
+    """把游戏状态转为规范化的键：道具按类型排序，与道具在列表中的位置无关"""
+    return json.dumps([
+        state["player_health"],
+        state["dealer_health"],
+        state["max_health"],
+        state["bullet_types"]["live_shell"],
+        state["bullet_types"]["blank"],
+        sorted(state["player_items"]),
+        sorted(state["dealer_items"]),
+        state["use_info"].strip(),
+    ], ensure_ascii=False)
+
+
+def to_canonical_action(action, state):
+    """把带编号的行动转为按道具名称表示的行动，例如 use 1 -> use beer"""
+    parts = action.split()
+    if not parts or parts[0] != "use":
+        return " ".join(parts)
+    names = [state["player_items"][int(parts[1])]]
+    if len(parts) > 2:
+        names.append(state["dealer_items"][int(parts[2])])
+    return " ".join(["use"] + names)
+
+
+def from_canonical_action(action, state):
+    """把按道具名称表示的行动映射回当前道具列表中的编号，道具不存在时返回 None"""
+    parts = action.split()
+    if not parts or parts[0] != "use":
+        return action
+    if parts[1] not in state["player_items"]:
+        return None
+    indices = [str(state["player_items"].index(parts[1]))]
+    if len(parts) > 2:
+        if parts[2] not in state["dealer_items"]:
+            return None
+        indices.append(str(state["dealer_items"].index(parts[2])))
+    return " ".join(["use"] + indices)
+
+
+class DecisionCache:
+    """以规范化游戏状态为键的决策缓存
+
+    内存中为 LRU（最多 max_entries 条），db_path 不为空时同时写入 SQLite，
+    以便跨进程、跨运行复用。ttl 秒后条目过期（None 表示不过期）。
+    缓存中保存的是按道具名称表示的行动，取出时映射回当前的道具编号。
+    namespace 区分做出决策的模型和提示配置，作为键的前缀，不同命名空间的条目互不命中，
+    可以共用同一个 SQLite 文件。
+    """
+
+    def __init__(self, max_entries=4096, ttl=None, db_path=None, namespace=""):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, action TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            if ttl is not None:
+                self.db.execute("DELETE FROM decisions WHERE created < ?", (time.time() - ttl,))
+            self.db.commit()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key, action, created):
+        self.entries[key] = (action, created)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            if not self._expired(entry[1]):
+                self.entries.move_to_end(key)
+                return entry[0]
+            del self.entries[key]
+        if self.db is None:
+            return None
+        row = self.db.execute("SELECT action, created FROM decisions WHERE key = ?", (key,)).fetchone()
+        if row is None or self._expired(row[1]):
+            return None
+        self.disk_hits += 1
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def _key(self, state):
+        key = canonical_state(state)
+        return f"{self.namespace}\n{key}" if self.namespace else key
+
+    def get(self, state):
+        """查找当前状态的缓存决策，返回映射到当前道具编号的行动，未命中返回 None"""
+        key = self._key(state)
+        with self.lock:
+            action = self._lookup(key)
+            if action is not None:
+                action = from_canonical_action(action, state)
+            if action is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return action
+
+    def put(self, state, action):
+        """记录 state 下做出的行动，state 必须是执行行动之前的状态"""
+        key = self._key(state)
+        canonical = to_canonical_action(action, state)
+        created = time.time()
+        with self.lock:
+            self._remember(key, canonical, created)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO decisions (key, action, created) VALUES (?, ?, ?)",
+                    (key, canonical, created),
+                )
+                self.db.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,152 @@
+import json
+
+CONTEXT_POLICIES = ("full", "window", "round", "summary")
+
+
+def cached_tokens(usage):
+    """接口返回的用量中命中服务商前缀缓存的 prompt token 数，不支持时为 0"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def count_tokens(messages):
+    """按字符数粗略估算消息列表的 token 数，实际用量以接口返回的 usage 为准"""
+    text = "".join(message["content"] for message in messages)
+    # 中文约 1 字 1 token，英文约 4 字符 1 token，每条消息另加少量格式开销
+    ascii_count = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_count) + ascii_count // 4 + 4 * len(messages)
+
+
+class ContextManager:
+    """管理发送给模型的对话上下文
+
+    policy 可选：
+        - full：保留全部历史（原有行为）
+        - window：只保留系统提示和最近 max_turns 轮对话
+        - round：每次重新装弹（update_bullet_types）时清空历史
+        - summary：超过 max_turns 的旧对话被替换为一条结构化摘要
+    每次调用模型前通过 build() 获得消息列表，并记录该次调用的 token 统计。
+    """
+
+    def __init__(self, system_prompt, policy="full", max_turns=6):
+        if policy not in CONTEXT_POLICIES:
+            raise ValueError(f"Unsupported context policy: {policy}")
+        self.system_prompt = system_prompt
+        self.policy = policy
+        self.max_turns = max_turns
+        # 每个元素为一轮对话：{"observation", "response", "summary"}
+        self.turns = []
+        self.summary_lines = []
+        self.round_id = None
+        self.call_stats = []
+        # 观察的估计 token 数累计：实际使用的编码、同样的状态用 verbose 格式时
+        self.observation_tokens = 0
+        self.verbose_observation_tokens = 0
+
+    def on_round(self, round_id):
+        """装弹次数变化时调用，round 策略下清空历史"""
+        if self.round_id is not None and round_id != self.round_id and self.policy == "round":
+            self.turns = []
+        self.round_id = round_id
+
+    def add_observation(self, observation, state=None):
+        """加入新的观察，state 为当时的游戏状态，用于生成摘要"""
+        state = state or {}
+        bullets = state.get("bullet_types", {})
+        # 游戏状态会被环境原地修改，因此在加入时就取出摘要所需的字段
+        summary = {
+            "hp": [state.get("player_health"), state.get("dealer_health")],
+            "shells": [bullets.get("live_shell"), bullets.get("blank")],
+            "items": list(state.get("player_items", [])),
+            "action": None,
+        }
+        self.turns.append({"observation": observation, "response": None, "summary": summary})
+
+    def add_response(self, response, action=None):
+        """记录模型对最近一次观察的回复及解析出的行动"""
+        self.turns[-1]["response"] = response
+        self.turns[-1]["summary"]["action"] = action
+
+    def update_response(self, response):
+        """用完整回复替换最近一轮记录的回复（流式回复在后台读完之后）"""
+        if self.turns:
+            self.turns[-1]["response"] = response
+
+    def _summarize(self, turn):
+        """把一轮对话压缩为一行结构化摘要"""
+        return json.dumps(turn["summary"], ensure_ascii=False)
+
+    def _trim(self):
+        """按策略裁剪历史"""
+        if self.policy in ("window", "summary") and len(self.turns) > self.max_turns:
+            dropped = self.turns[:-self.max_turns]
+            self.turns = self.turns[-self.max_turns:]
+            if self.policy == "summary":
+                self.summary_lines.extend(self._summarize(turn) for turn in dropped)
+                self.summary_lines = self.summary_lines[-self.max_turns * 4:]
+
+    def build(self):
+        """生成本次调用的消息列表，并记录 token 统计"""
+        self._trim()
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.summary_lines:
+            messages.append({
+                "role": "user",
+                "content": "此前的行动摘要（hp=[你, 庄家], shells=[实弹, 空包弹]）：\n" + "\n".join(self.summary_lines),
+            })
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn["observation"]})
+            if turn["response"] is not None:
+                messages.append({"role": "assistant", "content": turn["response"]})
+        self.call_stats.append({
+            "messages": len(messages),
+            "estimated_prompt_tokens": count_tokens(messages),
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "cached_tokens": None,
+        })
+        return messages
+
+    def record_observation_tokens(self, encoded, verbose):
+        """记录一次观察编码前后的估计 token 数"""
+        self.observation_tokens += encoded
+        self.verbose_observation_tokens += verbose
+
+    def build_retry(self, retry_prompt):
+        """行动无效时重新询问的消息：只包含系统提示、当前观察和错误说明，不带历史对话"""
+        observation = self.turns[-1]["observation"] if self.turns else ""
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": observation + "\n" + retry_prompt},
+        ]
+        self.call_stats.append({
+            "messages": len(messages),
+            "estimated_prompt_tokens": count_tokens(messages),
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "cached_tokens": None,
+        })
+        return messages
+
+    def record_usage(self, usage):
+        """记录接口返回的实际 token 用量"""
+        if usage is None or not self.call_stats:
+            return
+        self.call_stats[-1]["prompt_tokens"] = usage.prompt_tokens
+        self.call_stats[-1]["completion_tokens"] = usage.completion_tokens
+        self.call_stats[-1]["cached_tokens"] = cached_tokens(usage)
+
+    def get_stats(self):
+        """返回所有调用的 token 统计汇总"""
+        total_estimated = sum(stat["estimated_prompt_tokens"] for stat in self.call_stats)
+        total_prompt = sum(stat["prompt_tokens"] or 0 for stat in self.call_stats)
+        total_completion = sum(stat["completion_tokens"] or 0 for stat in self.call_stats)
+        return {
+            "calls": len(self.call_stats),
+            "estimated_prompt_tokens": total_estimated,
+            "prompt_tokens": total_prompt,
+            "completion_tokens": total_completion,
+            "cached_tokens": sum(stat["cached_tokens"] or 0 for stat in self.call_stats),
+            "observation_tokens": self.observation_tokens,
+            "verbose_observation_tokens": self.verbose_observation_tokens,
+        }
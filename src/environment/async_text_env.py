@@ -0,0 +1,212 @@
+import asyncio
+import codecs
+import os
+
+from src.environment.parser import INPUT_PROMPTS, SHOT_PATTERN
+from src.environment.text_env import TextEnv
+
+
+class AsyncTextEnv(TextEnv):
+    """基于 asyncio 的 TextEnv
+
+    不使用读取线程：PTY 的 fd 通过 loop.add_reader 注册到事件循环，有数据时在循环中读取和解析，
+    start_game、wait_for、use、shoot、reset 都是协程，等待输出时不占用线程。
+    动作的输入和等待顺序使用 TextEnv 的步骤序列（_menu_steps、_use_steps 等），由协程版的 _run_steps 执行。
+    一个进程可以在同一个事件循环中同时驱动多局游戏。屏幕解析、状态跟踪和录制与 TextEnv 相同，
+    必须在事件循环中创建和使用。
+    """
+
+    def __init__(self, flush_delay=0.1, **kwargs):
+        super().__init__(**kwargs)
+        # 没有换行的残余输出在 flush_delay 秒内没有后续数据时作为一行处理（对应 TextEnv 的 select 超时）
+        self.flush_delay = flush_delay
+        self.loop = None
+        self.reading = False
+        self.waiters = []
+        self._decoder = None
+        self._buffer = ""
+        self._flush_handle = None
+
+    async def start_game(self):
+        """启动游戏进程"""
+        try:
+            self.loop = asyncio.get_running_loop()
+            self.master_fd = self._spawn()
+            os.set_blocking(self.master_fd, False)
+
+            mark = self.mark()
+            self._decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            self._buffer = ""
+            self.reading = True
+            self.loop.add_reader(self.master_fd, self._on_readable)
+
+            return await self._run_steps(self._menu_steps(mark))
+
+        except Exception:
+            return False
+
+    def _on_readable(self):
+        """fd 可读时由事件循环调用，读取并处理新输出"""
+        try:
+            data = os.read(self.master_fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            # 游戏进程退出时 pty 返回 EIO，fd 被关闭时为 EBADF，都按 EOF 处理
+            data = b""
+        if not data:
+            self._stop_reading()
+            return
+        if self.recorder is not None:
+            self.recorder.output(data)
+        self._buffer += self._decoder.decode(data)
+
+        # 处理完整行
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            self._process_line(line)
+        # 等待输入的提示没有换行，立即处理
+        if self._buffer and any(prompt in self._buffer for prompt in INPUT_PROMPTS):
+            self._process_line(self._buffer)
+            self._buffer = ""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._buffer.strip():
+            self._flush_handle = self.loop.call_later(self.flush_delay, self._flush_buffer)
+
+    def _flush_buffer(self):
+        """一段时间没有新数据，处理缓冲区"""
+        self._flush_handle = None
+        if self._buffer.strip():
+            self._process_line(self._buffer)
+        self._buffer = ""
+
+    def _stop_reading(self):
+        """读到 EOF 或环境关闭：注销 fd，处理剩余输出并唤醒所有等待者"""
+        if not self.reading:
+            return
+        self.reading = False
+        if self.master_fd is not None:
+            self.loop.remove_reader(self.master_fd)
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._buffer += self._decoder.decode(b"", final=True)
+        self._flush_buffer()
+        self._wake_waiters()
+
+    def _notify_output(self, clean_line, state=None):
+        super()._notify_output(clean_line, state)
+        if clean_line:
+            self._wake_waiters()
+
+    def _wake_waiters(self):
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _is_running(self):
+        """是否还可能有新的输出：fd 仍注册在事件循环中"""
+        return self.reading
+
+    async def _wait_for_line(self, patterns, timeout, since):
+        """等待 since 之后第一条匹配的输出行，返回 (序号, 行)，超时或进程退出返回 (None, None)"""
+        if patterns is not None and not isinstance(patterns, (list, tuple)):
+            patterns = [patterns]
+        deadline = self.loop.time() + timeout
+        while True:
+            seq, line = self._find_line(patterns, since)
+            if line is not None:
+                return seq, line
+            since = self.output_seq
+            remaining = deadline - self.loop.time()
+            if remaining <= 0 or not self._is_running():
+                return None, None
+            waiter = self.loop.create_future()
+            self.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait_for(self, patterns=None, timeout=10.0, since=None):
+        """等待 since 之后出现匹配 patterns 的输出行，或超时，参数和返回值与 TextEnv.wait_for 相同"""
+        if since is None:
+            since = self.mark()
+        _, line = await self._wait_for_line(patterns, timeout, since)
+        return line
+
+    async def wait_for_shot(self, timeout=10.0, since=None):
+        """等待 since 之后的第一发射击，参数和返回值与 TextEnv.wait_for_shot 相同"""
+        if since is None:
+            since = self.mark()
+        seq, line = await self._wait_for_line([SHOT_PATTERN], timeout, since)
+        return self._shot_at(seq, line)
+
+    async def _run_steps(self, steps):
+        """在事件循环中执行输入步骤序列，返回序列的返回值，步骤序列见 TextEnv._run_steps"""
+        reply = None
+        while True:
+            try:
+                patterns, timeout, since = steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            reply = await self._wait_for_line(patterns, timeout, since)
+
+    async def _wait_for_turn(self, since):
+        """等待重新轮到玩家，返回值同 TextEnv._wait_for_turn"""
+        return await self._run_steps(self._turn_steps(since))
+
+    async def use(self, items:list, item_name:str = "", is_dealer_item:bool = False):
+        await self._run_steps(self._use_steps(items, item_name, is_dealer_item))
+
+    async def shoot(self, target: str):
+        await self._run_steps(self._shoot_steps(target))
+
+    async def reset(self):
+        """重置游戏"""
+        reaping = self._stop_process()
+        if reaping is not None:
+            await reaping
+        self._stop_reading()
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            self.master_fd = None
+
+        self.game_log.clear()
+        self.rounds = 0
+        self.wins = 0
+        self.game_over = False
+        return await self.start_game()
+
+    def _stop_process(self):
+        """结束游戏进程，不阻塞事件循环
+
+        进程没有立即退出时，事件循环运行中在线程池里等待回收，返回对应的 future
+        （reset 等待它，close 不等待）；事件循环没有运行时直接等待，返回 None。
+        """
+        process, self.process = self.process, None
+        if process is None:
+            return None
+        process.terminate()
+        if process.poll() is not None:
+            return None
+        if self.loop is not None and self.loop.is_running():
+            return self.loop.run_in_executor(None, process.wait)
+        process.wait()
+        return None
+
+    def close(self):
+        """关闭环境"""
+        self._stop_process()
+        if self.loop is not None and not self.loop.is_closed():
+            self._stop_reading()
+        self.closed = True
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            self.master_fd = None
+        if self.recorder is not None:
+            self.recorder.close()
+        self.log_sink.close()
@@ -1,10 +1,42 @@
+from src.environment.belief import ShellBelief
+from src.tracing import NULL_TRACER
+
+
 class BaseEnv:
     def __init__(self):
-        pass
+        # 装弹次数，每次重新装弹时加一
+        self.load_count = 0
+        # 解析屏幕累计耗时（秒），用于区分环境等待和解析的耗时
+        self.parse_time = 0.0
+        # 由 InteractionProcessor 设置，用于记录等待回合和解析屏幕的耗时
+        self.tracer = NULL_TRACER
+        # 剩余子弹序列的信念状态，随装弹、射击、道具结果更新，也放在游戏状态的 belief 字段中供策略使用
+        self.belief = ShellBelief()
+
+    def start_game(self):
+        """开始游戏，成功时返回 True"""
+        raise NotImplementedError("This method should be implemented in subclasses.")
+
+    def get_current_game_state(self):
+        """返回当前游戏状态字典，格式见 TextEnv.current_game_state"""
+        raise NotImplementedError("This method should be implemented in subclasses.")
+
+    def get_current_screen(self):
+        raise NotImplementedError("This method should be implemented in subclasses.")
+
+    def is_closed(self):
+        raise NotImplementedError("This method should be implemented in subclasses.")
+
+    def close(self):
+        raise NotImplementedError("This method should be implemented in subclasses.")
     
     def shoot(self, target: str):
         raise NotImplementedError("This method should be implemented in subclasses.")
 
     def use(self, items: list[int], item_name: str):
         """如果用的是肾上腺素，item_name 是偷的道具的名称"""
+        raise NotImplementedError("This method should be implemented in subclasses.")
+
+    def get_game_result(self):
+        """返回本局结果统计，至少包含 result（win/loss/unfinished）、rounds 和 wins"""
         raise NotImplementedError("This method should be implemented in subclasses.")
\ No newline at end of file
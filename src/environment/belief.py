@@ -0,0 +1,119 @@
+from math import comb
+
+
+class ShellBelief:
+    """枪膛中剩余子弹序列的信念状态
+
+    记录装弹时的实弹/空包弹数量、已经打出或退出的子弹、放大镜和手机得知的确定位置，以及当前这一发
+    是否被逆转器逆转。所有可能的剩余序列是：已知位置固定、其余实弹在未知位置上任意排列，各排列等可能，
+    因此每个未知位置是实弹的概率都等于 未知实弹数 / 未知位置数，每次更新和查询单个位置都是 O(1)。
+
+    live/blank 与环境的 bullet_types 一致，是子弹逆转之前的原始类型的数量；逆转器只影响当前这一发，
+    live_probability(0) 和 current() 已考虑逆转。位置 offset 从当前这一发（0）开始计数。
+    """
+
+    def __init__(self):
+        self.load(0, 0)
+
+    def load(self, live, blank):
+        """重新装弹"""
+        self.live = live
+        self.blank = blank
+        self.fired = 0
+        # 已知位置（按装弹后的绝对位置）-> 原始类型是否为实弹
+        self.known = {}
+        self.known_live = 0
+        self.inverted = False
+
+    @property
+    def remaining(self):
+        return self.live + self.blank
+
+    def _set_known(self, position, is_live):
+        previous = self.known.get(position)
+        if previous is not None:
+            self.known_live -= previous
+        self.known[position] = is_live
+        self.known_live += is_live
+
+    def invert(self):
+        """逆转器翻转当前这一发"""
+        self.inverted = not self.inverted
+
+    def observe_current(self, is_live):
+        """看到了当前这一发（放大镜），is_live 为看到的类型（已逆转）"""
+        if self.remaining > 0:
+            self._set_known(self.fired, is_live != self.inverted)
+
+    def reveal(self, offset, is_live):
+        """得知第 offset 发（手机，offset 从 0 开始）的原始类型"""
+        if 0 <= offset < self.remaining:
+            if offset == 0:
+                self.observe_current(is_live)
+            else:
+                self._set_known(self.fired + offset, is_live)
+
+    def eject(self, is_live):
+        """当前这一发被打出或用啤酒退出，is_live 为实际表现出的类型（已逆转）"""
+        original = is_live != self.inverted
+        known = self.known.pop(self.fired, None)
+        if known is not None:
+            self.known_live -= known
+        if original:
+            self.live = max(self.live - 1, 0)
+        else:
+            self.blank = max(self.blank - 1, 0)
+        self.fired += 1
+        self.inverted = False
+        # 与观察矛盾的已知信息（例如漏掉了逆转）全部作废，退回到只按数量推断
+        if self.known_live > self.live or len(self.known) - self.known_live > self.blank:
+            self.known = {}
+            self.known_live = 0
+
+    def _original_probability(self, offset):
+        known = self.known.get(self.fired + offset)
+        if known is not None:
+            return float(known)
+        unknown = self.remaining - len(self.known)
+        if unknown <= 0:
+            return 0.0
+        return (self.live - self.known_live) / unknown
+
+    def live_probability(self, offset=0):
+        """第 offset 发是实弹的概率，当前这一发已考虑逆转"""
+        if not 0 <= offset < self.remaining:
+            return 0.0
+        p = self._original_probability(offset)
+        return 1.0 - p if offset == 0 and self.inverted else p
+
+    def probabilities(self):
+        """剩余每一发是实弹的概率，按顺序排列"""
+        return [self.live_probability(offset) for offset in range(self.remaining)]
+
+    def current(self):
+        """当前这一发确定为实弹返回 True，确定为空包弹返回 False，不确定返回 None"""
+        if self.remaining == 0:
+            return None
+        p = self.live_probability(0)
+        if p == 1.0:
+            return True
+        if p == 0.0:
+            return False
+        return None
+
+    def known_offsets(self):
+        """已知位置 {offset: 原始类型是否为实弹}，供求解器等策略使用"""
+        return {position - self.fired: is_live for position, is_live in self.known.items()}
+
+    def sequence_count(self):
+        """与所有观察一致的剩余子弹序列数"""
+        unknown = self.remaining - len(self.known)
+        return comb(unknown, self.live - self.known_live) if unknown >= 0 else 0
+
+    def describe(self):
+        """给模型看的每一发是实弹的概率"""
+        if self.remaining == 0:
+            return "无"
+        return "、".join(
+            f"第{offset + 1}发 {p * 100:.0f}%" for offset, p in enumerate(self.probabilities())
+        )
@@ -0,0 +1,116 @@
+import json
+import os
+import queue
+import threading
+import time
+
+
+class LogSink:
+    """后台线程批量写入的日志文件
+
+    write() 只把行放入队列，由后台线程持有长期打开的文件句柄批量写入，每隔 flush_interval
+    秒刷新一次。文件超过 max_bytes 字节（按 UTF-8 编码计算）时按 path.1、path.2 ... 轮转，
+    最多保留 backup_count 个。event_path 不为空时，event() 写入的结构化事件以 JSONL 形式写入
+    该文件，按同样的规则轮转。
+    """
+
+    def __init__(self, path, flush_interval=0.5, max_bytes=10 * 1024 * 1024, backup_count=3, event_path=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.event_path = event_path
+        self.queue = queue.Queue()
+        self.closed = False
+        self._file = open(path, "w", encoding="utf-8")
+        self._size = 0
+        self._event_file = open(event_path, "w", encoding="utf-8") if event_path else None
+        self._event_size = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, line):
+        """写入一行原始屏幕输出"""
+        if not self.closed:
+            self.queue.put((False, line))
+
+    def event(self, kind, **fields):
+        """写入一条结构化事件，未配置 event_path 时忽略"""
+        if self._event_file is not None and not self.closed:
+            fields["time"] = time.time()
+            fields["event"] = kind
+            self.queue.put((True, fields))
+
+    def _rotate(self, path, file):
+        """轮转日志文件，返回重新打开的文件"""
+        file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = f"{path}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{path}.{i + 1}")
+            os.replace(path, f"{path}.1")
+        return open(path, "w", encoding="utf-8")
+
+    def _append(self, path, file, size, text):
+        """写入一批内容，写入后超过 max_bytes 时先轮转，返回 (文件, 写入后的字节数)"""
+        length = len(text.encode("utf-8"))
+        if self.max_bytes and size + length > self.max_bytes and size > 0:
+            file = self._rotate(path, file)
+            size = 0
+        file.write(text)
+        return file, size + length
+
+    def _write_batch(self, batch):
+        lines = []
+        events = []
+        for is_event, item in batch:
+            if is_event:
+                events.append(json.dumps(item, ensure_ascii=False) + "\n")
+            else:
+                lines.append(f"{item}\n")
+        if lines:
+            self._file, self._size = self._append(self.path, self._file, self._size, "".join(lines))
+        if events:
+            self._event_file, self._event_size = self._append(
+                self.event_path, self._event_file, self._event_size, "".join(events)
+            )
+
+    def _flush(self):
+        self._file.flush()
+        if self._event_file is not None:
+            self._event_file.flush()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        running = True
+        while running:
+            timeout = max(self.flush_interval - (time.monotonic() - last_flush), 0.01)
+            batch = []
+            try:
+                item = self.queue.get(timeout=timeout)
+                batch.append(item)
+                # 一次取出队列中已有的所有内容
+                while True:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                batch = [item for item in batch if item is not None]
+                running = False
+            if batch:
+                self._write_batch(batch)
+            if not running or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+        self._file.close()
+        if self._event_file is not None:
+            self._event_file.close()
+
+    def close(self):
+        """写完队列中剩余的内容并关闭文件"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self._thread.join()
@@ -0,0 +1,127 @@
+import re
+from collections import deque
+from dataclasses import dataclass, field
+
+# 游戏中用于判断流程的关键提示
+TURN_PROMPT = "请输入你的道具编号来使用道具，输入+来选择射击目标:"
+RESTART_PROMPT = "重新开始？"
+DOUBLE_PROMPT = "加倍还是放弃？"
+# 游戏流程中等待输入的提示，出现时不必等待换行
+FLOW_PROMPTS = (TURN_PROMPT, RESTART_PROMPT, DOUBLE_PROMPT)
+# 开始菜单和输入玩家名称的提示，游戏内重新开始后可能再次出现
+START_MENU_PROMPT = "开始游戏"
+NAME_PROMPT = "名字"
+# 使用道具和射击过程中的提示：确认使用、肾上腺素选择要偷取的庄家道具、选择射击目标
+CONFIRM_PROMPT = "确认使用"
+STEAL_PROMPT = "偷取"
+TARGET_PROMPT = "射击目标"
+# 所有等待输入的提示，出现时不必等待换行
+INPUT_PROMPTS = FLOW_PROMPTS + (NAME_PROMPT, CONFIRM_PROMPT, STEAL_PROMPT, TARGET_PROMPT)
+
+ITEM_NAMES = (
+    "magnifying_glass",
+    "cigarette_pack",
+    "beer",
+    "handsaw",
+    "handcuffs",
+    "burner_phone",
+    "inverter",
+    "adrenaline",
+    "expired_medicine",
+)
+
+ITEM_PATTERN = re.compile(r'\d+\.(' + "|".join(ITEM_NAMES) + r')')
+BULLET_COUNT_PATTERN = re.compile(r'实弹(\d+)颗 空包弹(\d+)颗')
+# 手机在屏幕上的结果，以及记录在 use_info 中的信息
+PHONE_RESULT_PATTERN = re.compile(r'第(\d+)发是\.\.\.\n(实弹|空包弹)')
+PHONE_INFO_PATTERN = re.compile(r'第(\d+)发是(实弹|空包弹)')
+# 单行中所有需要处理的事件，一次扫描即可找出
+# 射击结果（玩家或庄家射出的子弹类型）
+SHOT_PATTERN = re.compile(r'打出了|是一颗')
+EVENT_PATTERN = re.compile(
+    r'(?P<shot>' + SHOT_PATTERN.pattern + r')'
+    r'|(?P<invert>拼命砸碎了一个)'
+    r'|(?P<turn>' + re.escape(TURN_PROMPT) + r')'
+    r'|(?P<bullets>实弹(?P<live>\d+)颗 空包弹(?P<blank>\d+)颗)'
+    r'|(?P<max_health>每人 (?P<health>\d+) 点生命值)'
+)
+HEALTH_ICON = "⚡"
+
+
+def scan_events(line):
+    """扫描一行输出中的事件，返回 [(事件类型, match)]
+
+    事件类型为 shot（射击结果）、invert（逆转器）、turn（轮到玩家）、
+    bullets（装弹数量）或 max_health（本轮生命值上限）。
+    """
+    return [(match.lastgroup, match) for match in EVENT_PATTERN.finditer(line)]
+
+
+@dataclass
+class StateSnapshot:
+    """从牌桌上解析出的双方生命值和道具"""
+    dealer_health: int | None = None
+    player_health: int | None = None
+    dealer_items: list[str] = field(default_factory=list)
+    player_items: list[str] = field(default_factory=list)
+
+
+class ScreenParser:
+    """随输出逐行增量解析牌桌
+
+    牌桌上半部分为庄家，下半部分为玩家。由于行属于哪一半取决于整屏的行数，
+    feed() 只记录生命值行和道具行的行号，snapshot() 时再按当前屏幕行数划分，
+    开销只与这些行的数量有关。max_lines 与 ScreenBuffer 的上限相同，
+    超出时和屏幕一起丢弃最旧的行及其记录，行号与有界的屏幕保持一致。
+    """
+
+    def __init__(self, max_lines=None):
+        self.max_lines = max_lines
+        self.reset()
+
+    def reset(self):
+        """清屏时调用"""
+        self.line_count = 0
+        self.first_line = 0
+        self.health_lines = deque()
+        self.item_lines = deque()
+
+    def feed(self, line):
+        """加入新的一行（屏幕上的每一行都需要加入，包括空行，以保持行号一致）"""
+        index = self.line_count
+        self.line_count += 1
+        if HEALTH_ICON in line:
+            self.health_lines.append((index, line.count(HEALTH_ICON)))
+        if "." in line:
+            items = ITEM_PATTERN.findall(line)
+            if items:
+                self.item_lines.append((index, items))
+        if self.max_lines is not None and self.line_count - self.first_line > self.max_lines:
+            self.first_line = self.line_count - self.max_lines
+            for lines in (self.health_lines, self.item_lines):
+                while lines and lines[0][0] < self.first_line:
+                    lines.popleft()
+
+    def snapshot(self):
+        """按当前屏幕划分上下两半，返回 StateSnapshot"""
+        half = self.first_line + (self.line_count - self.first_line) // 2
+        snapshot = StateSnapshot()
+        for index, count in self.health_lines:
+            if index < half:
+                snapshot.dealer_health = count
+            else:
+                snapshot.player_health = count
+        for index, items in self.item_lines:
+            if index < half:
+                snapshot.dealer_items.extend(items)
+            else:
+                snapshot.player_items.extend(items)
+        return snapshot
+
+
+def parse_screen(obs):
+    """一次性解析整屏文本"""
+    parser = ScreenParser()
+    for line in obs.split("\n"):
+        parser.feed(line)
+    return parser.snapshot()
@@ -0,0 +1,69 @@
+import gzip
+import struct
+import threading
+import time
+
+MAGIC = b"BRREC1\n"
+# 每条记录：相对时间（秒，float64）、类型（1 字节）、数据长度（uint32），后跟数据
+HEADER = struct.Struct("<dcI")
+# 记录类型：游戏输出的原始字节、发送给游戏的输入、环境层面的行动（如 shoot dealer、use 1 2）
+OUTPUT = b"o"
+INPUT = b"i"
+ACTION = b"a"
+
+
+class Recorder:
+    """把 TextEnv 会话的原始 PTY 输出、输入和行动带时间戳写入 gzip 压缩的二进制文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = gzip.open(path, "wb")
+        self.file.write(MAGIC)
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _write(self, kind, data):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(HEADER.pack(time.monotonic() - self.start, kind, len(data)))
+            self.file.write(data)
+
+    def output(self, data):
+        self._write(OUTPUT, data)
+
+    def input(self, command):
+        self._write(INPUT, command.encode("utf-8"))
+
+    def action(self, action):
+        self._write(ACTION, action.encode("utf-8"))
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_recording(path):
+    """读取录制文件，返回 [(相对时间, 类型, 数据)]
+
+    进程异常退出导致文件末尾不完整时，返回已完整读出的记录。
+    """
+    records = []
+    with gzip.open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是有效的录制文件: {path}")
+        try:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                timestamp, kind, length = HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    break
+                records.append((timestamp, kind, data))
+        except EOFError:
+            pass
+    return records
@@ -0,0 +1,144 @@
+import argparse
+import os
+import threading
+import time
+
+from src.environment.recording import ACTION, INPUT, OUTPUT, read_recording
+from src.environment.text_env import TextEnv
+
+
+class ReplayEnv(TextEnv):
+    """回放 TextEnv 录制文件的环境
+
+    不启动游戏进程，而是把录制的原始输出写入管道，由 TextEnv 原有的读取线程和解析逻辑处理，
+    因此可以在没有 BuckshotRouletteCLI 的情况下回归测试屏幕解析和状态跟踪。
+    回放与输入同步：录制中每条输入之前的输出写完后，等到环境发送了下一条输入才继续，
+    发送的输入与录制不一致时记录在 mismatches 中。speed 为 0 时尽可能快地回放，
+    否则按录制时的时间间隔除以 speed 回放（1 为原速）。
+    recorded_actions 为录制时执行的行动，可用 replay_session 按原样重新执行。
+    """
+
+    def __init__(self, recording_path, speed=0.0, **kwargs):
+        kwargs.setdefault("log_path", os.devnull)
+        super().__init__(**kwargs)
+        self.recording_path = recording_path
+        self.records = read_recording(recording_path)
+        self.recorded_inputs = [data.decode("utf-8") for _, kind, data in self.records if kind == INPUT]
+        self.recorded_actions = [data.decode("utf-8") for _, kind, data in self.records if kind == ACTION]
+        self.speed = speed
+        self.sent_inputs = []
+        self.mismatches = []
+        self.input_cond = threading.Condition()
+        self.feeder_thread = None
+        self._write_fd = None
+
+    def _spawn(self):
+        read_fd, self._write_fd = os.pipe()
+        self.feeder_thread = threading.Thread(target=self._feed, daemon=True)
+        self.feeder_thread.start()
+        return read_fd
+
+    def _feed(self):
+        """按录制顺序写入输出，遇到输入时等待环境发送对应的输入"""
+        expected_inputs = 0
+        last_time = 0.0
+        try:
+            for timestamp, kind, data in self.records:
+                if kind == OUTPUT:
+                    if self.speed > 0 and timestamp > last_time:
+                        time.sleep((timestamp - last_time) / self.speed)
+                    last_time = timestamp
+                    os.write(self._write_fd, data)
+                elif kind == INPUT:
+                    expected_inputs += 1
+                    with self.input_cond:
+                        while len(self.sent_inputs) < expected_inputs and not self.closed:
+                            self.input_cond.wait()
+                    if self.closed:
+                        return
+                    last_time = timestamp
+        except OSError:
+            # 环境已关闭，读取端不再存在
+            pass
+        finally:
+            os.close(self._write_fd)
+
+    def send_input(self, command: str):
+        """记录输入并让回放继续，不写入任何进程"""
+        if self.closed:
+            return False
+        with self.input_cond:
+            index = len(self.sent_inputs)
+            expected = self.recorded_inputs[index] if index < len(self.recorded_inputs) else None
+            if command != expected:
+                self.mismatches.append({"index": index, "expected": expected, "sent": command})
+            self.sent_inputs.append(command)
+            self.input_cond.notify_all()
+        self.log_sink.event("input", data=command)
+        return True
+
+    def close(self):
+        """关闭环境，停止回放"""
+        with self.input_cond:
+            self.closed = True
+            self.input_cond.notify_all()
+        # 先关闭读取端，阻塞在写入上的回放线程会随之退出
+        super().close()
+        if self.feeder_thread is not None:
+            self.feeder_thread.join(timeout=1)
+
+
+def replay_session(recording_path, speed=0.0, **kwargs):
+    """按录制的行动重新执行一局，返回回放结果（用于回归测试和复现问题）"""
+    env = ReplayEnv(recording_path, speed=speed, **kwargs)
+    start = time.perf_counter()
+    actions = 0
+    try:
+        if not env.start_game():
+            raise RuntimeError(f"回放启动失败: {recording_path}")
+        for action in env.recorded_actions:
+            if env.is_closed():
+                break
+            parts = action.split()
+            if parts[0] == "shoot":
+                env.shoot(parts[1])
+            else:
+                state = env.get_current_game_state()
+                item_name = state["player_items"][int(parts[1])]
+                if len(parts) > 2:
+                    item_name = state["dealer_items"][int(parts[2])]
+                env.use(parts[1:], item_name)
+            actions += 1
+        result = env.get_game_result()
+        result.update({
+            "actions": actions,
+            "elapsed": time.perf_counter() - start,
+            "mismatches": env.mismatches,
+            "final_state": env.get_current_game_state(),
+        })
+        return result
+    finally:
+        env.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放 TextEnv 录制文件")
+    parser.add_argument("recordings", nargs="+", help="录制文件路径")
+    parser.add_argument("--speed", type=float, default=0.0, help="回放速度，0 表示尽可能快，1 为原速")
+    args = parser.parse_args()
+    total_actions = 0
+    total_time = 0.0
+    for path in args.recordings:
+        result = replay_session(path, speed=args.speed)
+        total_actions += result["actions"]
+        total_time += result["elapsed"]
+        print(
+            f"{path}: {result['result']}, actions={result['actions']}, "
+            f"mismatches={len(result['mismatches'])}, time={result['elapsed']:.3f}s"
+        )
+    if total_time > 0:
+        print(f"共 {total_actions} 个行动，{total_actions / total_time:.0f} 个/秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+from collections import deque
+
+
+class ScreenBuffer:
+    """有界的终端屏幕模型
+
+    保存自上次清屏以来的输出行，最多 max_lines 行，超出时丢弃最旧的行。
+    text() 在需要时才拼接屏幕文本，结果缓存到下一次追加或清屏。
+    """
+
+    def __init__(self, max_lines=1000):
+        self.max_lines = max_lines
+        self.lines = deque(maxlen=max_lines)
+        self._text = ""
+
+    def clear(self, first_line=None):
+        """清屏，first_line 为清屏序列之后同一行的内容"""
+        self.lines.clear()
+        self._text = ""
+        if first_line is not None:
+            self.append(first_line)
+
+    def append(self, line):
+        """追加一行，超出上限时丢弃最旧的行"""
+        self.lines.append(line)
+        self._text = None
+
+    def text(self):
+        """当前屏幕的文本"""
+        if self._text is None:
+            self._text = "\n".join(self.lines)
+        return self._text
+
+    def __len__(self):
+        return len(self.lines)
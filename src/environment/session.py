@@ -0,0 +1,91 @@
+import threading
+
+
+class SessionManager:
+    """保持游戏进程常驻，避免每局重新启动进程和走一遍菜单
+
+    env_factory 创建 keep_alive 的 TextEnv。一局结束后进程停在重新开始提示，release 在后台线程中
+    回答提示开始下一局（restart），下次 acquire 直接拿到已经轮到玩家的环境。另外在后台预先启动
+    standby 个新进程，进程开始的局数达到 max_games 被回收或重新开始失败时，由备用进程顶上。
+    都没有时 acquire 返回一个新环境，由 start_game 冷启动。
+    """
+
+    def __init__(self, env_factory, max_games=50, standby=1):
+        self.env_factory = env_factory
+        self.max_games = max_games
+        self.standby_count = standby
+        # 正在后台重新开始的环境和预先启动的新环境，都是 (线程, 环境)
+        self.warm = []
+        self.standby = []
+        self.lock = threading.Lock()
+        self.closed = False
+        self.counts = {"restarts": 0, "standby_starts": 0, "cold_starts": 0, "recycled": 0, "failed": 0}
+        self._fill_standby()
+
+    def _prepare(self, env):
+        """在后台开始一局（新进程冷启动或游戏内重新开始），成功后 start_game 直接返回"""
+        if env.start_game():
+            env.prepared = True
+
+    def _start(self, env):
+        thread = threading.Thread(target=self._prepare, args=(env,), daemon=True)
+        thread.start()
+        return thread, env
+
+    def _fill_standby(self):
+        while not self.closed and len(self.standby) < self.standby_count:
+            self.standby.append(self._start(self.env_factory()))
+
+    def _pop(self):
+        """取出最早的一个正在准备的环境：优先使用重新开始的进程，其次是备用进程，都没有时返回 None"""
+        with self.lock:
+            if self.warm:
+                return self.warm.pop(0), "restarts"
+            if self.standby:
+                entry = self.standby.pop(0)
+                self._fill_standby()
+                return entry, "standby_starts"
+            return None, None
+
+    def acquire(self):
+        """取一个已经轮到玩家的环境，都没有准备好时返回新环境，由 start_game 冷启动
+
+        等待后台准备时不持有锁，不会阻塞同时进行的 release。
+        """
+        while True:
+            entry, name = self._pop()
+            if entry is None:
+                break
+            thread, env = entry
+            thread.join()
+            with self.lock:
+                self.counts[name if env.prepared else "failed"] += 1
+            if env.prepared:
+                return env
+            env.close()
+        with self.lock:
+            self.counts["cold_starts"] += 1
+        return self.env_factory()
+
+    def release(self, env):
+        """一局结束后交还环境：还能重新开始时在后台开始下一局，否则关闭进程"""
+        with self.lock:
+            if not self.closed and env.can_restart() and env.games_started < self.max_games:
+                self.warm.append(self._start(env))
+                return
+            if env.games_started >= self.max_games:
+                self.counts["recycled"] += 1
+        env.close()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def close(self):
+        """关闭所有常驻和备用的游戏进程"""
+        with self.lock:
+            self.closed = True
+            entries, self.warm, self.standby = self.warm + self.standby, [], []
+        for thread, env in entries:
+            thread.join()
+            env.close()
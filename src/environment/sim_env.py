@@ -0,0 +1,413 @@
+import random
+
+from src.environment.base_env import BaseEnv
+from src.environment.parser import PHONE_INFO_PATTERN
+
+ALL_ITEMS = [
+    "magnifying_glass",
+    "cigarette_pack",
+    "beer",
+    "handsaw",
+    "handcuffs",
+    "burner_phone",
+    "inverter",
+    "adrenaline",
+    "expired_medicine"
+]
+
+MAX_ITEMS = 8
+
+
+def bullet_name(is_live):
+    return "实弹" if is_live else "空包弹"
+
+
+def render_table(state, player_name="SAM"):
+    """把游戏状态渲染为与 BuckshotRouletteCLI 相同布局的牌桌：上半部分为庄家，下半部分为玩家"""
+    dealer_items = " ".join(f"{i}.{item}" for i, item in enumerate(state["dealer_items"]))
+    player_items = " ".join(f"{i}.{item}" for i, item in enumerate(state["player_items"]))
+    return "\n".join([
+        f"☠️ 庄家 {'⚡' * state['dealer_health']}",
+        f"庄家道具: {dealer_items}",
+        "-" * 30,
+        f"玩家道具: {player_items}",
+        f"{player_name} {'⚡' * state['player_health']}",
+    ])
+
+
+class SimEnv(BaseEnv):
+    """纯 Python 实现的恶魔轮盘模拟环境，不依赖外部游戏进程
+
+    与 TextEnv 提供相同的 shoot/use/get_current_game_state 接口和相同格式的 use_info，
+    可用于无界面的大批量对局、策略评估和回归测试。所有随机性来自 seed 初始化的 RNG，
+    相同 seed 和相同行动序列得到相同的对局。赢下 rounds_to_win 轮即获胜，生命值耗尽即失败。
+    screen_refresh 和 log_path 仅为与 TextEnv 保持相同的构造参数，模拟环境不写日志。
+    on_event 不为空时，每个游戏事件（开始新一轮、装弹、射击、使用道具、跳过回合、
+    一轮结束、游戏结束）都会以 on_event(事件类型, 数据字典) 的形式回调。
+    """
+
+    def __init__(self, seed=None, screen_refresh=True, log_path=None, rounds_to_win=3, on_event=None):
+        super().__init__()
+        self.rng = random.Random(seed)
+        self.on_event = on_event
+        self.rounds_to_win = rounds_to_win
+        self.closed = False
+        self.self_turn = False
+        self.rounds = 0
+        self.wins = 0
+        self.rounds_won = 0
+        self.game_over = False
+        self.shells = []
+        self.is_inverted = False
+        self.player_saw = False
+        self.dealer_saw = False
+        self.dealer_cuffed = False
+        self.player_cuffed = False
+        # 玩家刚因手铐跳过回合，在玩家再次行动前庄家不能再次使用手铐
+        self.player_cuff_cooldown = False
+        # 庄家知道的当前子弹（实际类型），None 表示未知
+        self.dealer_known = None
+        self.current_game_state = self._empty_state()
+
+    def _emit(self, kind, **data):
+        if self.on_event is not None:
+            self.on_event(kind, data)
+
+    def _empty_state(self):
+        return {
+            "max_health": 0,
+            "player_health": 0,
+            "dealer_health": 0,
+            "bullet_types": {
+                "live_shell": 0,
+                "blank": 0
+            },
+            "player_items": [],
+            "dealer_items": [],
+            "use_info": "",
+            "belief": self.belief
+        }
+
+    # ---------- BaseEnv 接口 ----------
+
+    def start_game(self):
+        """开始新的一局"""
+        self.closed = False
+        self.rounds = 0
+        self.wins = 0
+        self.rounds_won = 0
+        self.game_over = False
+        self._start_round()
+        return True
+
+    def get_current_game_state(self):
+        return self.current_game_state
+
+    def get_current_screen(self):
+        return render_table(self.current_game_state)
+
+    def is_closed(self):
+        return self.closed
+
+    def is_self_turn(self):
+        return self.self_turn
+
+    def close(self):
+        self.closed = True
+
+    def get_game_result(self):
+        if self.wins > 0:
+            result = "win"
+        elif self.game_over:
+            result = "loss"
+        else:
+            result = "unfinished"
+        return {"result": result, "rounds": self.rounds, "wins": self.wins}
+
+    def use(self, items: list, item_name: str = ""):
+        """使用道具，items 为道具编号字符串列表；两个编号时为肾上腺素偷取庄家道具"""
+        state = self.current_game_state
+        index = int(items[0])
+        if index >= len(state["player_items"]):
+            raise ValueError("Item ID out of range for player items")
+        item = state["player_items"][index]
+        if len(items) == 2:
+            if item != "adrenaline":
+                raise ValueError("First item must be adrenaline for stealing")
+            target = int(items[1])
+            if target >= len(state["dealer_items"]):
+                raise ValueError("Item ID out of range for dealer items")
+            stolen = state["dealer_items"][target]
+            if stolen == "adrenaline":
+                raise ValueError("Cannot steal adrenaline")
+            state["player_items"].pop(index)
+            state["dealer_items"].pop(target)
+            self._apply_player_item(stolen)
+        else:
+            if item == "adrenaline":
+                raise ValueError("Adrenaline usage requires a target item")
+            state["player_items"].pop(index)
+            self._apply_player_item(item)
+        if not self._check_round_end():
+            self._reload_if_empty()
+
+    def shoot(self, target: str):
+        if target not in ("dealer", "self"):
+            raise ValueError("目标必须是 'dealer' 或 'self'")
+        self.self_turn = False
+        is_live = self._fire("player", hit_player=target == "self", saw=self.player_saw)
+        if self._check_round_end():
+            return
+        if self._reload_if_empty():
+            return
+        if target == "self" and not is_live:
+            self.self_turn = True
+            return
+        self._dealer_phase()
+
+    # ---------- 装弹与轮次 ----------
+
+    def _start_round(self):
+        """开始新的一轮：随机生命值上限，清空道具后装弹"""
+        state = self._empty_state()
+        max_health = self.rng.randint(2, 4)
+        state["max_health"] = max_health
+        state["player_health"] = max_health
+        state["dealer_health"] = max_health
+        self.current_game_state = state
+        self.rounds += 1
+        self._emit("round", max_health=max_health)
+        self._load()
+
+    def _load(self):
+        """装弹并给双方发放相同数量的道具，装弹后由玩家先行动"""
+        state = self.current_game_state
+        total = self.rng.randint(2, 8)
+        live = self.rng.randint(1, total - 1)
+        self.shells = [True] * live + [False] * (total - live)
+        self.rng.shuffle(self.shells)
+        state["bullet_types"]["live_shell"] = live
+        state["bullet_types"]["blank"] = total - live
+        state["use_info"] = ""
+        count = self.rng.randint(1, 4)
+        for items in (state["player_items"], state["dealer_items"]):
+            for _ in range(count):
+                if len(items) < MAX_ITEMS:
+                    items.append(self.rng.choice(ALL_ITEMS))
+        self.is_inverted = False
+        self.belief.load(live, total - live)
+        self.player_saw = False
+        self.dealer_saw = False
+        self.player_cuffed = False
+        self.dealer_cuffed = False
+        self.player_cuff_cooldown = False
+        self.dealer_known = None
+        self.load_count += 1
+        self.self_turn = True
+        self._emit("load", live=live, blank=total - live)
+
+    def _reload_if_empty(self):
+        """子弹打完时重新装弹，返回是否装弹"""
+        if self.shells:
+            return False
+        self._load()
+        return True
+
+    def _check_round_end(self):
+        """检查本轮是否结束，结束时开始下一轮或结束游戏，返回是否结束"""
+        state = self.current_game_state
+        if state["player_health"] <= 0:
+            state["player_health"] = 0
+            self.game_over = True
+            self.self_turn = False
+            self.closed = True
+            self._emit("round_end", winner="dealer")
+            self._emit("game_end", result="loss")
+            return True
+        if state["dealer_health"] <= 0:
+            self.rounds_won += 1
+            self._emit("round_end", winner="player")
+            if self.rounds_won >= self.rounds_to_win:
+                state["dealer_health"] = 0
+                self.wins += 1
+                self.self_turn = False
+                self.closed = True
+                self._emit("game_end", result="win")
+            else:
+                self._start_round()
+            return True
+        return False
+
+    # ---------- 子弹与信息 ----------
+
+    def _fire(self, shooter, hit_player, saw):
+        """shooter（player/dealer）射出当前子弹，hit_player 表示被射击的是否为玩家，返回实际是否为实弹"""
+        state = self.current_game_state
+        # 手锯只作用于这一发
+        self.player_saw = self.dealer_saw = False
+        is_live = self._eject()
+        if is_live:
+            damage = 2 if saw else 1
+            if hit_player:
+                state["player_health"] -= damage
+            else:
+                state["dealer_health"] -= damage
+        self._emit("shot", shooter=shooter, target="player" if hit_player else "dealer", is_live=is_live, saw=saw)
+        return is_live
+
+    def _eject(self):
+        """移除当前子弹并同步计数和使用信息，返回实际是否为实弹"""
+        state = self.current_game_state
+        original = self.shells.pop(0)
+        if original:
+            state["bullet_types"]["live_shell"] -= 1
+        else:
+            state["bullet_types"]["blank"] -= 1
+        is_live = original != self.is_inverted
+        self.is_inverted = False
+        self.belief.eject(is_live)
+        self.dealer_known = None
+        self._update_use_info_after_eject()
+        return is_live
+
+    def _update_use_info_after_eject(self):
+        """当前子弹离开枪膛后：放大镜和逆转器信息失效，手机信息的编号前移"""
+        lines = []
+        for line in self.current_game_state["use_info"].split("\n"):
+            if not line or "放大镜" in line or "逆转器" in line:
+                continue
+            if "手锯" in line and not self.player_saw:
+                continue
+            if "手铐" in line and not self.dealer_cuffed:
+                continue
+            if "手机" in line:
+                match = PHONE_INFO_PATTERN.search(line)
+                if not match or int(match.group(1)) <= 1:
+                    continue
+                line = f"你使用了手机，第{int(match.group(1)) - 1}发是{match.group(2)}"
+            lines.append(line)
+        self.current_game_state["use_info"] = "".join(line + "\n" for line in lines)
+
+    def update_use_info(self, obs):
+        """更新使用道具后的信息"""
+        self.current_game_state["use_info"] += obs + "\n"
+
+    def _apply_player_item(self, item):
+        state = self.current_game_state
+        result = {}
+        if item == "magnifying_glass":
+            is_live = self.shells[0] != self.is_inverted
+            self.update_use_info(f"你使用了放大镜，看到了一颗{bullet_name(is_live)}")
+            self.belief.observe_current(is_live)
+            result["is_live"] = is_live
+        elif item == "cigarette_pack":
+            state["player_health"] = min(state["max_health"], state["player_health"] + 1)
+        elif item == "beer":
+            result["is_live"] = self._eject()
+        elif item == "handsaw":
+            self.player_saw = True
+            self.update_use_info("你使用了手锯，下一次射击伤害提升至2点")
+        elif item == "handcuffs":
+            self.dealer_cuffed = True
+            self.update_use_info("你使用了手铐，使庄家跳过下个回合")
+        elif item == "burner_phone":
+            if len(self.shells) < 2:
+                self.update_use_info("你使用了手机，但没有任何信息")
+            else:
+                position = self.rng.randint(2, len(self.shells))
+                self.update_use_info(f"你使用了手机，第{position}发是{bullet_name(self.shells[position - 1])}")
+                self.belief.reveal(position - 1, self.shells[position - 1])
+                result["position"] = position
+                result["is_live"] = self.shells[position - 1]
+        elif item == "inverter":
+            self.is_inverted = not self.is_inverted
+            self.belief.invert()
+            self.update_use_info("你使用了逆转器，逆转了当前子弹类型")
+        elif item == "expired_medicine":
+            result["healed"] = self.rng.random() < 0.5
+            if result["healed"]:
+                state["player_health"] = min(state["max_health"], state["player_health"] + 2)
+            else:
+                state["player_health"] -= 1
+        self._emit("item", user="player", item=item, **result)
+
+    # ---------- 庄家 ----------
+
+    def _dealer_phase(self):
+        """玩家回合结束后由庄家行动，直到重新轮到玩家或本轮结束"""
+        if self.dealer_cuffed:
+            self.dealer_cuffed = False
+            self._clear_cuffs_info()
+            self._emit("skip", who="dealer")
+            self.self_turn = True
+            return
+        while True:
+            keep_turn = self._dealer_turn()
+            if self._check_round_end() or self._reload_if_empty():
+                return
+            if keep_turn:
+                continue
+            if self.player_cuffed:
+                self.player_cuffed = False
+                self.player_cuff_cooldown = True
+                self._emit("skip", who="player")
+                continue
+            self.player_cuff_cooldown = False
+            self.self_turn = True
+            return
+
+    def _clear_cuffs_info(self):
+        """庄家跳过回合后手铐信息失效"""
+        lines = [line for line in self.current_game_state["use_info"].split("\n") if line and "手铐" not in line]
+        self.current_game_state["use_info"] = "".join(line + "\n" for line in lines)
+
+    def _dealer_use(self, item, **result):
+        self.current_game_state["dealer_items"].remove(item)
+        self._emit("item", user="dealer", item=item, **result)
+
+    def _dealer_turn(self):
+        """庄家使用道具并射击，返回庄家是否继续行动（射击自己且为空包弹）"""
+        state = self.current_game_state
+        items = state["dealer_items"]
+        # 逆转器只影响当前这一发
+        live = sum(self.shells[1:]) + (self.shells[0] != self.is_inverted)
+        if live == 0 or live == len(self.shells):
+            self.dealer_known = live > 0
+        if "cigarette_pack" in items and state["dealer_health"] < state["max_health"]:
+            self._dealer_use("cigarette_pack")
+            state["dealer_health"] += 1
+        if "expired_medicine" in items and 1 < state["dealer_health"] <= state["max_health"] - 2:
+            healed = self.rng.random() < 0.5
+            self._dealer_use("expired_medicine", healed=healed)
+            if healed:
+                state["dealer_health"] += 2
+            else:
+                state["dealer_health"] -= 1
+        if self.dealer_known is None and "magnifying_glass" in items:
+            self._dealer_use("magnifying_glass")
+            self.dealer_known = self.shells[0] != self.is_inverted
+        if self.dealer_known is None and "beer" in items and len(self.shells) > 1:
+            self._dealer_use("beer", is_live=self.shells[0] != self.is_inverted)
+            self._eject()
+        if self.dealer_known is False and "inverter" in items:
+            self._dealer_use("inverter")
+            self.is_inverted = not self.is_inverted
+            self.belief.invert()
+            self.dealer_known = True
+        if not self.player_cuffed and not self.player_cuff_cooldown and "handcuffs" in items and len(self.shells) > 1:
+            self._dealer_use("handcuffs")
+            self.player_cuffed = True
+        if self.dealer_known is True and "handsaw" in items and not self.dealer_saw:
+            self._dealer_use("handsaw")
+            self.dealer_saw = True
+
+        if self.dealer_known is None:
+            counts = self.current_game_state["bullet_types"]
+            if counts["live_shell"] != counts["blank"]:
+                shoot_player = counts["live_shell"] > counts["blank"]
+            else:
+                shoot_player = self.rng.random() < 0.5
+        else:
+            shoot_player = self.dealer_known
+        is_live = self._fire("dealer", hit_player=shoot_player, saw=self.dealer_saw)
+        return not shoot_player and not is_live
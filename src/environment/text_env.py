@@ -1,3 +1,4 @@
+import copy
 import subprocess
 import threading
 import queue
@@ -6,19 +7,67 @@ import re
 import pty
 import os
 import select
+import codecs
+import errno
+from collections import deque
 from src.environment.base_env import BaseEnv
+from src.environment.log_sink import LogSink
+from src.environment.parser import (
+    BULLET_COUNT_PATTERN,
+    CONFIRM_PROMPT,
+    DOUBLE_PROMPT,
+    INPUT_PROMPTS,
+    NAME_PROMPT,
+    PHONE_INFO_PATTERN,
+    PHONE_RESULT_PATTERN,
+    RESTART_PROMPT,
+    SHOT_PATTERN,
+    START_MENU_PROMPT,
+    STEAL_PROMPT,
+    TARGET_PROMPT,
+    TURN_PROMPT,
+    ScreenParser,
+    parse_screen,
+    scan_events,
+)
+from src.environment.recording import Recorder
+from src.environment.screen import ScreenBuffer
+
+# 使用后会在下一次轮到玩家之前输出结果的道具
+RESULT_ITEMS = ("magnifying_glass", "beer", "burner_phone")
+
 
 class TextEnv(BaseEnv):
-    def __init__(self, screen_refresh=True):
+    def __init__(self, screen_refresh=True, wait_timeout=60.0, input_timeout=3.0, log_path="/tmp/game_output.log",
+                 log_flush_interval=0.5, log_max_bytes=10 * 1024 * 1024, log_backup_count=3, event_log=False,
+                 max_screen_lines=1000, max_queued_lines=1000, game_command=None, record_path=None, keep_alive=False):
         super().__init__()
         self.process = None
-        self.output_queue = queue.Queue()
+        self.master_fd = None
+        # 启动游戏的命令，默认为 BuckshotRouletteCLI
+        self.game_command = game_command or ['python', 'BuckshotRouletteCLI/br.py']
+        # 输出队列和游戏日志都有上限，超出时丢弃最旧的行，保证长时间运行时内存不增长
+        self.output_queue = queue.Queue(maxsize=max_queued_lines)
         self.output_thread = None
-        self.game_log = ""
+        self.game_log = deque(maxlen=max_queued_lines)
         self.screen_refresh = screen_refresh
-        self.current_screen_lines = []
+        self.screen = ScreenBuffer(max_lines=max_screen_lines)
+        self.parser = ScreenParser(max_lines=max_screen_lines)
+        # 等待游戏输出的超时时间：wait_timeout 用于等待回合/结果，input_timeout 用于等待输入后的中间提示
+        self.wait_timeout = wait_timeout
+        self.input_timeout = input_timeout
+        # 最近输出的行及其序号，用于 wait_for 的事件通知
+        self.output_cond = threading.Condition()
+        self.output_seq = 0
+        self.recent_output = deque(maxlen=512)
+        # 最近一发射击的 (输出序号, 射出之后的状态副本)，由读取线程在处理射击行时生成
+        self.shot_state = None
         self.self_turn = False
         self.is_inverted = False
+        # 本局统计：开始的轮数、赢下的次数（出现加倍提示）、是否已出现重新开始提示
+        self.rounds = 0
+        self.wins = 0
+        self.game_over = False
         self.current_game_state = {
             "max_health": 0,
             "player_health": 0,
@@ -29,7 +78,8 @@ class TextEnv(BaseEnv):
             },
             "player_items": [],
             "dealer_items": [],
-            "use_info": ""
+            "use_info": "",
+            "belief": self.belief
         }
         self.ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
         self.icon_text_mapping = {
@@ -63,10 +113,26 @@ class TextEnv(BaseEnv):
             "health": "⚡",
             "dealer": "☠️" 
         }
-        self.output_file = "/tmp/game_output.log"
-        with open(self.output_file, 'w') as f:
-            f.write("")  # 清空文件内容
+        self.output_file = log_path
+        # 日志由后台线程批量写入，event_log 为 True 时在旁边额外写一份 JSONL 事件日志
+        self.log_sink = LogSink(
+            log_path,
+            flush_interval=log_flush_interval,
+            max_bytes=log_max_bytes,
+            backup_count=log_backup_count,
+            event_path=f"{log_path}.events.jsonl" if event_log else None,
+        )
+        # record_path 不为空时录制原始输出、输入和行动，可用 ReplayEnv 回放
+        self.recorder = Recorder(record_path) if record_path else None
         self.closed = False
+        # keep_alive 为 True 时一局结束后不退出游戏进程，停在重新开始提示，下次 start_game 在游戏内重新开始
+        self.keep_alive = keep_alive
+        # keep_alive 时本局已结束、进程停在重新开始提示；与 closed 分开，读取线程继续运行
+        self.finished = False
+        # 由 SessionManager 在后台提前开始、已经轮到玩家的一局，start_game 直接返回
+        self.prepared = False
+        # 这个游戏进程中已经开始的局数
+        self.games_started = 0
     
     def _clean_ansi(self, text):
         """移除 ANSI 转义序列"""
@@ -77,118 +143,264 @@ class TextEnv(BaseEnv):
         clear_patterns = ['\x1B[2J', '\x1B[H', '\x1Bc', '\033[2J', '\033[H', '\033c']
         return any(pattern in text for pattern in clear_patterns)
     
+    def _spawn(self):
+        """启动游戏进程，返回用于读写的 fd"""
+        # 使用 pty 创建伪终端
+        master, slave = pty.openpty()
+        
+        self.process = subprocess.Popen(
+            self.game_command,
+            stdin=slave,
+            stdout=slave,
+            stderr=slave,
+            text=True,
+            universal_newlines=True
+        )
+        
+        # 关闭从进程的 pty 端
+        os.close(slave)
+        return master
+
     def start_game(self):
-        """启动游戏进程"""
+        """启动游戏进程；keep_alive 时如果进程还停在重新开始提示，在游戏内重新开始"""
+        if self.prepared:
+            self.prepared = False
+            return True
+        if self.keep_alive and self.can_restart():
+            return self.restart()
         try:
-            # 使用 pty 创建伪终端
-            master, slave = pty.openpty()
-            
-            self.process = subprocess.Popen(
-                ['python', 'BuckshotRouletteCLI/br.py'],
-                stdin=slave,
-                stdout=slave,
-                stderr=slave,
-                text=True,
-                universal_newlines=True
-            )
-            
-            # 关闭从进程的 pty 端
-            os.close(slave)
-            
-            # 将 master 转换为文件对象
-            self.master_fd = master
+            self.master_fd = self._spawn()
             
             # 启动输出读取线程
+            mark = self.mark()
             self.output_thread = threading.Thread(target=self._read_pty_output, daemon=True)
             self.output_thread.start()
             
-            # 等待游戏初始化
-            time.sleep(1)
-            # 输入 2
-            self.send_input("2")
-            time.sleep(1)
-            # 输入玩家名称
-            self.send_input("SAM")
-            time.sleep(25)
-
-            self.update_other_game_state(self.get_current_screen())
-
-            return True
+            return self._run_steps(self._menu_steps(mark))
             
-        except Exception as e:
+        except Exception:
             return False
+
+    def can_restart(self):
+        """一局已结束、进程仍在运行并停在重新开始提示"""
+        return self.game_over and self.process is not None and self.process.poll() is None and self._is_running()
+
+    def restart(self):
+        """回答重新开始提示，在同一个游戏进程中开始新的一局，途中出现开始菜单或名称输入时照常回答"""
+        self.game_log.clear()
+        self.rounds = 0
+        self.wins = 0
+        self.game_over = False
+        self.clear_state()
+        self.finished = False
+        mark = self.mark()
+        self.send_input("1")
+        while True:
+            seq, line = self._wait_for_line(
+                [TURN_PROMPT, START_MENU_PROMPT, NAME_PROMPT], self.wait_timeout, mark
+            )
+            if line is None:
+                return False
+            mark = seq
+            if TURN_PROMPT in line:
+                break
+            self.send_input("2" if START_MENU_PROMPT in line else "SAM")
+        self.update_other_game_state()
+        self.games_started += 1
+        return True
             
     def _read_pty_output(self):
-        """从 pty 读取输出"""
+        """从 pty 读取输出，直到读到 EOF（游戏进程退出时 pty 返回 EIO）"""
+        # 增量解码，避免多字节字符被 1024 字节的读取边界截断
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        buffer = ""
         try:
-            buffer = ""
-            
-            while self.process and self.process.poll() is None:
+            while not self.closed:
                 # 使用 select 检查是否有数据
                 ready, _, _ = select.select([self.master_fd], [], [], 0.1)
                 
                 if ready:
-                    data = os.read(self.master_fd, 1024).decode('utf-8', errors='ignore')
-                    buffer += data
+                    try:
+                        data = os.read(self.master_fd, 1024)
+                    except OSError as e:
+                        if e.errno == errno.EIO:
+                            break
+                        raise
+                    if not data:
+                        break
+                    if self.recorder is not None:
+                        self.recorder.output(data)
+                    buffer += decoder.decode(data)
                     
                     # 处理完整行
                     while '\n' in buffer:
                         line, buffer = buffer.split('\n', 1)
                         self._process_line(line)
+                    # 等待输入的提示没有换行，立即处理，不必等到没有新数据
+                    if buffer and any(prompt in buffer for prompt in INPUT_PROMPTS):
+                        self._process_line(buffer)
+                        buffer = ""
                 else:
                     # 没有新数据，处理缓冲区
                     if buffer.strip():
                         self._process_line(buffer)
                         buffer = ""
-                        
-        except Exception as e:
-            raise RuntimeError(f"读取 pty 输出失败: {e}")
+                    if self.process is not None and self.process.poll() is not None:
+                        break
+            buffer += decoder.decode(b"", final=True)
+            if buffer.strip():
+                self._process_line(buffer)
+        except (OSError, ValueError) as e:
+            # close() 关闭 fd 后 select/read 会失败，此时正常退出
+            if not self.closed:
+                raise RuntimeError(f"读取 pty 输出失败: {e}")
+        finally:
+            # 唤醒所有等待者，避免进程退出后一直阻塞到超时
+            with self.output_cond:
+                self.output_cond.notify_all()
 
     def _write_to_log(self, line):
-        """写入到日志文件"""
-        try:
-            with open(self.output_file, 'a', encoding='utf-8') as f:
-                f.write(f"{line}\n")
-                f.flush()  # 立即刷新到磁盘
-        except Exception as e:
-            raise RuntimeError(f"写入日志文件失败: {e}")
+        """写入到日志文件（放入后台写入队列，不阻塞读取线程）"""
+        self.log_sink.write(line)
 
     def _process_line(self, line):
         """处理单行"""
         if self._is_clear_screen(line):
             clean_line = self._clean_ansi(line.strip())
-            self.current_screen_lines = [clean_line]
+            self.screen.clear(clean_line)
+            self.parser.reset()
+            self.parser.feed(clean_line)
             if self.screen_refresh:
                 self._write_to_log(line)
             else:
                 self._write_to_log(clean_line)
+            self._notify_output(clean_line)
             return
             
         self._write_to_log(line)
         clean_line = self._clean_ansi(line.strip())
         if clean_line:
-            self.current_screen_lines.append(clean_line)
-            self.output_queue.put(clean_line)
-            if "打出了" in clean_line or "是一颗" in clean_line:
+            self.screen.append(clean_line)
+            self.parser.feed(clean_line)
+            self._put_output(clean_line)
+            events = dict(scan_events(clean_line))
+            if "shot" in events:
                 if "实弹" in clean_line:
                     self.update_single_bullet("实弹")
                 elif "空包弹" in clean_line:
                     self.update_single_bullet("空包弹")
-            if "拼命砸碎了一个" in clean_line:
+            if "invert" in events:
                 self.is_inverted = not self.is_inverted
-            if "请输入你的道具编号来使用道具，输入+来选择射击目标:" in clean_line:
+                self.belief.invert()
+            if "turn" in events:
                 self.self_turn = True
-            match = re.search(r'实弹(\d+)颗 空包弹(\d+)颗', clean_line)
-            if match:
-                self.update_bullet_types(match)
+            if "bullets" in events:
+                self.update_bullet_types(int(events["bullets"].group("live")), int(events["bullets"].group("blank")))
             # 提取每人 * 点生命值
-            match = re.search(r'每人 (\d+) 点生命值', clean_line)
-            if match:
-                self.current_game_state['max_health'] = int(match.group(1))
+            if "max_health" in events:
+                self.current_game_state['max_health'] = int(events["max_health"].group("health"))
+                self.rounds += 1
+            # 射击行处理完后立即复制状态，其他线程读取副本不会与读取线程的更新交错
+            state = copy.deepcopy(self.current_game_state) if "shot" in events else None
+            self._notify_output(clean_line, state)
+
+    def _put_output(self, clean_line):
+        """放入输出队列，队列已满时丢弃最旧的行"""
+        while True:
+            try:
+                self.output_queue.put_nowait(clean_line)
+                return
+            except queue.Full:
+                try:
+                    self.output_queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _notify_output(self, clean_line, state=None):
+        """记录新输出行并唤醒 wait_for 的等待者，state 为射击行之后的状态副本"""
+        if not clean_line:
+            return
+        with self.output_cond:
+            self.output_seq += 1
+            self.recent_output.append((self.output_seq, clean_line))
+            if state is not None:
+                self.shot_state = (self.output_seq, state)
+            self.output_cond.notify_all()
+        self.log_sink.event("output", line=clean_line)
+
+    def _is_running(self):
+        """是否还可能有新的输出：读取线程在游戏进程退出后读完剩余输出才结束"""
+        return self.output_thread is not None and self.output_thread.is_alive()
+
+    def mark(self):
+        """返回当前输出位置，配合 wait_for/get_output_since 只关注之后到达的输出"""
+        with self.output_cond:
+            return self.output_seq
+
+    def _wait_for_line(self, patterns, timeout, since):
+        """等待 since 之后第一条匹配的输出行，返回 (序号, 行)，超时或进程退出返回 (None, None)"""
+        if patterns is not None and not isinstance(patterns, (list, tuple)):
+            patterns = [patterns]
+        deadline = time.monotonic() + timeout
+        with self.output_cond:
+            while True:
+                seq, line = self._find_line(patterns, since)
+                if line is not None:
+                    return seq, line
+                since = self.output_seq
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._is_running():
+                    return None, None
+                self.output_cond.wait(remaining)
+
+    def _find_line(self, patterns, since):
+        """在已收到的输出中查找 since 之后第一条匹配的行，返回 (序号, 行)，没有时返回 (None, None)"""
+        for seq, line in self.recent_output:
+            if seq <= since:
+                continue
+            if patterns is None or any(
+                pattern in line if isinstance(pattern, str) else pattern.search(line)
+                for pattern in patterns
+            ):
+                return seq, line
+        return None, None
+
+    def wait_for(self, patterns=None, timeout=10.0, since=None):
+        """阻塞直到 since 之后出现匹配 patterns 的输出行，或超时
+
+        patterns 可以是字符串（子串匹配）、已编译的正则或它们的列表，为 None 时任意新输出即返回。
+        since 默认为调用时的输出位置。返回匹配到的行，超时或进程退出时返回 None。
+        """
+        if since is None:
+            since = self.mark()
+        _, line = self._wait_for_line(patterns, timeout, since)
+        return line
+
+    def wait_for_shot(self, timeout=10.0, since=None):
+        """等待 since 之后的第一发射击，返回 (射击行, 射出这一发之后的状态副本)
+
+        状态副本与射击行一致，不受之后输出的影响。超时、进程退出或这一发之后又有射击
+        （副本已被覆盖）时返回 (None, None)。
+        """
+        if since is None:
+            since = self.mark()
+        seq, line = self._wait_for_line([SHOT_PATTERN], timeout, since)
+        return self._shot_at(seq, line)
+
+    def _shot_at(self, seq, line):
+        with self.output_cond:
+            if line is None or self.shot_state is None or self.shot_state[0] != seq:
+                return None, None
+            return line, self.shot_state[1]
+
+    def get_output_since(self, since):
+        """获取 since 之后到达的所有输出行"""
+        with self.output_cond:
+            return "\n".join(line for seq, line in self.recent_output if seq > since)
 
     def get_current_screen(self):
         """获取当前屏幕显示的内容"""
-        return "\n".join(self.current_screen_lines)
+        return self.screen.text()
     
     def get_output(self, timeout=2.0):
         """获取游戏输出"""
@@ -199,7 +411,7 @@ class TextEnv(BaseEnv):
             try:
                 line = self.output_queue.get(timeout=0.1)
                 output_lines.append(line)
-                self.game_log += line + "\n"
+                self.game_log.append(line)
             except queue.Empty:
                 # 如果没有更多输出，继续等待一小段时间
                 if output_lines:  # 如果已经有输出，可能已经完成
@@ -212,7 +424,11 @@ class TextEnv(BaseEnv):
         """向游戏发送输入"""
         if self.process and self.process.poll() is None:
             try:
+                # 先记录输入再写入，保证录制中输入排在它引起的回显之前
+                if self.recorder is not None:
+                    self.recorder.input(command)
                 os.write(self.master_fd, (command + "\n").encode('utf-8'))
+                self.log_sink.event("input", data=command)
                 return True
             except Exception as e:
                 raise RuntimeError(f"发送输入失败: {e}")
@@ -223,8 +439,18 @@ class TextEnv(BaseEnv):
         return self.current_game_state
     
     def get_game_log(self):
-        """获取游戏日志"""
-        return self.game_log
+        """获取游戏日志（最近的输出行）"""
+        return "".join(line + "\n" for line in self.game_log)
+
+    def get_game_result(self):
+        """获取本局结果：赢下过至少一次即为 win，出现重新开始提示为 loss，否则为 unfinished"""
+        if self.wins > 0:
+            result = "win"
+        elif self.game_over:
+            result = "loss"
+        else:
+            result = "unfinished"
+        return {"result": result, "rounds": self.rounds, "wins": self.wins}
     
     def update_single_bullet(self, bullet_type: str):
         """更新单个子弹类型"""
@@ -240,52 +466,38 @@ class TextEnv(BaseEnv):
                 self.current_game_state['bullet_types']['live_shell'] -= 1
         else:
             raise ValueError("未知的子弹类型")
+        self.belief.eject(bullet_type == "实弹")
         self.is_inverted = False  # 使用后重置逆转状态
     
-    def update_bullet_types(self, match):
-        """更新子弹类型"""
-        # 从 match 中类似 实弹3颗 空包弹2颗 的格式提取子弹数量
-        self.current_game_state['bullet_types']['live_shell'] = int(match.group(1))
-        self.current_game_state['bullet_types']['blank'] = int(match.group(2))
+    def update_bullet_types(self, live_shell, blank):
+        """更新子弹类型（来自类似 实弹3颗 空包弹2颗 的装弹提示）"""
+        self.current_game_state['bullet_types']['live_shell'] = live_shell
+        self.current_game_state['bullet_types']['blank'] = blank
         self.current_game_state["use_info"] = ""
+        self.belief.load(live_shell, blank)
+        self.load_count += 1
+        self.log_sink.event(
+            "load",
+            live_shell=self.current_game_state['bullet_types']['live_shell'],
+            blank=self.current_game_state['bullet_types']['blank'],
+        )
         
-    def update_other_game_state(self, obs):
-        """更新其他游戏状态"""
-        # 解析生命值 (⚡ 符号的数量)
-        # 上方是庄家生命值，下方是玩家生命值
-        lines = obs.split('\n')
-        
-        # 查找包含生命值符号的行
-        for i, line in enumerate(lines):
-            if '⚡' in line:
-                health_count = line.count('⚡')
-                # 判断是庄家还是玩家的生命值
-                # 通过在表格中的位置判断：上半部分是庄家，下半部分是玩家
-                if i < len(lines) // 2:
-                    self.current_game_state['dealer_health'] = health_count
-                else:
-                    self.current_game_state['player_health'] = health_count
+    def update_other_game_state(self, obs=None):
+        """更新双方生命值和道具
 
-        dealer_items = []
-        player_items = []
-        
-        for line in lines:
-            # 匹配道具行格式: 数字.名称 的模式
-            if re.search(r'\d+\.(magnifying_glass|cigarette_pack|beer|handsaw|handcuffs|burner_phone|inverter|adrenaline|expired_medicine)', line):
-                # 提取所有道具名称
-                items = re.findall(r'\d+\.(magnifying_glass|cigarette_pack|beer|handsaw|handcuffs|burner_phone|inverter|adrenaline|expired_medicine)', line)
-                
-                # 通过行的内容和位置判断是庄家还是玩家的道具
-                line_index = lines.index(line)
-                for item_match in items:
-                    item_name = item_match  # 直接获取道具名称
-                    if line_index < len(lines) // 2:
-                        dealer_items.append(item_name)
-                    else:
-                        player_items.append(item_name)
-                
-        self.current_game_state['dealer_items'] = dealer_items
-        self.current_game_state['player_items'] = player_items
+        默认使用读取线程随输出增量维护的解析结果；传入 obs 时改为解析这段屏幕文本。
+        屏幕上半部分是庄家，下半部分是玩家。
+        """
+        start = time.perf_counter()
+        with self.tracer.span("parse"):
+            snapshot = self.parser.snapshot() if obs is None else parse_screen(obs)
+        if snapshot.dealer_health is not None:
+            self.current_game_state['dealer_health'] = snapshot.dealer_health
+        if snapshot.player_health is not None:
+            self.current_game_state['player_health'] = snapshot.player_health
+        self.current_game_state['dealer_items'] = snapshot.dealer_items
+        self.current_game_state['player_items'] = snapshot.player_items
+        self.parse_time += time.perf_counter() - start
         
     def update_use_info(self, obs):
         """更新使用道具后的信息"""
@@ -303,96 +515,212 @@ class TextEnv(BaseEnv):
                 if is_self_turn_next:
                     self.current_game_state["use_info"] += line
             elif "手机" in line:
-                match = re.search(r'第(\d+)发是(实弹|空包弹)', line)
-                assert match, "手机使用信息格式错误"
+                match = PHONE_INFO_PATTERN.search(line)
+                if not match:
+                    # “没有任何信息”的手机记录不需要保留（与 SimEnv 相同）
+                    continue
                 bullet_number = match.group(1)
                 bullet_type = match.group(2)
                 bullet_number = str(int(bullet_number) - 1)
                 self.current_game_state["use_info"] += f"你使用了手机，第{bullet_number}发是{bullet_type}\n"
 
+    def _find_bullet_result(self, obs):
+        """从道具结果输出中找到子弹类型，忽略上膛时的“实弹N颗 空包弹N颗”"""
+        for line in obs.split("\n"):
+            if BULLET_COUNT_PATTERN.search(line):
+                continue
+            if "实弹" in line:
+                return "实弹"
+            if "空包弹" in line:
+                return "空包弹"
+        return None
+
+    def _run_steps(self, steps):
+        """同步执行输入步骤序列，返回序列的返回值
+
+        步骤序列是生成器：发送输入和更新状态直接在生成器中完成，需要等待输出时产生
+        (patterns, timeout, since)，收到 _wait_for_line 的结果 (序号, 行)。
+        AsyncTextEnv 用协程执行同一序列，两者的输入顺序和等待的提示因此始终一致。
+        """
+        reply = None
+        while True:
+            try:
+                patterns, timeout, since = steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            reply = self._wait_for_line(patterns, timeout, since)
+
+    def _menu_steps(self, mark):
+        """从开始菜单进入游戏的步骤：选择 2、输入玩家名称，返回是否轮到玩家"""
+        # 等待游戏菜单出现
+        yield [START_MENU_PROMPT], self.input_timeout, mark
+        # 输入 2
+        mark = self.mark()
+        self.send_input("2")
+        yield [NAME_PROMPT], self.input_timeout, mark
+        # 输入玩家名称，等待第一次轮到玩家
+        mark = self.mark()
+        self.send_input("SAM")
+        _, line = yield [TURN_PROMPT], self.wait_timeout, mark
+        if line is None:
+            return False
+
+        self.update_other_game_state()
+        self.games_started += 1
+        return True
+
+    def _wait_for_turn(self, since):
+        """等待重新轮到玩家，途中处理加倍和重新开始的提示
+
+        返回 True 表示轮到玩家，False 表示游戏已结束且环境已关闭。
+        """
+        return self._run_steps(self._turn_steps(since))
+
+    def _turn_steps(self, since):
+        """等待重新轮到玩家的步骤，返回值同 _wait_for_turn"""
+        with self.tracer.span("wait_turn"):
+            while True:
+                seq, line = yield [TURN_PROMPT, RESTART_PROMPT, DOUBLE_PROMPT], self.wait_timeout, since
+                if line is None:
+                    if not self._is_running():
+                        self.close()
+                        return False
+                    continue
+                since = seq
+                turn = self._on_flow_prompt(line)
+                if turn is not None:
+                    return turn
+
+    def _on_flow_prompt(self, line):
+        """处理等待回合时遇到的提示：轮到玩家返回 True，游戏结束返回 False，加倍后继续等待返回 None"""
+        if TURN_PROMPT in line:
+            return True
+        if RESTART_PROMPT in line:
+            self.game_over = True
+            if self.keep_alive:
+                # 保留进程和读取线程，本局到此结束，由 restart 回答提示开始下一局
+                self.finished = True
+                return False
+            self.send_input("1")
+            self.close()
+            return False
+        if DOUBLE_PROMPT in line:
+            self.wins += 1
+            self.clear_state()
+            self.send_input("0")
+        return None
+
+    def _prompt_steps(self, prompt, since):
+        """等待动作中途的输入提示
+
+        游戏没有接受之前的输入时会重新显示回合提示，这时不再发送后续输入（否则会被当作新的命令），
+        刷新状态后抛出 ValueError，调用方重新读取状态即可继续。
+        """
+        _, line = yield [prompt, TURN_PROMPT], self.input_timeout, since
+        if line is not None and prompt not in line:
+            self.update_other_game_state()
+            raise ValueError(f"游戏没有接受输入，没有出现提示: {prompt}")
+
+    def _record_action(self, action):
+        if self.recorder is not None:
+            self.recorder.action(action)
+
     def use(self, items:list, item_name:str = "", is_dealer_item:bool = False):
+        self._run_steps(self._use_steps(items, item_name, is_dealer_item))
+
+    def _use_steps(self, items, item_name, is_dealer_item):
+        """使用道具的步骤，items 有两项时第二项是偷取的庄家道具"""
         # item_name = self.current_game_state["player_items"][int(items[0])]
+        if not is_dealer_item:
+            self._record_action("use " + " ".join(items))
+        mark = self.mark()
         self.send_input(items[0])
         if not is_dealer_item:
-            time.sleep(1.2)
-            self.send_input("1")        
+            yield from self._prompt_steps(CONFIRM_PROMPT, mark)
+            mark = self.mark()
+            self.send_input("1")
+        error = None
         if len(items) == 2:
-            time.sleep(3)
+            yield from self._prompt_steps(STEAL_PROMPT, mark)
             # item_name = self.current_game_state["dealer_items"][int(items[1])]
-            self.use([items[1]], item_name, is_dealer_item=True)
-        elif item_name == "magnifying_glass":
-            time.sleep(9)
-            obs = self.get_current_screen()
-            if "实弹" in obs:
-                self.update_use_info("你使用了放大镜，看到了一颗实弹")
-            elif "空包弹" in obs:
-                self.update_use_info("你使用了放大镜，看到了一颗空包弹")
-            else:
+            yield from self._use_steps([items[1]], item_name, is_dealer_item=True)
+        elif item_name in RESULT_ITEMS:
+            # 道具结果在下一次轮到玩家之前输出
+            yield [TURN_PROMPT], self.wait_timeout, mark
+            try:
+                self._apply_item_result(item_name, self.get_output_since(mark))
+            except ValueError as e:
+                # 结果解析失败时仍等到重新轮到玩家并刷新状态，调用方重新读取状态即可继续
+                error = e
+        else:
+            self._apply_item_result(item_name)
+
+        if not (yield from self._turn_steps(mark)):
+            return
+
+        self.update_other_game_state()
+        if error is not None:
+            raise error
+
+    def _apply_item_result(self, item_name, obs=None):
+        """根据道具及其结果输出（放大镜、啤酒、手机才有）更新状态和使用信息"""
+        if item_name == "magnifying_glass":
+            bullet_type = self._find_bullet_result(obs)
+            if bullet_type is None:
+                self.tracer.count("parse_failures", source="screen")
                 raise ValueError("无法识别子弹类型")
+            self.update_use_info(f"你使用了放大镜，看到了一颗{bullet_type}")
+            self.belief.observe_current(bullet_type == "实弹")
         elif item_name == "beer":
-            time.sleep(8)
-            obs = self.get_current_screen()
-            if "实弹" in obs:
-                self.update_single_bullet("实弹")
-            elif "空包弹" in obs:
-                self.update_single_bullet("空包弹")
-            else:
+            bullet_type = self._find_bullet_result(obs)
+            if bullet_type is None:
+                self.tracer.count("parse_failures", source="screen")
                 raise ValueError("无法识别子弹类型")
+            self.update_single_bullet(bullet_type)
             self.update_use_info_after_shoot(is_beer=True, is_self_turn_next=True)
-        elif item_name == "handsaw":
-            self.update_use_info("你使用了手锯，下一次射击伤害提升至2点")
-        elif item_name == "handcuffs":
-            self.update_use_info("你使用了手铐，使庄家跳过下个回合")
         elif item_name == "burner_phone":
-            time.sleep(6.8)
-            obs = self.get_current_screen()
             if "真遗憾..." in obs:
                 self.update_use_info("你使用了手机，但没有任何信息")
-                return
-            match = re.search(r'第(\d+)发是\.\.\.\n(实弹|空包弹)', obs)
-            if match:
-                bullet_number = match.group(1)
-                bullet_type = match.group(2)
-                self.update_use_info(f"你使用了手机，第{bullet_number}发是{bullet_type}")
             else:
-                raise ValueError("无法识别手机信息,当前屏幕内容:\n" + obs)
-
+                match = PHONE_RESULT_PATTERN.search(obs)
+                if match:
+                    bullet_number = match.group(1)
+                    bullet_type = match.group(2)
+                    self.update_use_info(f"你使用了手机，第{bullet_number}发是{bullet_type}")
+                    self.belief.reveal(int(bullet_number) - 1, bullet_type == "实弹")
+                else:
+                    self.tracer.count("parse_failures", source="screen")
+                    raise ValueError("无法识别手机信息,当前屏幕内容:\n" + obs)
+        elif item_name == "handsaw":
+            self.update_use_info("你使用了手锯，下一次射击伤害提升至2点")
+        elif item_name == "handcuffs":
+            self.update_use_info("你使用了手铐，使庄家跳过下个回合")
         elif item_name == "inverter":
             self.update_use_info("你使用了逆转器，逆转了当前子弹类型")
             self.is_inverted = not self.is_inverted
-
-        time.sleep(10)
-        
-        self.update_other_game_state(self.get_current_screen())
+            self.belief.invert()
         
     def shoot(self, target: str):
+        self._run_steps(self._shoot_steps(target))
+
+    def _shoot_steps(self, target):
+        """射击的步骤，target 为 'dealer' 或 'self'"""
+        # 发送任何输入之前校验目标，避免游戏停在选择目标的提示上
+        if target not in ("dealer", "self"):
+            raise ValueError("目标必须是 'dealer' 或 'self'")
+        self._record_action(f"shoot {target}")
+        mark = self.mark()
         self.send_input("+")
-        time.sleep(1)
+        yield from self._prompt_steps(TARGET_PROMPT, mark)
         self.self_turn = False
-        if target == "dealer":
-            self.send_input("0")
-            self.update_use_info_after_shoot(is_beer=False, is_self_turn_next=False)
-        elif target == "self":
-            self.send_input("1")
-            self.update_use_info_after_shoot(is_beer=False, is_self_turn_next=True)
-        else:
-            raise ValueError("目标必须是 'dealer' 或 'self'")
+        mark = self.mark()
+        self.send_input("0" if target == "dealer" else "1")
+        self.update_use_info_after_shoot(is_beer=False, is_self_turn_next=target == "self")
 
-        count = 0
-        while not self.is_self_turn():
-            count += 1
-            time.sleep(1)
-            
-            if "重新开始？" in self.get_current_screen():
-                time.sleep(1)
-                self.send_input("1")
-                self.close()
-                return
-            if "加倍还是放弃？" in self.get_current_screen():
-                self.clear_state()
-                self.send_input("0")
-        
-        self.update_other_game_state(self.get_current_screen())
+        if not (yield from self._turn_steps(mark)):
+            return
+
+        self.update_other_game_state()
         
     def is_self_turn(self):
         """检查是否轮到玩家行动"""
@@ -410,7 +738,8 @@ class TextEnv(BaseEnv):
             },
             "player_items": [],
             "dealer_items": [],
-            "use_info": ""
+            "use_info": "",
+            "belief": self.belief
         }
         self.is_inverted = False
         self.self_turn = False
@@ -420,8 +749,17 @@ class TextEnv(BaseEnv):
         if self.process:
             self.process.terminate()
             self.process.wait()
+        # 旧的读取线程读到 EOF 后退出，再关闭旧的 fd
+        if self.output_thread:
+            self.output_thread.join(timeout=1)
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            self.master_fd = None
         
-        self.game_log = ""
+        self.game_log.clear()
+        self.rounds = 0
+        self.wins = 0
+        self.game_over = False
         return self.start_game()
     
     def close(self):
@@ -434,10 +772,16 @@ class TextEnv(BaseEnv):
         if self.output_thread:
             self.output_thread.join(timeout=1)
         self.closed = True
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            self.master_fd = None
+        if self.recorder is not None:
+            self.recorder.close()
+        self.log_sink.close()
     
     def is_closed(self):
-        """检查环境是否已关闭"""
-        return self.closed
+        """检查环境是否已关闭（keep_alive 时本局结束也视为关闭）"""
+        return self.closed or self.finished
     
     def __del__(self):
         """析构函数，确保进程被正确关闭"""
@@ -1,19 +1,194 @@
 import argparse
+import itertools
+import json
+import os
+import time
+from multiprocessing import util
+
 import yaml
 
+from src.async_processor import AsyncInteractionProcessor
+from src.batch import run_async_batch, run_batch
+from src.cache import DecisionCache
+from src.environment.async_text_env import AsyncTextEnv
+from src.environment.replay_env import ReplayEnv
+from src.environment.session import SessionManager
+from src.environment.sim_env import SimEnv
 from src.environment.text_env import TextEnv
 from src.processor import InteractionProcessor
+from src.router import ModelRouter
+from src.rules import RuleEngine
+from src.tracing import make_tracer
+from src.trajectory import TrajectoryWriter
 
-def run(config):
-    env_mapping = {
-        "text": TextEnv,
-    }
-    if config["environment"] not in env_mapping:
+env_mapping = {
+    "text": TextEnv,
+    "sim": SimEnv,
+    "replay": ReplayEnv,
+}
+
+# 异步批量运行使用的环境
+async_env_mapping = {
+    "text": AsyncTextEnv,
+}
+
+def make_env(config, use_async=False, **kwargs):
+    """根据配置创建环境，kwargs 会覆盖配置中的环境参数；use_async 为 True 时创建 asyncio 版本的环境"""
+    mapping = async_env_mapping if use_async else env_mapping
+    if config["environment"] not in mapping:
         raise ValueError(f"Unsupported environment: {config['environment']}")
-    
-    env = env_mapping[config["environment"]](screen_refresh=config.get("screen_refresh", True))
-    processor = InteractionProcessor(env, model=config["model"])
-    processor.play()
+    env_kwargs = {"screen_refresh": config.get("screen_refresh", True)}
+    if "log_path" in config:
+        env_kwargs["log_path"] = config["log_path"]
+    env_kwargs.update(config.get("env_options", {}))
+    env_kwargs.update(kwargs)
+    return mapping[config["environment"]](**env_kwargs)
+
+# 每个进程内共享的决策缓存，按配置和命名空间区分
+_decision_caches = {}
+
+# 影响模型决策的处理器配置：模型、提示（计划模式、行动优先）和行动、观察的格式
+DECISION_FIELDS = ("model", "plan_mode", "action_first", "action_format", "observation_format")
+
+def decision_namespace(processor_kwargs):
+    """决策缓存的命名空间，只有这些配置都相同的处理器才共用缓存的决策"""
+    return json.dumps({field: processor_kwargs.get(field) for field in DECISION_FIELDS}, sort_keys=True)
+
+def get_decision_cache(options, namespace=""):
+    """获取当前进程中按配置和命名空间共享的 DecisionCache"""
+    key = (tuple(sorted(options.items())), namespace)
+    if key not in _decision_caches:
+        _decision_caches[key] = DecisionCache(**options, namespace=namespace)
+    return _decision_caches[key]
+
+def _config_key(*values):
+    """把配置片段转为可哈希的键，用于按配置区分每个进程内共享的对象"""
+    return json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+
+# 每个进程内的 Tracer，按 tracing 配置区分（锦标赛中同一进程会先后进行不同参赛者的对局），进程退出时导出汇总并关闭
+_tracers = {}
+
+def get_tracer(config):
+    """获取当前进程中与配置的 tracing 对应的 Tracer，没有 tracing 时为空操作的 NULL_TRACER"""
+    key = _config_key(config.get("tracing"))
+    if key not in _tracers:
+        tracer = _tracers[key] = make_tracer(config.get("tracing"))
+        # 批量运行的子进程退出时不会执行 atexit，使用 multiprocessing 的退出回调
+        util.Finalize(None, tracer.close, exitpriority=10)
+    return _tracers[key]
+
+# 每个进程内的 ModelRouter，按 router 和 tracing 配置区分，同一配置的各局游戏共享限流令牌桶和延迟统计
+_routers = {}
+
+def get_router(config):
+    """获取当前进程中与配置的 router 对应的 ModelRouter，router 可以是配置字典或 YAML 文件路径，没有时返回 None"""
+    if not config.get("router"):
+        return None
+    key = _config_key(config["router"], config.get("tracing"))
+    if key not in _routers:
+        _routers[key] = ModelRouter.from_config(config["router"], tracer=get_tracer(config))
+    return _routers[key]
+
+# 每个进程内的 TrajectoryWriter，按 trajectory 配置区分，写入 trajectory.dir 下以进程号和创建时间命名的文件，进程退出时关闭
+_trajectory_writers = {}
+
+def get_trajectory_writer(config):
+    """获取当前进程中与配置的 trajectory 对应的 TrajectoryWriter，没有 trajectory 时返回 None"""
+    options = config.get("trajectory")
+    if not options:
+        return None
+    key = _config_key(options)
+    if key not in _trajectory_writers:
+        os.makedirs(options.get("dir", "trajectories"), exist_ok=True)
+        writer = _trajectory_writers[key] = TrajectoryWriter(
+            os.path.join(options.get("dir", "trajectories"), f"trajectories_{os.getpid()}_{int(time.time() * 1000)}"),
+            format=options.get("format", "auto"),
+            batch_size=options.get("batch_size", 1024),
+        )
+        util.Finalize(None, writer.close, exitpriority=10)
+    return _trajectory_writers[key]
+
+def close_trajectory_writer():
+    """关闭当前进程的所有 TrajectoryWriter，使文件完整可读；之后的对局写入新的文件"""
+    writers = list(_trajectory_writers.values())
+    _trajectory_writers.clear()
+    for writer in writers:
+        writer.close()
+
+# 每个进程内的 SessionManager，按创建游戏进程用到的配置区分，保持该进程的游戏进程常驻，进程退出时关闭
+_session_managers = {}
+
+def get_session_manager(config):
+    """获取当前进程中与配置对应的 SessionManager，配置中没有 sessions 时返回 None
+
+    sessions 为 true 或 {max_games, standby}，只支持 text 环境。常驻的游戏进程跨局使用同一个日志文件，不录制。
+    环境类型、env_options、screen_refresh 或日志目录不同的配置（如锦标赛中的不同参赛者）使用各自的游戏进程。
+    """
+    options = config.get("sessions")
+    if not options:
+        return None
+    key = _config_key(
+        options, config["environment"], config.get("env_options"), config.get("screen_refresh", True),
+        config.get("log_dir", "/tmp"),
+    )
+    if key not in _session_managers:
+        if config["environment"] != "text":
+            raise ValueError(f"sessions are not supported for environment: {config['environment']}")
+        options = {} if options is True else options
+        log_dir = config.get("log_dir", "/tmp")
+        counter = itertools.count()
+
+        def env_factory():
+            log_path = os.path.join(log_dir, f"game_output_{os.getpid()}_{next(counter)}.log")
+            return make_env(config, keep_alive=True, log_path=log_path)
+
+        manager = _session_managers[key] = SessionManager(
+            env_factory, max_games=options.get("max_games", 50), standby=options.get("standby", 1)
+        )
+        util.Finalize(None, manager.close, exitpriority=10)
+    return _session_managers[key]
+
+def make_processor(env, config, **kwargs):
+    """根据配置创建 InteractionProcessor，kwargs 会覆盖配置"""
+    processor_kwargs = {
+        "model": config["model"],
+        "context_policy": config.get("context_policy", "full"),
+        "context_max_turns": config.get("context_max_turns", 6),
+        "tracer": get_tracer(config),
+        "plan_mode": config.get("plan_mode", False),
+        "stream": config.get("stream", False),
+        "stream_drain": config.get("stream_drain", "cancel"),
+        "action_first": config.get("action_first", False),
+        "action_format": config.get("action_format", "text"),
+        "action_retries": config.get("action_retries", 2),
+        "prompt_cache": config.get("prompt_cache", "auto"),
+        "router": get_router(config),
+        "trajectory": bool(config.get("trajectory")),
+        "speculate": config.get("speculate", 0),
+    }
+    # observation_format 可以是一种格式，也可以按模型名称分别指定（default 为其他模型的格式）
+    observation_format = config.get("observation_format", "verbose")
+    if isinstance(observation_format, dict):
+        observation_format = observation_format.get(config["model"], observation_format.get("default", "verbose"))
+    processor_kwargs["observation_format"] = observation_format
+    if config.get("rules"):
+        # rules: true 启用全部规则，也可以是按优先级排列的规则名称列表
+        processor_kwargs["rules"] = RuleEngine(None if config["rules"] is True else config["rules"])
+    processor_kwargs.update(kwargs)
+    if config.get("decision_cache") and "cache" not in kwargs:
+        processor_kwargs["cache"] = get_decision_cache(config["decision_cache"], decision_namespace(processor_kwargs))
+    if isinstance(env, AsyncTextEnv):
+        return AsyncInteractionProcessor(env, **processor_kwargs)
+    return InteractionProcessor(env, **processor_kwargs)
+
+def run(config):
+    env = make_env(config)
+    processor = make_processor(env, config)
+    result = processor.play()
+    writer = get_trajectory_writer(config)
+    if writer is not None:
+        writer.write_game(processor.trajectory_rows, result, game_id=0)
+    close_trajectory_writer()
 
 def main():
     parser = argparse.ArgumentParser(description="启动 processor")
@@ -23,10 +198,39 @@ def main():
         default="config/text.yaml",
         help="配置文件路径，默认为 config/text.yaml"
     )
+    parser.add_argument(
+        "--games",
+        type=int,
+        default=1,
+        help="游戏局数，大于 1 时进入批量模式"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="批量模式下同时进行的游戏数"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="批量模式下每局结果的 JSONL 输出路径（可选）"
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="批量模式下在一个进程的事件循环中并发进行，workers 为同时进行的局数"
+    )
     args = parser.parse_args()
     with open(args.config, 'r', encoding='utf-8') as f:
         config = yaml.safe_load(f)
-    run(config)
+    if args.use_async:
+        run_async_batch(config, games=args.games, concurrency=args.workers, output=args.output)
+    elif args.games > 1 or args.workers > 1:
+        run_batch(config, games=args.games, workers=args.workers, output=args.output)
+    else:
+        run(config)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
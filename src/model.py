@@ -1,8 +1,78 @@
+import asyncio
+import contextvars
 import os
-from openai import OpenAI
+import threading
+import weakref
 
- 
-def call_openai_chat(messages=[], model="gemini-2.5-flash", temperature=0.7):
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+# 连接池参数：保持长连接，供同一进程内的多局游戏共享
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+
+_clients = {}
+_clients_lock = threading.Lock()
+# AsyncOpenAI 的连接池绑定在创建它的事件循环上，因此按事件循环分别缓存
+_async_clients = weakref.WeakKeyDictionary()
+# 最近一次调用实际发出的 HTTP 请求数（包括客户端内部的重试），按线程/协程上下文区分
+_call_attempts = contextvars.ContextVar("call_attempts", default=None)
+
+
+def _count_attempt(request):
+    counter = _call_attempts.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+async def _acount_attempt(request):
+    _count_attempt(request)
+
+
+def last_call_attempts():
+    """当前线程/协程中最近一次 call_openai_chat/acall_openai_chat 发出的请求数，大于 1 说明发生了重试"""
+    counter = _call_attempts.get()
+    return counter[0] if counter is not None else 0
+
+
+def record_call_attempts(count):
+    """由自行重试的调用方（如 ModelRouter）设置最近一次调用的请求数，供 last_call_attempts 读取"""
+    _call_attempts.set([count])
+
+
+def model_provider(model):
+    """模型所属的服务商，本地策略（solver、random）为 local"""
+    if model in ("solver", "random"):
+        return "local"
+    if "gpt" in model:
+        return "openai"
+    if "gemini" in model:
+        return "gemini"
+    return "other"
+
+
+# prompt_cache 的取值：auto 只依赖服务商的自动前缀缓存（保持消息前缀稳定），cache_control 另外显式标记缓存断点
+PROMPT_CACHE_MODES = ("auto", "cache_control")
+
+
+def mark_cache_prefix(messages):
+    """在系统提示和最后一条历史消息上加 cache_control 断点，返回新的消息列表
+
+    用于支持显式前缀缓存的接口（Anthropic 兼容接口、OpenRouter 等）：系统提示在整局中不变，
+    到上一轮回复为止的历史在下一次调用时也不变，两处断点之前的内容都可以命中缓存。
+    """
+    marked = [dict(message) for message in messages]
+    breakpoints = [0] if marked and marked[0]["role"] == "system" else []
+    if len(marked) > 2:
+        breakpoints.append(len(marked) - 2)
+    for index in breakpoints:
+        content = marked[index]["content"]
+        if isinstance(content, str):
+            marked[index]["content"] = [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}]
+    return marked
+
+
+def resolve_credentials(model):
+    """根据模型名称从环境变量中选择 api_key 和 base_url"""
     api_key = ""
     base_url = ""
     if "gpt" in model:
@@ -11,12 +81,148 @@ def call_openai_chat(messages=[], model="gemini-2.5-flash", temperature=0.7):
     elif "gemini" in model:
         api_key = os.environ.get("GEMINI_API_KEY")
         base_url = os.environ.get("GEMINI_BASE_URL")
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    return api_key, base_url
+
+
+def get_client(api_key=None, base_url=None):
+    """获取按 (base_url, api_key) 缓存的 OpenAI 客户端，复用其连接池"""
+    key = (base_url, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=DefaultHttpxClient(limits=HTTP_LIMITS, event_hooks={"request": [_count_attempt]}),
+            )
+            _clients[key] = client
+        return client
+
+
+def get_async_client(api_key=None, base_url=None):
+    """获取当前事件循环中按 (base_url, api_key) 缓存的 AsyncOpenAI 客户端"""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = (base_url, api_key)
+    client = clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=DefaultAsyncHttpxClient(limits=HTTP_LIMITS, event_hooks={"request": [_acount_attempt]}),
+        )
+        clients[key] = client
+    return client
+
+
+def close_clients():
+    """关闭所有缓存的同步客户端"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def call_openai_chat(messages=[], model="gemini-2.5-flash", temperature=0.7, api_key=None, base_url=None, with_usage=False,
+                     **options):
+    """调用聊天接口，api_key/base_url 未指定时根据模型名称从环境变量中选择
+
+    with_usage 为 True 时返回 (message, usage)。options 原样传给接口，如 response_format、tools、tool_choice。
+    """
+    if api_key is None and base_url is None:
+        api_key, base_url = resolve_credentials(model)
+    client = get_client(api_key, base_url)
+    _call_attempts.set([0])
     response = client.chat.completions.create(
         model=model,
         messages=messages,
-        temperature=temperature
+        temperature=temperature,
+        **options
+    )
+    if with_usage:
+        return response.choices[0].message, response.usage
+    return response.choices[0].message
+
+
+async def acall_openai_chat(messages=[], model="gemini-2.5-flash", temperature=0.7, api_key=None, base_url=None, with_usage=False,
+                            **options):
+    """call_openai_chat 的异步版本，多局游戏可在同一事件循环中并发等待模型"""
+    if api_key is None and base_url is None:
+        api_key, base_url = resolve_credentials(model)
+    client = get_async_client(api_key, base_url)
+    _call_attempts.set([0])
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        **options
     )
+    if with_usage:
+        return response.choices[0].message, response.usage
     return response.choices[0].message
 
- 
+
+class ChatStream:
+    """流式回复
+
+    迭代得到依次生成的文本片段。提前拿到需要的内容后，可以 cancel() 关闭连接，
+    或 drain_in_background() 在后台线程读完剩余内容（之后用 wait() 等待完成），
+    text() 为目前已收到的全部文本，usage 在读完时可用（接口支持时）。
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.parts = []
+        self.usage = None
+        self._chunks = self._read()
+        self._thread = None
+
+    def _read(self):
+        for chunk in self.stream:
+            if getattr(chunk, "usage", None) is not None:
+                self.usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                text = chunk.choices[0].delta.content
+                self.parts.append(text)
+                yield text
+
+    def __iter__(self):
+        return self._chunks
+
+    def text(self):
+        return "".join(self.parts)
+
+    def cancel(self):
+        """不再读取剩余内容，关闭连接"""
+        self._chunks.close()
+        self.stream.close()
+
+    def drain_in_background(self):
+        """在后台线程读完剩余内容"""
+        def drain():
+            for _ in self._chunks:
+                pass
+        self._thread = threading.Thread(target=drain, daemon=True)
+        self._thread.start()
+
+    def wait(self):
+        """等待后台读取完成"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def stream_openai_chat(messages=[], model="gemini-2.5-flash", temperature=0.7, api_key=None, base_url=None):
+    """以流式方式调用聊天接口，返回 ChatStream"""
+    if api_key is None and base_url is None:
+        api_key, base_url = resolve_credentials(model)
+    client = get_client(api_key, base_url)
+    _call_attempts.set([0])
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    return ChatStream(stream)
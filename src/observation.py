@@ -0,0 +1,62 @@
+from src.context import count_tokens
+from src.prompts.observation import COMPACT_OBSERVATION, OBSERVATION
+
+OBSERVATION_FORMATS = ("verbose", "compact")
+
+
+def _verbose(state):
+    return OBSERVATION.format(
+        player_health=state["player_health"],
+        dealer_health=state["dealer_health"],
+        max_health=state["max_health"],
+        live_count=state["bullet_types"]["live_shell"],
+        blank_count=state["bullet_types"]["blank"],
+        shell_probabilities=state["belief"].describe() if state.get("belief") is not None else "未知",
+        player_items="\n".join([f"{i}.{item}" for i, item in enumerate(state["player_items"])]),
+        dealer_items="\n".join([f"{i}.{item}" for i, item in enumerate(state["dealer_items"])]),
+        use_info=state["use_info"]
+    )
+
+
+def group_items(items):
+    """道具按类型合并，例如 beer[0,2] handsaw[1]"""
+    groups = {}
+    for i, item in enumerate(items):
+        groups.setdefault(item, []).append(str(i))
+    return " ".join(f"{item}[{','.join(indices)}]" for item, indices in groups.items()) or "-"
+
+
+def _compact(state):
+    belief = state.get("belief")
+    return COMPACT_OBSERVATION.format(
+        player_health=state["player_health"],
+        dealer_health=state["dealer_health"],
+        max_health=state["max_health"],
+        live_count=state["bullet_types"]["live_shell"],
+        blank_count=state["bullet_types"]["blank"],
+        shell_probabilities=",".join(f"{p * 100:.0f}" for p in belief.probabilities()) if belief is not None else "?",
+        player_items=group_items(state["player_items"]),
+        dealer_items=group_items(state["dealer_items"]),
+        use_info=" ".join(line for line in state["use_info"].split("\n") if line),
+    )
+
+
+ENCODERS = {
+    "verbose": _verbose,
+    "compact": _compact,
+}
+
+
+def encode_observation(state, fmt="verbose"):
+    """按 fmt 把游戏状态编码为发给模型的观察"""
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unsupported observation format: {fmt}")
+    return ENCODERS[fmt](state)
+
+
+def observation_tokens(observation, state, fmt):
+    """返回 (编码后观察的估计 token 数, 同一状态用 verbose 格式时的估计 token 数)，用于比较压缩效果"""
+    encoded = count_tokens([{"content": observation}])
+    if fmt == "verbose":
+        return encoded, encoded
+    return encoded, count_tokens([{"content": encode_observation(state, "verbose")}])
@@ -0,0 +1,113 @@
+import re
+
+from src.actions import ACTION_PATTERN
+from src.cache import from_canonical_action, to_canonical_action
+
+# 计划中的一步：普通行动，或 if live/blank then <行动> [else <行动>]
+STEP_PATTERN = re.compile(r'^\s*(?:\d+[.)、]\s*)?(.+?)\s*$')
+IF_PATTERN = re.compile(r'^if\s+(live|blank)\s+then\s+(.+?)(?:\s+else\s+(.+))?$', re.IGNORECASE)
+MAGNIFIER_PATTERN = re.compile(r'看到了一颗(实弹|空包弹)')
+PHONE_FIRST_PATTERN = re.compile(r'第1发是(实弹|空包弹)')
+
+
+def known_shell(state):
+    """根据子弹数量和道具信息推断当前这一发，返回 True（实弹）、False（空包弹）或 None（未知）"""
+    if state.get("belief") is not None:
+        return state["belief"].current()
+    live = state["bullet_types"]["live_shell"]
+    blank = state["bullet_types"]["blank"]
+    known = None
+    if live > 0 and blank == 0:
+        known = True
+    elif live == 0 and blank > 0:
+        known = False
+    # 按使用顺序处理：放大镜和手机直接给出当前这一发，逆转器翻转已知的结果
+    for line in state["use_info"].split("\n"):
+        match = MAGNIFIER_PATTERN.search(line) or PHONE_FIRST_PATTERN.search(line)
+        if match:
+            known = match.group(1) == "实弹"
+        elif "逆转器" in line and known is not None:
+            known = not known
+    return known
+
+
+class Plan:
+    """模型一次给出的整回合行动计划
+
+    步骤中的道具编号在解析时转为道具名称，执行时再映射回当前的编号，因此使用道具后编号变化
+    不影响后续步骤。条件步骤根据当前这一发是否已知（放大镜、手机、子弹数量）选择分支。
+    遇到条件无法判断、道具已不存在或局面发生计划之外的变化（重新装弹、回合结束）时计划失效，
+    由调用方重新询问模型。
+    """
+
+    def __init__(self, steps):
+        # 每一步为 (条件, then 行动, else 行动)，条件为 None 表示无条件
+        self.steps = steps
+        self.position = 0
+
+    @classmethod
+    def parse(cls, response, state):
+        """从回复的 Plan: 部分解析计划，格式不正确时返回 None"""
+        if "Plan:" not in response:
+            return None
+        steps = []
+        for line in response.split("Plan:")[-1].strip().split("\n"):
+            line = line.strip().strip("`")
+            if not line:
+                continue
+            text = STEP_PATTERN.match(line).group(1)
+            match = IF_PATTERN.match(text)
+            if match:
+                condition, then_action, else_action = match.group(1).lower(), match.group(2), match.group(3)
+            else:
+                condition, then_action, else_action = None, text, None
+            try:
+                then_action = cls._canonical(then_action, state)
+                else_action = cls._canonical(else_action, state) if else_action else None
+            except (ValueError, IndexError):
+                return None
+            steps.append((condition, then_action, else_action))
+        return cls(steps) if steps else None
+
+    @staticmethod
+    def _canonical(action, state):
+        action = " ".join(action.split())
+        if not ACTION_PATTERN.match(action):
+            raise ValueError(f"无效的行动: {action}")
+        return to_canonical_action(action, state)
+
+    def next_action(self, state):
+        """返回下一步在当前状态下的行动，计划已完成或失效时返回 None"""
+        while self.position < len(self.steps):
+            condition, then_action, else_action = self.steps[self.position]
+            self.position += 1
+            if condition is None:
+                action = then_action
+            else:
+                shell = known_shell(state)
+                if shell is None:
+                    return None
+                action = then_action if shell == (condition == "live") else else_action
+                if action is None:
+                    continue
+            return from_canonical_action(action, state)
+        return None
+
+    def after_action(self, action, reloaded, hurt):
+        """执行行动后判断计划是否仍然有效
+
+        重新装弹、射击对方（回合交给庄家）或射击自己受伤后，后续局面无法预知，计划失效。
+        """
+        if reloaded or action == "shoot dealer" or (action == "shoot self" and hurt):
+            self.position = len(self.steps)
+        return self.position < len(self.steps)
+
+    def describe(self):
+        """计划的文字描述，记录在上下文摘要中"""
+        parts = []
+        for condition, then_action, else_action in self.steps:
+            if condition is None:
+                parts.append(then_action)
+            else:
+                parts.append(f"if {condition} then {then_action}" + (f" else {else_action}" if else_action else ""))
+        return "; ".join(parts)
@@ -1,10 +1,41 @@
+import copy
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.context import ContextManager, cached_tokens
 from src.environment.text_env import TextEnv
-from src.model import call_openai_chat
-from src.prompts.instruction import INSTRUCTION
-from src.prompts.observation import OBSERVATION
+from src.actions import ActionStreamParser, action_schema, extract_action, legal_actions, repair_action, validate_action
+from src.baselines import RandomPolicy
+from src.model import (
+    PROMPT_CACHE_MODES,
+    call_openai_chat,
+    last_call_attempts,
+    mark_cache_prefix,
+    record_call_attempts,
+    stream_openai_chat,
+)
+from src.observation import OBSERVATION_FORMATS, encode_observation, observation_tokens
+from src.prompts.instruction import ACTION_FIRST_INSTRUCTION, INSTRUCTION
+from src.prompts.observation import COMPACT_FORMAT
+from src.prompts.plan import PLAN_INSTRUCTION
+from src.prompts.retry import ACTION_RETRY
+from src.plan import Plan
+from src.solver import ExpectimaxSolver
+from src.speculation import Speculation, speculative_states
+from src.tracing import NULL_TRACER
+from src.trajectory import state_columns
+
+ACTION_FORMATS = ("text", "json", "tool")
+# stream_drain 为 cancel 时，提前结束的流式回复记入上下文前附加的标记
+TRUNCATED_MARK = "\n[回复在行动之后被截断]"
 
 class InteractionProcessor:
-    def __init__(self, env, model="gemini-2.5-flash"):
+    def __init__(self, env, model="gemini-2.5-flash", verbose=True, context_policy="full", context_max_turns=6,
+                 cache=None, tracer=None, plan_mode=False, stream=False, stream_drain="cancel", action_first=False,
+                 policy_seed=None, rules=None, action_format="text", action_retries=2, observation_format="verbose",
+                 prompt_cache="auto", router=None, trajectory=False, speculate=0):
         self.all_items = [
             "magnifying_glass",
             "cigarette_pack",
@@ -20,6 +51,77 @@ class InteractionProcessor:
         self.model = model
         self.player_items:list[str] = []
         self.dealer_items:list[str] = []
+        self.verbose = verbose
+        self.decisions = 0
+        # 每次决策的耗时拆分：model（决策）、env（等待游戏）、parse（解析屏幕）
+        self.turn_timings = []
+        self.context_policy = context_policy
+        self.context_max_turns = context_max_turns
+        self.context = None
+        # model 为 solver 时由 expectimax 求解器决策，为 random 时随机选择合法行动，都不调用模型
+        if model == "solver":
+            self.solver = ExpectimaxSolver()
+        elif model == "random":
+            self.solver = RandomPolicy(policy_seed)
+        else:
+            self.solver = None
+        # 可选的 DecisionCache，命中时跳过模型调用
+        self.cache = cache
+        # 追踪每次决策的各个阶段，未启用时为空操作；同一个 tracer 也交给环境记录等待和解析
+        self.tracer = tracer or NULL_TRACER
+        if tracer is not None:
+            env.tracer = tracer
+        # 计划模式：模型一次给出整回合的行动计划，本地执行，计划失效时才重新询问
+        self.plan_mode = plan_mode
+        self.plan = None
+        # 流式调用：一旦出现完整且合法的 Action: 行就执行，剩余回复按 stream_drain
+        # 取消（cancel）或在后台读完（background）；action_first 要求模型先给出行动
+        if stream_drain not in ("cancel", "background"):
+            raise ValueError(f"Unsupported stream_drain: {stream_drain}")
+        self.stream = stream
+        self.stream_drain = stream_drain
+        self.action_first = action_first
+        self.pending_stream = None
+        # 可选的 RuleEngine，规则给出确定的行动时不调用模型
+        self.rules = rules
+        # 模型回复的格式：text 为 Action: 行，json 为受约束的 JSON 输出，tool 为工具调用；
+        # 后两者的 action 字段只能取当前合法的行动
+        if action_format not in ACTION_FORMATS:
+            raise ValueError(f"Unsupported action_format: {action_format}")
+        if action_format != "text" and (plan_mode or stream):
+            raise ValueError(f"action_format {action_format} does not support plan_mode or stream")
+        self.action_format = action_format
+        # 行动无效且无法在本地修正时最多重新询问的次数，仍然无效时由求解器代为决策
+        self.action_retries = action_retries
+        self.fallback_policy = None
+        # 本局执行行动出错的次数和连续出错的次数，连续出错超过 action_retries 次才中止本局
+        self.action_errors = 0
+        self.consecutive_errors = 0
+        # 观察的编码格式（verbose 为原有的完整格式，compact 为紧凑格式）和前缀缓存方式
+        if observation_format not in OBSERVATION_FORMATS:
+            raise ValueError(f"Unsupported observation_format: {observation_format}")
+        if prompt_cache not in PROMPT_CACHE_MODES:
+            raise ValueError(f"Unsupported prompt_cache: {prompt_cache}")
+        self.observation_format = observation_format
+        self.prompt_cache = prompt_cache
+        # 可选的 ModelRouter：按服务商限流、重试、对冲并在失败时换用备用模型；流式调用不经过它
+        self.router = router
+        # 记录每次决策（状态、模型回复、行动、结果和耗时），一局结束后在 trajectory_rows 中
+        self.trajectory = trajectory
+        self.trajectory_rows = []
+        self.record = None
+        # 推测执行：射击后庄家行动期间，为最可能的 speculate 个下一状态提前调用模型，0 为关闭；
+        # 只用于需要等待游戏输出的 TextEnv，模拟环境中庄家的回合没有耗时
+        if speculate and (plan_mode or stream):
+            raise ValueError("speculate does not support plan_mode or stream")
+        self.speculate = speculate if self.solver is None and isinstance(env, TextEnv) else 0
+        self.speculation = None
+        self.speculation_executor = None
+
+    def log(self, *args):
+        """输出过程信息，批量运行时可关闭"""
+        if self.verbose:
+            print(*args)
         
     def get_item_name(self, item_id, is_player=True):
         if is_player:
@@ -33,21 +135,26 @@ class InteractionProcessor:
         
     def shoot(self, target:str):
         if target == "self":
-            print("Shooting self")
+            self.log("Shooting self")
         elif target == "dealer":
-            print("Shooting dealer")
+            self.log("Shooting dealer")
         else:
-            print("Invalid target")
+            self.log("Invalid target")
         self.env.shoot(target)
 
     def use(self, items:list):
+        item = self.resolve_item(items)
+        if item is not None:
+            self.env.use(items, item)
+
+    def resolve_item(self, items:list):
+        """检查 use 的参数，返回实际生效的道具名称（偷取时为庄家的道具），参数个数不对时返回 None"""
         if len(items) == 1:
             item = self.get_item_name(int(items[0]))
             if item == "adrenaline":
                 raise ValueError("Adrenaline usage requires a target item")            
-            print(f"Using item: {item}")
-            self.env.use(items, item)
-            # Logic for using a single item
+            self.log(f"Using item: {item}")
+            return item
         elif len(items) == 2:
             item = self.get_item_name(int(items[0]))
             if item != "adrenaline":
@@ -55,8 +162,9 @@ class InteractionProcessor:
             item = self.get_item_name(int(items[1]), is_player=False)
             if item == "adrenaline":
                 raise ValueError("Cannot steal adrenaline")
-            print(f"Using item: {item} and stealing {item} from dealer")
-            self.env.use(items, item)
+            self.log(f"Using item: {item} and stealing {item} from dealer")
+            return item
+        return None
 
     def act(self, action):
         action = action.split()
@@ -66,46 +174,498 @@ class InteractionProcessor:
         elif action[0] == "use":
             self.use(action[1:])    
 
+    def build_messages(self, state, context=None):
+        """把当前状态加入上下文（默认为 self.context），返回本次调用的消息"""
+        context = context or self.context
+        with self.tracer.span("observation", format=self.observation_format) as span:
+            context.on_round(self.env.load_count)
+            observation = encode_observation(state, self.observation_format)
+            encoded, verbose = observation_tokens(observation, state, self.observation_format)
+            span.set(tokens=encoded, verbose_tokens=verbose)
+            context.record_observation_tokens(encoded, verbose)
+            context.add_observation(observation, state)
+            return self.prepare_messages(context.build())
+
+    def prepare_messages(self, messages):
+        """按 prompt_cache 整理发给接口的消息"""
+        if self.prompt_cache == "cache_control":
+            return mark_cache_prefix(messages)
+        return messages
+
+    def query_model(self, state):
+        """把当前状态发给模型，返回解析出的行动"""
+        self.finish_stream()
+        hit = self.take_speculation(state)
+        if hit is not None:
+            context, future = hit
+            try:
+                result = future.result()
+            except Exception as e:
+                self.log(f"推测调用失败: {e}")
+                self.tracer.count("speculation_errors")
+            else:
+                response = self.use_speculation(context, result)
+                return self.ensure_valid(self.parse_response(response, state), state)
+        messages = self.build_messages(state)
+        with self.tracer.span("llm_call", model=self.model, stream=self.stream) as span:
+            if self.stream and not self.plan_mode:
+                response, usage, action = self.stream_action(messages, state)
+                if action is not None:
+                    self.record_call(span, usage)
+                    self.log("AI Response (流式):", response)
+                    self.record_decision(source="model", response=response)
+                    self.context.add_response(response, action)
+                    return action
+            else:
+                message, usage = self.chat(messages, **self.output_options(state))
+                response = self.response_text(message)
+            self.record_call(span, usage)
+        self.log("AI Response:", response)
+        self.record_decision(source="model", response=response)
+        return self.ensure_valid(self.parse_response(response, state), state)
+
+    def chat(self, messages, **options):
+        """调用模型，返回 (message, usage)；配置了 router 时由它负责限流、重试、对冲和备用模型"""
+        if self.router is not None:
+            return self.router.call(messages, model=self.model, **options)
+        return call_openai_chat(messages, model=self.model, with_usage=True, **options)
+
+    def speculative_chat(self, messages, options):
+        """推测执行中的模型调用，另外返回请求数，采用时再记录"""
+        message, usage = self.chat(messages, **options)
+        return message, usage, last_call_attempts()
+
+    def start_speculation(self, action, state):
+        """执行射击之前调用：射击结果出现后推测庄家行动之后的状态，并提前为它们调用模型"""
+        self.cancel_speculation()
+        parts = action.split()
+        if not self.speculate or parts[0] != "shoot":
+            return
+        self.speculation = Speculation()
+        self.launch_speculation(self.speculation, parts[1], state["use_info"], self.env.mark())
+
+    def launch_speculation(self, speculation, target, use_info, mark):
+        if self.speculation_executor is None:
+            self.speculation_executor = ThreadPoolExecutor(
+                max_workers=self.speculate * 2, thread_name_prefix="speculation"
+            )
+        threading.Thread(
+            target=self.speculate_next, args=(speculation, target, use_info, mark), daemon=True
+        ).start()
+
+    def speculate_next(self, speculation, target, use_info, mark):
+        """等待玩家这一发的结果，为最可能的下一状态各发出一个模型调用，上下文使用当前上下文的副本"""
+        line, state = self.env.wait_for_shot(timeout=self.env.wait_timeout, since=mark)
+        if line is None:
+            return
+        candidates = speculative_states(state, target, "实弹" in line, use_info, self.speculate)
+        for _, next_state in candidates:
+            context = copy.deepcopy(self.context)
+            messages = self.build_messages(next_state, context)
+            future = self.speculation_executor.submit(self.speculative_chat, messages, self.output_options(next_state))
+            if not speculation.add(next_state, context, future):
+                future.cancel()
+                return
+            self.tracer.count("speculative_calls")
+
+    def take_speculation(self, state=None):
+        """结束当前的推测：返回与 state 一致的 (上下文, future)，其余的取消，没有命中时返回 None"""
+        speculation, self.speculation = self.speculation, None
+        if speculation is None:
+            return None
+        if speculation.task is not None:
+            speculation.task.cancel()
+        hit, rest = speculation.claim(state)
+        for _, future in rest:
+            if not future.cancel():
+                # 已经发出的请求无法中止，完成后把 token 计入浪费
+                future.add_done_callback(self.count_wasted)
+        if rest:
+            self.tracer.count("speculation_cancelled", len(rest))
+        if state is not None and hit is None and rest:
+            self.tracer.count("speculation_misses")
+        return hit
+
+    def cancel_speculation(self):
+        self.take_speculation(None)
+
+    def count_wasted(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        usage = future.result()[1]
+        if usage is not None:
+            self.tracer.count("tokens", usage.prompt_tokens + usage.completion_tokens, kind="speculative_wasted")
+
+    def use_speculation(self, context, result):
+        """采用命中的推测：换上推测时构造的上下文并记录这次调用，返回回复文本"""
+        message, usage, attempts = result
+        self.context = context
+        self.tracer.count("speculation_hits")
+        record_call_attempts(attempts)
+        with self.tracer.span("llm_call", model=self.model, speculative=True) as span:
+            self.record_call(span, usage)
+        response = self.response_text(message)
+        self.log("AI Response (推测):", response)
+        self.record_decision(source="speculation", response=response)
+        return response
+
+    def stop_speculation(self):
+        """一局结束时取消推测并关闭线程池"""
+        self.cancel_speculation()
+        if self.speculation_executor is not None:
+            self.speculation_executor.shutdown(wait=False)
+            self.speculation_executor = None
+
+    def output_options(self, state):
+        """按 action_format 生成调用接口的额外参数"""
+        if self.action_format == "json":
+            return {"response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "action", "strict": True, "schema": action_schema(state)},
+            }}
+        if self.action_format == "tool":
+            return {
+                "tools": [{"type": "function", "function": {
+                    "name": "act",
+                    "description": "执行本次行动",
+                    "parameters": action_schema(state),
+                }}],
+                "tool_choice": {"type": "function", "function": {"name": "act"}},
+            }
+        return {}
+
+    def response_text(self, message):
+        """取出回复文本；结构化输出转换为与文本格式相同的 Reasoning/Action，便于记入上下文"""
+        if self.action_format == "text":
+            return message.content or ""
+        if self.action_format == "tool" and message.tool_calls:
+            raw = message.tool_calls[0].function.arguments
+        else:
+            raw = message.content or ""
+        try:
+            data = json.loads(raw)
+            return f"Reasoning: {data.get('reasoning', '')}\nAction: {data['action']}"
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self.tracer.count("parse_failures", source="structured")
+            return raw
+
+    def ensure_valid(self, action, state):
+        """行动不合法时只把错误发给模型重新询问，最多 action_retries 次，仍然不合法时由求解器决策"""
+        error = validate_action(action, state)
+        for _ in range(self.action_retries):
+            if error is None:
+                return action
+            self.log(f"行动无效（{error}），重新询问")
+            self.tracer.count("action_retries")
+            messages = self.retry_messages(state, error)
+            with self.tracer.span("llm_call", model=self.model, retry=True) as span:
+                message, usage = self.chat(messages, **self.output_options(state))
+                self.record_call(span, usage)
+            action = self.parse_retry(self.response_text(message), state)
+            error = validate_action(action, state)
+        if error is None:
+            return action
+        return self.fallback_action(state, error)
+
+    def retry_messages(self, state, error):
+        return self.prepare_messages(self.context.build_retry(ACTION_RETRY.format(
+            error=error,
+            legal_actions="\n".join(legal_actions(state)),
+        )))
+
+    def parse_retry(self, response, state):
+        """解析重新询问的回复，合法时替换上下文中记录的回复"""
+        self.log("AI Response (重新询问):", response)
+        self.record_decision(response=response)
+        action = self.clean_action(response, state)
+        if validate_action(action, state) is None:
+            self.context.add_response(response, action)
+        return action
+
+    def fallback_action(self, state, error):
+        """多次询问后仍然没有合法行动，由求解器代为决策，避免中止整局游戏"""
+        self.log(f"行动仍然无效（{error}），由求解器决策")
+        self.tracer.count("fallback_actions")
+        self.record_decision(source="fallback")
+        if self.fallback_policy is None:
+            self.fallback_policy = ExpectimaxSolver()
+        return self.fallback_policy.decide(state)
+
+    def clean_action(self, response, state):
+        """从回复中取出行动，不合法时尝试在本地修正"""
+        action = extract_action(response)
+        if action is None:
+            self.tracer.count("parse_failures", source="response")
+        if action is not None and validate_action(action, state) is None:
+            return action
+        repaired = repair_action(response if action is None else action, state)
+        if repaired is not None:
+            self.log(f"修正行动: {action!r} -> {repaired}")
+            self.tracer.count("action_repairs")
+            return repaired
+        return action or ""
+
+    def parse_response(self, response, state):
+        """从模型回复中解析行动（计划模式下解析计划并返回第一步），并记入上下文"""
+        if self.plan_mode:
+            self.plan = Plan.parse(response, state)
+            action = self.plan.next_action(state) if self.plan is not None else None
+            if action is not None:
+                self.context.add_response(response, self.plan.describe())
+                return action
+            # 没有可执行的计划时按单个行动解析
+            self.plan = None
+            self.tracer.count("parse_failures", source="plan")
+        action = self.clean_action(response, state)
+        self.context.add_response(response, action)
+        return action
+
+    def record_call(self, span, usage):
+        """记录一次模型调用的 token 用量和重试次数"""
+        if usage is not None:
+            if span is not None:
+                span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+            self.tracer.count("tokens", usage.prompt_tokens, kind="prompt")
+            self.tracer.count("tokens", usage.completion_tokens, kind="completion")
+            self.tracer.count("tokens", cached_tokens(usage), kind="cached")
+        retries = last_call_attempts() - 1
+        if retries > 0:
+            self.tracer.count("retries", retries)
+        self.context.record_usage(usage)
+        self.log("Token 统计:", self.context.call_stats[-1])
+        if self.record is not None:
+            self.record["llm_calls"] += 1
+            if usage is not None:
+                self.record["prompt_tokens"] += usage.prompt_tokens
+                self.record["completion_tokens"] += usage.completion_tokens
+                self.record["cached_tokens"] += cached_tokens(usage)
+
+    def stream_action(self, messages, state):
+        """流式调用模型，返回 (已收到的回复, usage, 取得的行动)
+
+        出现完整且合法的行动时立即返回；stream_drain 为 cancel 时剩余回复不再读取，
+        返回的回复带有 TRUNCATED_MARK，记入上下文后模型能看出这一轮的回复不完整。
+        读完整个回复时取最后一个未换行的 Action: 行，行动为 None 表示没有取得合法的行动。
+        """
+        stream = stream_openai_chat(messages, model=self.model)
+        parser = ActionStreamParser()
+        for text in stream:
+            action = parser.feed(text)
+            if action is not None and validate_action(action, state) is None:
+                self.tracer.count("early_actions")
+                if self.stream_drain == "background":
+                    stream.drain_in_background()
+                    self.pending_stream = stream
+                    return stream.text(), stream.usage, action
+                stream.cancel()
+                return stream.text() + TRUNCATED_MARK, stream.usage, action
+        action = parser.finish()
+        if action is not None and validate_action(action, state) is None:
+            return stream.text(), stream.usage, action
+        return stream.text(), stream.usage, None
+
+    def finish_stream(self):
+        """等待后台读取的流式回复完成，把完整回复和用量补记到上下文中"""
+        if self.pending_stream is None:
+            return
+        stream, self.pending_stream = self.pending_stream, None
+        stream.wait()
+        self.context.update_response(stream.text())
+        if stream.usage is not None:
+            self.tracer.count("tokens", stream.usage.prompt_tokens, kind="prompt")
+            self.tracer.count("tokens", stream.usage.completion_tokens, kind="completion")
+        self.context.record_usage(stream.usage)
+
+    def begin_game(self):
+        """游戏启动后初始化计划和上下文"""
+        self.log("游戏已启动，等待输出...")
+        self.plan = None
+        if self.plan_mode:
+            instruction = PLAN_INSTRUCTION
+        elif self.action_first:
+            instruction = ACTION_FIRST_INSTRUCTION
+        else:
+            instruction = INSTRUCTION
+        if self.observation_format == "compact":
+            instruction += COMPACT_FORMAT
+        self.context = ContextManager(instruction, policy=self.context_policy, max_turns=self.context_max_turns)
+
+    def observe(self):
+        """读取当前游戏状态"""
+        self.log("当前游戏屏幕:\n", self.env.get_current_screen())
+        state = self.env.get_current_game_state()
+        self.log("当前游戏状态:\n", state)
+        self.player_items = state["player_items"]
+        self.dealer_items = state["dealer_items"]
+        if self.trajectory:
+            self.record = {
+                "decision": self.decisions,
+                "round": self.env.load_count,
+                "model": self.model,
+                "source": None,
+                "llm_calls": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cached_tokens": 0,
+                "response": None,
+                **state_columns(state),
+            }
+        return state
+
+    def record_decision(self, **fields):
+        """补充当前决策的记录（来源、模型回复等），未启用 trajectory 时为空操作"""
+        if self.record is not None:
+            self.record.update(fields)
+
+    def local_decision(self, state):
+        """不调用模型的决策：求解器/随机策略、计划中的下一步、规则、决策缓存，都没有时返回 None"""
+        if self.solver is not None:
+            # 本地策略的来源记为策略名（solver 或 random），轨迹中可以区分随机基线和求解器
+            self.record_decision(source=self.model)
+            with self.tracer.span("solver"):
+                return self.solver.decide(state)
+        plan_action = self.plan.next_action(state) if self.plan is not None else None
+        if plan_action is not None:
+            self.log("执行计划中的下一步")
+            self.tracer.count("plan_steps")
+            self.record_decision(source="plan")
+            return plan_action
+        if self.plan is not None:
+            self.tracer.count("plan_invalidations")
+            self.plan = None
+        rule_name, action = self.rules.decide(state) if self.rules is not None else (None, None)
+        if action is not None:
+            self.log(f"规则 {rule_name} 决定行动")
+            self.tracer.count("rule_fired", rule=rule_name)
+            self.record_decision(source=f"rule:{rule_name}")
+            return action
+        action = self.cache.get(state) if self.cache is not None else None
+        if action is not None:
+            self.log("命中决策缓存")
+            self.tracer.count("cache_hits")
+            self.record_decision(source="cache")
+            return action
+        if self.cache is not None:
+            self.tracer.count("cache_misses")
+        return None
+
+    def before_action(self, state, decide_start):
+        """记录执行行动前的状态，供 after_action 计算耗时和判断计划是否失效"""
+        return {
+            "decide_start": decide_start,
+            "act_start": time.perf_counter(),
+            "parse_start": self.env.parse_time,
+            "load_count": self.env.load_count,
+            "player_health": state["player_health"],
+        }
+
+    def after_action(self, action, before, decision_state):
+        """行动成功执行后更新计划、耗时统计和决策缓存"""
+        self.decisions += 1
+        self.consecutive_errors = 0
+        if self.plan is not None and not self.plan.after_action(
+            action,
+            reloaded=self.env.load_count != before["load_count"],
+            hurt=self.env.get_current_game_state()["player_health"] < before["player_health"],
+        ):
+            self.plan = None
+        parse_time = self.env.parse_time - before["parse_start"]
+        timings = {
+            "model": before["act_start"] - before["decide_start"],
+            "env": time.perf_counter() - before["act_start"] - parse_time,
+            "parse": parse_time,
+        }
+        self.turn_timings.append(timings)
+        if self.record is not None:
+            after = self.env.get_current_game_state()
+            self.record.update({
+                "action": action,
+                "player_health_after": after["player_health"],
+                "dealer_health_after": after["dealer_health"],
+                "reloaded": self.env.load_count != before["load_count"],
+                "model_time": timings["model"],
+                "env_time": timings["env"],
+                "parse_time": timings["parse"],
+            })
+            self.trajectory_rows.append(self.record)
+            self.record = None
+        if self.cache is not None and decision_state is not None:
+            self.cache.put(decision_state, action)
+
+    def on_action_error(self, error):
+        """执行行动出错（参数不合法或环境解析结果失败）：记录错误，返回是否应中止本局
+
+        环境会在报错前等到重新轮到玩家，因此下一次循环重新读取状态即可继续，计划和推测都作废。
+        连续出错超过 action_retries 次时多半已经无法恢复，才中止本局。
+        """
+        self.log(f"Error in action: {error}")
+        self.tracer.count("action_errors")
+        self.action_errors += 1
+        self.consecutive_errors += 1
+        self.plan = None
+        self.cancel_speculation()
+        return self.consecutive_errors > self.action_retries
+
+    def game_result(self, start_time, error):
+        """本局结果统计"""
+        result = dict(self.env.get_game_result())
+        result.update({
+            "decisions": self.decisions,
+            "action_errors": self.action_errors,
+            "wall_time": time.time() - start_time,
+            "error": error,
+            "tokens": self.context.get_stats() if self.context else None,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "rules": self.rules.stats() if self.rules is not None else None,
+            "turn_timings": self.turn_timings,
+        })
+        return result
+
     def play(self):
+        """进行一局游戏，返回本局结果统计"""
+        start_time = time.time()
+        error = None
+        self.decisions = 0
+        self.action_errors = 0
+        self.consecutive_errors = 0
+        self.turn_timings = []
+        self.trajectory_rows = []
         if self.env.start_game():
-            print("游戏已启动，等待输出...")
-            messages = [
-                {"role": "system", "content": INSTRUCTION},
-            ]
-            while True and not self.env.is_closed():
-                print("当前游戏屏幕:\n", self.env.get_current_screen())
-                state = self.env.get_current_game_state()
-                print("当前游戏状态:\n", state)
-                self.player_items = state["player_items"]
-                self.dealer_items = state["dealer_items"]
-                messages.append(
-                    {"role": "user", "content": OBSERVATION.format(
-                        player_health=state["player_health"],
-                        dealer_health=state["dealer_health"],
-                        max_health=state["max_health"],
-                        live_count=state["bullet_types"]["live_shell"],
-                        blank_count=state["bullet_types"]["blank"],
-                        player_items="\n".join([f"{i}.{item}" for i, item in enumerate(state["player_items"])]),
-                        dealer_items="\n".join([f"{i}.{item}" for i, item in enumerate(state["dealer_items"])]),
-                        use_info=state["use_info"]
-                    )}
-                )
-                response = call_openai_chat(messages, model=self.model).content
-                print("AI Response:", response)
-                messages.append({"role": "assistant", "content": response})
-                # 从 Action: 后面开始提取行动
-                action = response.split("Action:")[-1].strip()
-                print("AI Action:", action)
-                try:
-                    print("等待行动...")
-                    self.act(action)
-                except ValueError as e:
-                    print(f"Error in action: {e}")
-                    break
+            self.begin_game()
+            while not self.env.is_closed():
+                state = self.observe()
+                decision_state = None
+                with self.tracer.span("decision", index=self.decisions) as decision_span:
+                    decide_start = time.perf_counter()
+                    action = self.local_decision(state)
+                    if action is None:
+                        # 执行行动时环境会原地修改状态，缓存需要行动前的状态
+                        decision_state = copy.deepcopy(state)
+                        action = self.query_model(state)
+                    else:
+                        self.cancel_speculation()
+                    self.log("AI Action:", action)
+                    decision_span.set(action=action)
+                    before = self.before_action(state, decide_start)
+                    try:
+                        self.log("等待行动...")
+                        with self.tracer.span("action", action=action):
+                            self.start_speculation(action, state)
+                            self.act(action)
+                        self.after_action(action, before, decision_state)
+                    except ValueError as e:
+                        if self.on_action_error(e):
+                            error = str(e)
+                            break
 
         else:
-            print("游戏开始失败")
-            return
+            self.log("游戏开始失败")
+            error = "游戏开始失败"
+
+        if self.context is not None:
+            self.finish_stream()
+        self.stop_speculation()
+        return self.game_result(start_time, error)
 
 if __name__ == "__main__":
     env = TextEnv()
@@ -35,4 +35,18 @@ INSTRUCTION="""
 Reasoning: <你的推理过程>
 Action: <你的行动>
 ```
-"""
\ No newline at end of file
+"""
+
+# 先给出行动再给出推理的回复格式，流式调用时可以在推理生成之前就执行行动
+ACTION_FIRST_INSTRUCTION = INSTRUCTION.replace(
+    """请按照以下格式进行回复：
+```
+Reasoning: <你的推理过程>
+Action: <你的行动>
+```""",
+    """请先想好行动，再按照以下格式进行回复（行动在前，简要理由在后）：
+```
+Action: <你的行动>
+Reasoning: <你的推理过程>
+```""",
+)
@@ -3,6 +3,7 @@ OBSERVATION = """
 你的生命值：{player_health}/{max_health}
 庄家的生命值：{dealer_health}/{max_health}
 当前枪膛中的子弹类型：实弹{live_count}发，空包弹{blank_count}发
+按顺序每一发是实弹的概率：{shell_probabilities}
 
 你的道具列表：
 {player_items}
@@ -14,4 +15,18 @@ OBSERVATION = """
 {use_info}
 
 请根据当前情况进行推理，并决定你的行动。你可以选择使用道具或射击。
-"""
\ No newline at end of file
+"""
+# 紧凑格式的观察，道具按类型合并并列出编号，适合对输入 token 敏感的模型
+COMPACT_OBSERVATION = """HP 你{player_health}/{max_health} 庄家{dealer_health}/{max_health} | 弹 实{live_count} 空{blank_count} | P(实) {shell_probabilities}
+你: {player_items}
+庄家: {dealer_items}
+{use_info}"""
+
+# 使用紧凑格式时附加在系统提示后的格式说明（系统提示不变，可被服务商的前缀缓存复用）
+COMPACT_FORMAT = """
+每回合的局面以紧凑格式给出：
+HP 你<生命值>/<上限> 庄家<生命值>/<上限> | 弹 实<实弹数> 空<空包弹数> | P(实) <按顺序每一发是实弹的概率，百分比>
+你: <道具名称>[<道具编号>,...] ...（编号即 use 使用的编号，- 表示没有道具）
+庄家: 同上
+最后一行（可能为空）为使用道具后的信息。
+"""
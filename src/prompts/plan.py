@@ -0,0 +1,29 @@
+from src.prompts.instruction import INSTRUCTION
+
+PLAN_FORMAT = """你可以一次给出本回合的完整行动计划，按顺序每行一个行动，格式与单个行动相同（如 use 1、shoot dealer）。
+道具编号以当前列出的编号为准，使用道具后编号的变化不需要你考虑。
+当后续行动取决于当前这一发子弹时（例如用放大镜查看之后），使用条件行动：
+    - `if live then <行动> else <行动>`：当前这一发为实弹时执行 then 后的行动，否则执行 else 后的行动。
+    - `if blank then <行动>`：当前这一发为空包弹时执行，否则跳过这一步。
+射击对方后，或本回合的计划无法继续时，你会收到新的局面再重新规划。
+
+请按照以下格式进行回复：
+```
+Reasoning: <你的推理过程>
+Plan:
+1. <行动>
+2. <行动>
+...
+```
+例如：
+```
+Reasoning: 先用放大镜确认当前子弹，再决定射击目标。
+Plan:
+1. use 0
+2. if live then use 2 else shoot self
+3. if live then shoot dealer
+```
+"""
+
+# 计划模式的系统提示：沿用游戏介绍和行动格式，把“每次只返回一个行动”替换为整回合计划
+PLAN_INSTRUCTION = INSTRUCTION.split("你每次只需返回一个行动")[0] + PLAN_FORMAT
@@ -0,0 +1,8 @@
+ACTION_RETRY = """你上一次给出的行动无效：{error}
+
+当前所有合法的行动：
+{legal_actions}
+
+请从中选择一个，只回复一行：
+Action: <你的行动>
+"""
@@ -0,0 +1,345 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+import yaml
+
+from src.model import get_async_client, get_client, model_provider, record_call_attempts
+from src.tracing import NULL_TRACER
+
+# 可以重试（或换用备用模型）的错误：超时、连接失败、429 和 5xx
+RETRYABLE_ERRORS = (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+
+class TokenBucket:
+    """令牌桶限流：每秒补充 rate 个令牌，最多积累 burst 个"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """取一个令牌，返回需要等待的秒数；令牌不足时预支，调用方等待后即可发出请求"""
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_acquire(self):
+        """有令牌时取一个并返回 True，否则不等待直接返回 False（用于可有可无的对冲请求）"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class ProviderStats:
+    """服务商最近 window 次请求的延迟和成败，以及累计的请求、错误、对冲和备用次数"""
+
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.counts = {
+            "requests": 0, "errors": 0, "timeouts": 0, "rate_limited": 0,
+            "hedges": 0, "hedge_wins": 0, "fallbacks": 0,
+        }
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.counts[name] += value
+
+    def record(self, latency=None, error=None):
+        with self.lock:
+            self.counts["requests"] += 1
+            self.outcomes.append(error is None)
+            if error is None:
+                self.latencies.append(latency)
+                return
+            self.counts["errors"] += 1
+            if isinstance(error, openai.APITimeoutError):
+                self.counts["timeouts"] += 1
+            elif isinstance(error, openai.RateLimitError):
+                self.counts["rate_limited"] += 1
+
+    def quantile(self, q):
+        """最近成功请求延迟的分位数，没有样本时返回 None"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    def error_rate(self, recent=20):
+        """最近 recent 次请求的失败比例和样本数"""
+        with self.lock:
+            outcomes = list(self.outcomes)[-recent:]
+        if not outcomes:
+            return 0.0, 0
+        return 1 - sum(outcomes) / len(outcomes), len(outcomes)
+
+    def snapshot(self):
+        error_rate, _ = self.error_rate()
+        with self.lock:
+            counts = dict(self.counts)
+            samples = len(self.latencies)
+        counts.update({
+            "latency_p50": self.quantile(0.5),
+            "latency_p95": self.quantile(0.95),
+            "latency_samples": samples,
+            "recent_error_rate": error_rate,
+        })
+        return counts
+
+
+class Provider:
+    """一个模型服务商：凭据、超时、限流、对冲阈值和统计
+
+    api_key/base_url 未指定时从环境变量 <NAME>_API_KEY / <NAME>_BASE_URL（或 api_key_env/base_url_env
+    指定的变量）读取。hedge_after 为发出对冲请求前等待的秒数，auto 表示使用最近延迟的 hedge_quantile 分位数。
+    最近的失败比例超过 max_error_rate 时视为不健康，有备用模型时优先使用备用模型。
+    """
+
+    def __init__(self, name, api_key=None, base_url=None, api_key_env=None, base_url_env=None, rate=None, burst=None,
+                 timeout=60.0, hedge_after=None, hedge_quantile=0.95, min_samples=20, max_error_rate=0.5):
+        self.name = name
+        self.api_key = api_key or os.environ.get(api_key_env or f"{name.upper()}_API_KEY")
+        self.base_url = base_url or os.environ.get(base_url_env or f"{name.upper()}_BASE_URL")
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.stats = ProviderStats()
+        self._client = None
+
+    def client(self):
+        """同步客户端，重试由 ModelRouter 负责，因此关闭客户端内部的重试"""
+        if self._client is None:
+            self._client = get_client(self.api_key, self.base_url).with_options(max_retries=0)
+        return self._client
+
+    def async_client(self):
+        return get_async_client(self.api_key, self.base_url).with_options(max_retries=0)
+
+    def hedge_delay(self):
+        """发出对冲请求前等待的秒数，None 表示不对冲"""
+        if self.hedge_after == "auto":
+            if len(self.stats.latencies) < self.min_samples:
+                return None
+            return self.stats.quantile(self.hedge_quantile)
+        return self.hedge_after
+
+    def healthy(self):
+        error_rate, samples = self.stats.error_rate()
+        return samples < 5 or error_rate <= self.max_error_rate
+
+
+class ModelRouter:
+    """按服务商限流、超时重试、对冲请求并在失败时换用备用模型的模型调用入口
+
+    models 为 {模型: {provider, fallback}}，未列出的模型按名称推断服务商（见 model_provider）。
+    每次调用依次尝试模型及其备用模型，每个模型最多重试 retries 次，重试间隔按 backoff 指数增长
+    （加随机抖动，429 时优先使用 Retry-After），不超过 max_backoff 秒。
+    返回值与 call_openai_chat(with_usage=True) 相同。
+    """
+
+    def __init__(self, providers=None, models=None, retries=2, backoff=0.5, max_backoff=8.0, tracer=None,
+                 max_hedge_threads=32):
+        self.providers = {name: Provider(name, **(options or {})) for name, options in (providers or {}).items()}
+        self.models = models or {}
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.tracer = tracer or NULL_TRACER
+        self.rng = random.Random()
+        self.executor = ThreadPoolExecutor(max_workers=max_hedge_threads, thread_name_prefix="router")
+
+    @classmethod
+    def from_config(cls, config, tracer=None):
+        """config 为配置字典，或 YAML 配置文件的路径"""
+        if isinstance(config, str):
+            with open(config, "r", encoding="utf-8") as f:
+                config = yaml.safe_load(f)
+        return cls(tracer=tracer, **config)
+
+    def provider(self, model):
+        name = self.models.get(model, {}).get("provider") or model_provider(model)
+        if name not in self.providers:
+            self.providers[name] = Provider(name)
+        return self.providers[name]
+
+    def route(self, model):
+        """本次调用依次尝试的模型：模型本身和备用模型链，不健康的服务商排到最后"""
+        chain = []
+        while model is not None and model not in chain:
+            chain.append(model)
+            model = self.models.get(model, {}).get("fallback")
+        healthy = [m for m in chain if self.provider(m).healthy()]
+        return healthy + [m for m in chain if m not in healthy]
+
+    def backoff_delay(self, retry, error):
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.backoff * 2 ** (retry - 1), self.max_backoff)
+        return delay * (0.5 + self.rng.random() / 2)
+
+    def call(self, messages, model, temperature=0.7, **options):
+        attempts = 0
+        last_error = None
+        for index, candidate in enumerate(self.route(model)):
+            provider = self.provider(candidate)
+            if index > 0:
+                provider.stats.add("fallbacks")
+                self.tracer.count("router_fallbacks", provider=provider.name)
+            for retry in range(self.retries + 1):
+                if retry > 0:
+                    self.tracer.count("router_retries", provider=provider.name)
+                    time.sleep(self.backoff_delay(retry, last_error))
+                if provider.bucket is not None:
+                    wait_time = provider.bucket.reserve()
+                    if wait_time > 0:
+                        self.tracer.count("router_throttled", provider=provider.name)
+                        time.sleep(wait_time)
+                attempts += 1
+                try:
+                    result = self._hedged(provider, candidate, messages, temperature, options)
+                    record_call_attempts(attempts)
+                    return result
+                except RETRYABLE_ERRORS as e:
+                    last_error = e
+        record_call_attempts(attempts)
+        raise last_error
+
+    def _request(self, provider, model, messages, temperature, options):
+        start = time.monotonic()
+        try:
+            response = provider.client().chat.completions.create(
+                model=model, messages=messages, temperature=temperature, timeout=provider.timeout, **options
+            )
+        except Exception as e:
+            provider.stats.record(error=e)
+            raise
+        provider.stats.record(latency=time.monotonic() - start)
+        return response.choices[0].message, response.usage
+
+    def _hedged(self, provider, model, messages, temperature, options):
+        """超过对冲阈值还没有返回时再发一个相同的请求，取先成功的结果"""
+        delay = provider.hedge_delay()
+        if delay is None:
+            return self._request(provider, model, messages, temperature, options)
+        futures = [self.executor.submit(self._request, provider, model, messages, temperature, options)]
+        done, _ = wait(futures, timeout=delay)
+        if not done and (provider.bucket is None or provider.bucket.try_acquire()):
+            provider.stats.add("hedges")
+            self.tracer.count("router_hedges", provider=provider.name)
+            futures.append(self.executor.submit(self._request, provider, model, messages, temperature, options))
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        provider.stats.add("hedge_wins")
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    async def acall(self, messages, model, temperature=0.7, **options):
+        """call 的异步版本，对冲请求中较慢的一个会被取消"""
+        attempts = 0
+        last_error = None
+        for index, candidate in enumerate(self.route(model)):
+            provider = self.provider(candidate)
+            if index > 0:
+                provider.stats.add("fallbacks")
+                self.tracer.count("router_fallbacks", provider=provider.name)
+            for retry in range(self.retries + 1):
+                if retry > 0:
+                    self.tracer.count("router_retries", provider=provider.name)
+                    await asyncio.sleep(self.backoff_delay(retry, last_error))
+                if provider.bucket is not None:
+                    wait_time = provider.bucket.reserve()
+                    if wait_time > 0:
+                        self.tracer.count("router_throttled", provider=provider.name)
+                        await asyncio.sleep(wait_time)
+                attempts += 1
+                try:
+                    result = await self._ahedged(provider, candidate, messages, temperature, options)
+                    record_call_attempts(attempts)
+                    return result
+                except RETRYABLE_ERRORS as e:
+                    last_error = e
+        record_call_attempts(attempts)
+        raise last_error
+
+    async def _arequest(self, provider, model, messages, temperature, options):
+        start = time.monotonic()
+        try:
+            response = await provider.async_client().chat.completions.create(
+                model=model, messages=messages, temperature=temperature, timeout=provider.timeout, **options
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            provider.stats.record(error=e)
+            raise
+        provider.stats.record(latency=time.monotonic() - start)
+        return response.choices[0].message, response.usage
+
+    async def _ahedged(self, provider, model, messages, temperature, options):
+        delay = provider.hedge_delay()
+        if delay is None:
+            return await self._arequest(provider, model, messages, temperature, options)
+        tasks = [asyncio.create_task(self._arequest(provider, model, messages, temperature, options))]
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and (provider.bucket is None or provider.bucket.try_acquire()):
+            provider.stats.add("hedges")
+            self.tracer.count("router_hedges", provider=provider.name)
+            tasks.append(asyncio.create_task(self._arequest(provider, model, messages, temperature, options)))
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            provider.stats.add("hedge_wins")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        """各服务商的请求数、错误数、对冲和备用次数、延迟分位数和最近的失败比例"""
+        return {name: provider.stats.snapshot() for name, provider in self.providers.items()}
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,74 @@
+from src.plan import known_shell
+
+# 规则注册表：名称 -> 函数(state) -> 行动或 None
+RULES = {}
+
+
+def rule(name):
+    """注册一条规则，规则函数接收游戏状态，返回确定的行动，不适用时返回 None"""
+    def register(func):
+        RULES[name] = func
+        return func
+    return register
+
+
+@rule("known_blank")
+def known_blank(state):
+    """当前这一发确定是空包弹（没有实弹了，或放大镜/手机已经看过）时射击自己，可以继续回合"""
+    if known_shell(state) is False:
+        return "shoot self"
+    return None
+
+
+@rule("known_live")
+def known_live(state):
+    """当前这一发确定是实弹时射击庄家；有手锯且庄家生命值大于 1 时先使用手锯"""
+    if known_shell(state) is not True:
+        return None
+    items = state["player_items"]
+    if "handsaw" in items and "手锯" not in state["use_info"] and state["dealer_health"] > 1:
+        return f"use {items.index('handsaw')}"
+    return "shoot dealer"
+
+
+@rule("cigarette")
+def cigarette(state):
+    """生命值未满时使用香烟，没有任何代价"""
+    items = state["player_items"]
+    if "cigarette_pack" in items and state["player_health"] < state["max_health"]:
+        return f"use {items.index('cigarette_pack')}"
+    return None
+
+
+class RuleEngine:
+    """在调用模型之前按顺序检查规则，第一条给出行动的规则直接决定本次行动
+
+    names 为启用的规则名称（按优先级排列），默认启用全部规则。fired 记录每条规则触发的次数。
+    """
+
+    def __init__(self, names=None):
+        names = list(RULES) if names is None else names
+        unknown = [name for name in names if name not in RULES]
+        if unknown:
+            raise ValueError(f"Unknown rules: {unknown}")
+        self.names = names
+        self.fired = {name: 0 for name in names}
+        self.checked = 0
+
+    def decide(self, state):
+        """返回 (规则名称, 行动)，没有规则适用时返回 (None, None)"""
+        self.checked += 1
+        for name in self.names:
+            action = RULES[name](state)
+            if action is not None:
+                self.fired[name] += 1
+                return name, action
+        return None, None
+
+    def stats(self):
+        total = sum(self.fired.values())
+        return {
+            "checked": self.checked,
+            "fired": dict(self.fired),
+            "fire_rate": total / self.checked if self.checked else 0.0,
+        }
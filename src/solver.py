@@ -0,0 +1,399 @@
+from src.environment.parser import PHONE_INFO_PATTERN
+
+ITEM_TYPES = (
+    "magnifying_glass",
+    "cigarette_pack",
+    "beer",
+    "handsaw",
+    "handcuffs",
+    "burner_phone",
+    "inverter",
+    "adrenaline",
+    "expired_medicine",
+)
+ITEM_INDEX = {item: i for i, item in enumerate(ITEM_TYPES)}
+# 只在射击前作为组合使用的道具，见 ExpectimaxSolver._shot_setups
+SETUP_ITEMS = ("handsaw", "handcuffs", "inverter")
+
+# 状态元组各字段的位置
+PH, DH, MAXH, LIVE, BLANK, KNOWN, INVERTED, SAW, CUFFED, P_ITEMS, D_ITEMS = range(11)
+_FIELDS = {
+    "ph": PH, "dh": DH, "maxh": MAXH, "live": LIVE, "blank": BLANK, "known": KNOWN,
+    "inverted": INVERTED, "saw": SAW, "cuffed": CUFFED, "p_items": P_ITEMS, "d_items": D_ITEMS,
+}
+
+
+def _count_items(items):
+    """把道具列表转为按类型计数的元组，作为状态编码的一部分"""
+    counts = [0] * len(ITEM_TYPES)
+    for item in items:
+        if item in ITEM_INDEX:
+            counts[ITEM_INDEX[item]] += 1
+    return tuple(counts)
+
+
+def _take(counts, item):
+    """从计数元组中取走一个道具"""
+    counts = list(counts)
+    counts[ITEM_INDEX[item]] -= 1
+    return tuple(counts)
+
+
+def _with(state, **changes):
+    """返回修改了部分字段的新状态"""
+    state = list(state)
+    for name, value in changes.items():
+        state[_FIELDS[name]] = value
+    return tuple(state)
+
+
+class _BudgetExceeded(Exception):
+    """一次决策展开的新状态超过 max_nodes，放弃当前视野的搜索"""
+
+
+class ExpectimaxSolver:
+    """对恶魔轮盘当前弹匣做带记忆化的 expectimax 搜索
+
+    状态编码为元组 (玩家生命, 庄家生命, 生命上限, 实弹数, 空包弹数, 已知子弹,
+    是否逆转, 是否手锯, 庄家是否被铐, 玩家道具计数, 庄家道具计数)，其中已知子弹
+    是按位置排序的 ((位置, 是否实弹), ...)，位置 0 为当前子弹，记录的是逆转前的类型。
+    所有状态的值都存放在置换表中（键还包括是否为玩家回合和道具视野），跨决策复用。
+
+    建模假设：
+        - 庄家不使用道具，只根据剩余子弹比例选择射击目标（实弹多于空包弹时射击玩家，
+          少于时射击自己，相等时各一半）。
+        - 弹匣打空后的局面用生命值比例估计胜率，不展开新的装弹。
+    状态值为玩家赢下当前轮的（估计）概率。
+
+    道具很多时状态数随道具数指数增长，因此按道具视野迭代加深：视野为 h 时只在当前及之后
+    h - 1 个玩家回合中使用道具，之后的回合按没有道具估值（道具可以不用，因此是下界）。
+    视野从 1 开始逐步加大，直到不再截断道具（精确解）或一次决策展开的新状态超过 max_nodes，
+    此时采用最后一个完整搜索的视野的结果；视野为 1 时就超出预算的（道具非常多），之后的状态
+    都按不使用道具估值。视野属于状态编码的一部分，置换表中只保存对应视野下的精确值，可以跨
+    决策复用；置换表超过 max_table_size 时在下一次决策开始前清空。
+    """
+
+    def __init__(self, max_table_size=1_000_000, max_nodes=5_000):
+        self.table = {}
+        self.max_table_size = max_table_size
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.truncated = False
+
+    # ---------- 状态构造 ----------
+
+    def encode_state(self, game_state):
+        """把环境的 current_game_state 转为规范状态编码"""
+        ph = game_state["player_health"]
+        dh = game_state["dealer_health"]
+        maxh = max(game_state["max_health"], ph)
+        live = max(game_state["bullet_types"]["live_shell"], 0)
+        blank = max(game_state["bullet_types"]["blank"], 0)
+        known = {}
+        inverted = saw = cuffed = False
+        belief = game_state.get("belief")
+        for line in game_state["use_info"].split("\n"):
+            if belief is not None:
+                # 子弹信息由信念状态给出，使用信息中只需要手锯和手铐
+                if "手锯" in line:
+                    saw = True
+                elif "手铐" in line:
+                    cuffed = True
+            elif "逆转器" in line:
+                inverted = not inverted
+            elif "放大镜" in line:
+                # 放大镜看到的是逆转后的实际类型
+                known[0] = ("实弹" in line) != inverted
+            elif "手锯" in line:
+                saw = True
+            elif "手铐" in line:
+                cuffed = True
+            elif "手机" in line:
+                match = PHONE_INFO_PATTERN.search(line)
+                if match and int(match.group(1)) >= 1:
+                    position = int(match.group(1)) - 1
+                    is_live = match.group(2) == "实弹"
+                    known[position] = is_live != inverted if position == 0 else is_live
+        if belief is not None:
+            live, blank = belief.live, belief.blank
+            known = belief.known_offsets()
+            inverted = belief.inverted
+        known = {pos: v for pos, v in known.items() if pos < live + blank}
+        known_live = sum(1 for v in known.values() if v)
+        if known_live > live or len(known) - known_live > blank:
+            known = {}
+        return (
+            ph, dh, maxh, live, blank,
+            tuple(sorted(known.items())),
+            inverted, saw, cuffed,
+            _count_items(game_state["player_items"]),
+            _count_items(game_state["dealer_items"]),
+        )
+
+    # ---------- 概率工具 ----------
+
+    def _shell_outcomes(self, state):
+        """当前子弹（逆转前）的分布，返回 [(概率, 是否实弹, 退膛后的状态)]"""
+        ph, dh, maxh, live, blank, known, _, _, cuffed, p_items, d_items = state
+        shifted = tuple((pos - 1, v) for pos, v in known if pos > 0)
+        if known and known[0][0] == 0:
+            options = [(1.0, known[0][1])]
+        else:
+            known_live = sum(1 for _, v in known if v)
+            p_live = (live - known_live) / (live + blank - len(known))
+            options = [(p_live, True), (1.0 - p_live, False)]
+        # 退膛后逆转和手锯效果都会消失
+        return [
+            (p, is_live, (ph, dh, maxh, live - is_live, blank - (not is_live), shifted, False, False, cuffed, p_items, d_items))
+            for p, is_live in options
+            if p > 0
+        ]
+
+    def _reveal_outcomes(self, state, position):
+        """揭示 position 位置子弹（逆转前）的分布，返回 [(概率, 是否实弹)]"""
+        known = dict(state[KNOWN])
+        if position in known:
+            return [(1.0, known[position])]
+        unknown = state[LIVE] + state[BLANK] - len(known)
+        known_live = sum(1 for v in known.values() if v)
+        p_live = (state[LIVE] - known_live) / unknown
+        return [(p, v) for p, v in ((p_live, True), (1.0 - p_live, False)) if p > 0]
+
+    @staticmethod
+    def _add_known(state, position, is_live):
+        known = dict(state[KNOWN])
+        known[position] = is_live
+        return _with(state, known=tuple(sorted(known.items())))
+
+    @staticmethod
+    def _load_end_value(ph, dh):
+        """弹匣打空时用生命值比例估计胜率"""
+        return ph / (ph + dh)
+
+    # ---------- 搜索 ----------
+
+    def _value(self, state, player_turn, horizon):
+        if state[DH] <= 0:
+            return 1.0
+        if state[PH] <= 0:
+            return 0.0
+        if state[LIVE] + state[BLANK] == 0:
+            return self._load_end_value(state[PH], state[DH])
+        empty = (0,) * len(ITEM_TYPES)
+        if horizon <= 0:
+            # 超出道具视野：之后不再使用道具
+            if state[P_ITEMS] != empty:
+                self.truncated = True
+            state = _with(state, p_items=empty, d_items=empty)
+        elif state[P_ITEMS][ITEM_INDEX["adrenaline"]] == 0 and any(state[D_ITEMS]):
+            # 庄家道具只会通过肾上腺素影响局面，没有肾上腺素时不区分庄家道具
+            state = _with(state, d_items=empty)
+        if state[P_ITEMS] == empty and state[D_ITEMS] == empty:
+            # 没有道具时视野不影响状态值，共用同一个表项
+            horizon = 0
+        else:
+            # 每个玩家回合至少打出一发，视野超过剩余子弹数时不会截断，同样共用表项
+            horizon = min(horizon, state[LIVE] + state[BLANK])
+        key = (state, player_turn, horizon)
+        value = self.table.get(key)
+        if value is not None:
+            return value
+        self.nodes += 1
+        if self.nodes > self.max_nodes and horizon > 0:
+            if horizon > 1:
+                raise _BudgetExceeded
+            # 视野为 1 也超出预算：剩余状态按不使用道具估值（下界），不写入置换表
+            return self._value(_with(state, p_items=empty, d_items=empty), player_turn, 0)
+        if player_turn:
+            value = max(value for _, value in self._player_actions(state, horizon))
+        else:
+            value = self._dealer_value(state, horizon)
+        # 超出预算之后算出的值可能用到了上面的估值，只有没有道具的局面仍是精确值
+        if horizon == 0 or self.nodes <= self.max_nodes:
+            self.table[key] = value
+        return value
+
+    def _pass_turn(self, state, horizon):
+        """玩家回合结束：庄家被铐则跳过庄家回合，下一个玩家回合的道具视野减一"""
+        if state[CUFFED]:
+            return self._value(_with(state, cuffed=False), True, horizon - 1)
+        return self._value(state, False, horizon - 1)
+
+    def _shoot_value(self, state, target, horizon):
+        damage = 2 if state[SAW] else 1
+        value = 0.0
+        for p, is_live, next_state in self._shell_outcomes(state):
+            actual_live = is_live != state[INVERTED]
+            if target == "dealer":
+                if actual_live:
+                    next_state = _with(next_state, dh=next_state[DH] - damage)
+                value += p * self._pass_turn(next_state, horizon)
+            elif actual_live:
+                next_state = _with(next_state, ph=next_state[PH] - damage)
+                value += p * self._pass_turn(next_state, horizon)
+            else:
+                value += p * self._value(next_state, True, horizon)
+        return value
+
+    def _item_value(self, state, item, horizon):
+        """在已取走道具的状态上应用 item 的效果，返回期望值；无意义的使用返回 None"""
+        if item == "magnifying_glass":
+            if any(pos == 0 for pos, _ in state[KNOWN]):
+                return None
+            return sum(p * self._value(self._add_known(state, 0, v), True, horizon) for p, v in self._reveal_outcomes(state, 0))
+        if item == "cigarette_pack":
+            if state[PH] >= state[MAXH]:
+                return None
+            return self._value(_with(state, ph=state[PH] + 1), True, horizon)
+        if item == "beer":
+            return sum(p * self._value(next_state, True, horizon) for p, _, next_state in self._shell_outcomes(state))
+        if item == "handsaw":
+            if state[SAW]:
+                return None
+            return self._value(_with(state, saw=True), True, horizon)
+        if item == "handcuffs":
+            if state[CUFFED]:
+                return None
+            return self._value(_with(state, cuffed=True), True, horizon)
+        if item == "burner_phone":
+            total = state[LIVE] + state[BLANK]
+            if total < 2:
+                return None
+            value = 0.0
+            for position in range(1, total):
+                for p, v in self._reveal_outcomes(state, position):
+                    value += p / (total - 1) * self._value(self._add_known(state, position, v), True, horizon)
+            return value
+        if item == "inverter":
+            return self._value(_with(state, inverted=not state[INVERTED]), True, horizon)
+        if item == "expired_medicine":
+            healed = _with(state, ph=min(state[MAXH], state[PH] + 2))
+            hurt = _with(state, ph=state[PH] - 1)
+            return 0.5 * self._value(healed, True, horizon) + 0.5 * self._value(hurt, True, horizon)
+        return None
+
+    def _shot_setups(self, state, target):
+        """射击前可叠加的手锯/手铐/逆转器组合，返回 [(第一步行动, 射击前的状态)]
+
+        手锯只影响下一次射击，手铐只影响下一次回合交接，逆转器只影响当前这一发（之后喝啤酒
+        或看放大镜都不会比之前用更好），三者与其他道具的使用顺序无关，因此只在射击前按固定
+        顺序作为组合考虑，不单独展开，从而大幅减少需要搜索的使用顺序。
+        每种道具可以用自己的，也可以用肾上腺素从庄家处偷取。
+        """
+        setups = [(None, state)]
+        for item, field in (("handsaw", "saw"), ("handcuffs", "cuffed"), ("inverter", "inverted")):
+            if item == "handsaw" and target == "self":
+                continue
+            flag = _FIELDS[field]
+            extended = []
+            for first, setup in setups:
+                extended.append((first, setup))
+                if setup[flag] and item != "inverter":
+                    continue
+                # 逆转器切换当前子弹，其余两种道具打开效果
+                effect = {field: not setup[flag]}
+                if setup[P_ITEMS][ITEM_INDEX[item]] > 0:
+                    used = _with(setup, p_items=_take(setup[P_ITEMS], item))
+                    extended.append((first or ("use", item), _with(used, **effect)))
+                if setup[P_ITEMS][ITEM_INDEX["adrenaline"]] > 0 and setup[D_ITEMS][ITEM_INDEX[item]] > 0:
+                    used = _with(
+                        setup,
+                        p_items=_take(setup[P_ITEMS], "adrenaline"),
+                        d_items=_take(setup[D_ITEMS], item),
+                    )
+                    extended.append((first or ("steal", item), _with(used, **effect)))
+            setups = extended
+        return setups
+
+    def _player_actions(self, state, horizon):
+        """枚举玩家的所有有效行动，返回 [(行动描述, 期望值)]
+
+        行动描述为 ("shoot", 目标)、("use", 道具) 或 ("steal", 道具)，对于带手锯/手铐的
+        射击组合，返回的是组合中的第一步。
+        """
+        # 未满血时抽烟总是不亏，且与其他行动顺序无关，直接作为唯一选择
+        if state[P_ITEMS][ITEM_INDEX["cigarette_pack"]] > 0 and state[PH] < state[MAXH]:
+            remaining = _with(state, p_items=_take(state[P_ITEMS], "cigarette_pack"))
+            return [(("use", "cigarette_pack"), self._item_value(remaining, "cigarette_pack", horizon))]
+
+        actions = []
+        for target in ("self", "dealer"):
+            for first, setup in self._shot_setups(state, target):
+                actions.append((first or ("shoot", target), self._shoot_value(setup, target, horizon)))
+        for item in ITEM_TYPES:
+            if item in SETUP_ITEMS or state[P_ITEMS][ITEM_INDEX[item]] == 0:
+                continue
+            remaining = _with(state, p_items=_take(state[P_ITEMS], item))
+            if item == "adrenaline":
+                for target in ITEM_TYPES:
+                    if target == "adrenaline" or target in SETUP_ITEMS or state[D_ITEMS][ITEM_INDEX[target]] == 0:
+                        continue
+                    stolen = _with(remaining, d_items=_take(state[D_ITEMS], target))
+                    value = self._item_value(stolen, target, horizon)
+                    if value is not None:
+                        actions.append((("steal", target), value))
+                continue
+            value = self._item_value(remaining, item, horizon)
+            if value is not None:
+                actions.append((("use", item), value))
+        return actions
+
+    def _dealer_value(self, state, horizon):
+        """庄家回合：按建模的庄家策略对射击目标和子弹类型取期望"""
+        live, blank = state[LIVE], state[BLANK]
+        p_target_player = 1.0 if live > blank else 0.0 if live < blank else 0.5
+        if state[INVERTED]:
+            p_target_player = 1.0 - p_target_player
+        value = 0.0
+        for target, p_target in (("player", p_target_player), ("self", 1.0 - p_target_player)):
+            if p_target <= 0:
+                continue
+            for p, is_live, next_state in self._shell_outcomes(state):
+                actual_live = is_live != state[INVERTED]
+                if target == "player":
+                    if actual_live:
+                        next_state = _with(next_state, ph=next_state[PH] - 1)
+                    value += p_target * p * self._value(next_state, True, horizon)
+                elif actual_live:
+                    next_state = _with(next_state, dh=next_state[DH] - 1)
+                    value += p_target * p * self._value(next_state, True, horizon)
+                else:
+                    value += p_target * p * self._value(next_state, False, horizon)
+        return value
+
+    # ---------- 对外接口 ----------
+
+    def _format_action(self, action, game_state):
+        """把行动描述转为 InteractionProcessor.act 接受的格式"""
+        kind, target = action
+        if kind == "shoot":
+            return f"shoot {target}"
+        if kind == "use":
+            return f"use {game_state['player_items'].index(target)}"
+        return f"use {game_state['player_items'].index('adrenaline')} {game_state['dealer_items'].index(target)}"
+
+    def action_values(self, game_state):
+        """返回当前局面下每个有效行动（InteractionProcessor.act 格式）的期望胜率"""
+        state = self.encode_state(game_state)
+        if state[LIVE] + state[BLANK] == 0 or state[PH] <= 0 or state[DH] <= 0:
+            return {"shoot dealer": 0.0}
+        if len(self.table) >= self.max_table_size:
+            self.table.clear()
+        self.nodes = 0
+        actions = None
+        # 视野达到剩余子弹数时一定不会截断
+        for horizon in range(1, state[LIVE] + state[BLANK] + 1):
+            self.truncated = False
+            try:
+                actions = self._player_actions(state, horizon)
+            except _BudgetExceeded:
+                # 视野为 1 时不会抛出，这里 actions 一定已有结果
+                break
+            if not self.truncated:
+                break
+        return {self._format_action(action, game_state): value for action, value in actions}
+
+    def decide(self, game_state):
+        """返回期望胜率最高的行动"""
+        values = self.action_values(game_state)
+        return max(values, key=values.get)
@@ -0,0 +1,108 @@
+import copy
+import threading
+
+from src.cache import canonical_state
+
+
+def dealer_outcomes(state, max_shots=2):
+    """庄家回合之后重新轮到玩家时的可能状态，按概率从大到小返回 [(概率, 状态)]
+
+    假设庄家不使用道具，子弹数量多的一方决定射击目标（实弹多射玩家，空包弹多射自己，相同时各一半），
+    射自己为空包弹时继续射击，最多 max_shots 发。本轮结束或需要重新装弹的分支无法预测，不包括在内。
+    """
+    outcomes = {}
+
+    def expand(current, probability, shots):
+        counts = current["bullet_types"]
+        if counts["live_shell"] + counts["blank"] == 0:
+            return
+        belief = current.get("belief")
+        if belief is not None:
+            p_live = belief.live_probability(0)
+        else:
+            p_live = counts["live_shell"] / (counts["live_shell"] + counts["blank"])
+        if counts["live_shell"] > counts["blank"]:
+            targets = [("player", 1.0)]
+        elif counts["live_shell"] < counts["blank"]:
+            targets = [("dealer", 1.0)]
+        else:
+            targets = [("player", 0.5), ("dealer", 0.5)]
+        for target, p_target in targets:
+            for is_live, p_shell in ((True, p_live), (False, 1.0 - p_live)):
+                p = probability * p_target * p_shell
+                if p <= 0:
+                    continue
+                following = copy.deepcopy(current)
+                # 与 TextEnv.update_single_bullet 相同：逆转后显示的类型与计数的类型相反
+                inverted = belief is not None and belief.inverted
+                following["bullet_types"]["live_shell" if is_live != inverted else "blank"] -= 1
+                if following.get("belief") is not None:
+                    following["belief"].eject(is_live)
+                if is_live:
+                    health = "player_health" if target == "player" else "dealer_health"
+                    following[health] -= 1
+                    if following[health] <= 0:
+                        continue
+                elif target == "dealer":
+                    if shots + 1 < max_shots:
+                        expand(following, p, shots + 1)
+                    continue
+                following_counts = following["bullet_types"]
+                if following_counts["live_shell"] + following_counts["blank"] == 0:
+                    continue
+                key = canonical_state(following)
+                previous = outcomes.get(key)
+                outcomes[key] = (p + (previous[0] if previous else 0.0), following)
+
+    expand(copy.deepcopy(state), 1.0, 0)
+    return sorted(outcomes.values(), key=lambda outcome: -outcome[0])
+
+
+def speculative_states(state, target, is_live, use_info, top_k=2):
+    """玩家射击之后最可能的 top_k 个下一次决策的状态 [(概率, 状态)]
+
+    state 是射出这一发之后的环境状态（子弹数量和信念已更新，生命值要到重新轮到玩家时才更新），
+    target 为 self 或 dealer，is_live 为这一发是否为实弹，use_info 为射击前的道具使用信息。
+    接下来不是庄家行动（射自己为空包弹、庄家被铐住）或本轮已结束时返回空列表。
+    """
+    if "手铐" in use_info:
+        return []
+    state = copy.deepcopy(state)
+    if is_live:
+        health = "player_health" if target == "self" else "dealer_health"
+        state[health] -= 2 if "手锯" in use_info else 1
+        if state[health] <= 0:
+            return []
+    elif target == "self":
+        return []
+    return dealer_outcomes(state)[:top_k]
+
+
+class Speculation:
+    """一次庄家回合期间发出的推测请求：规范化状态 -> (推测时的上下文, future 或 task)
+
+    claim 之后不再接受新的推测，与实际状态一致的那个返回给调用方，其余交给调用方取消。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.candidates = {}
+        self.closed = False
+        self.task = None
+
+    def add(self, state, context, future):
+        """登记一个推测请求，已经 claim 过时返回 False"""
+        with self.lock:
+            if self.closed:
+                return False
+            self.candidates[canonical_state(state)] = (context, future)
+            return True
+
+    def claim(self, state):
+        """返回 (与 state 一致的推测或 None, 其余的推测列表)"""
+        with self.lock:
+            self.closed = True
+            hit = self.candidates.pop(canonical_state(state), None) if state is not None else None
+            rest = list(self.candidates.values())
+            self.candidates.clear()
+        return hit, rest
@@ -0,0 +1,196 @@
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import yaml
+
+from src.batch import play_one
+from src.model import model_provider
+
+# 参赛者配置中属于参赛者本身、不传给处理器的字段
+ENTRANT_FIELDS = ("name", "price")
+
+
+def wilson_interval(wins, games, z=1.96):
+    """胜率的 Wilson 置信区间（默认 95%）"""
+    if games == 0:
+        return 0.0, 0.0
+    p = wins / games
+    denominator = 1 + z * z / games
+    center = (p + z * z / (2 * games)) / denominator
+    half = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denominator
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def entrant_config(config, entrant):
+    """把参赛者的字段合并到公共配置中，得到该参赛者每局使用的配置"""
+    merged = {key: value for key, value in config.items() if key not in ("entrants", "provider_limits")}
+    merged.update({key: value for key, value in entrant.items() if key not in ENTRANT_FIELDS})
+    merged["log_dir"] = os.path.join(config.get("log_dir", "/tmp"), entrant["name"])
+    return merged
+
+
+def load_checkpoint(path):
+    """读取已完成的对局，返回 {(参赛者, 局编号): 结果}"""
+    done = {}
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # 中断时可能留下写了一半的最后一行
+                    continue
+                done[(result["entrant"], result["game_id"])] = result
+    return done
+
+
+def game_cost(result, price):
+    """按每百万 token 的价格计算一局的费用"""
+    tokens = result.get("tokens") or {}
+    if not price:
+        return 0.0
+    return (
+        (tokens.get("prompt_tokens") or 0) * price.get("prompt", 0.0)
+        + (tokens.get("completion_tokens") or 0) * price.get("completion", 0.0)
+    ) / 1_000_000
+
+
+def aggregate(config, results):
+    """按参赛者汇总胜率（含置信区间）、平均轮数、决策数、token 和费用"""
+    summary = []
+    for entrant in config["entrants"]:
+        rows = [r for r in results if r["entrant"] == entrant["name"]]
+        games = len(rows)
+        wins = sum(1 for r in rows if r["result"] == "win")
+        low, high = wilson_interval(wins, games)
+        tokens = [
+            (r.get("tokens") or {}).get("prompt_tokens", 0) + (r.get("tokens") or {}).get("completion_tokens", 0)
+            for r in rows
+        ]
+        summary.append({
+            "entrant": entrant["name"],
+            "model": entrant["model"],
+            "games": games,
+            "wins": wins,
+            "win_rate": wins / games if games else 0.0,
+            "win_rate_ci": [low, high],
+            "errors": sum(1 for r in rows if r["error"]),
+            "avg_rounds": sum(r["rounds"] for r in rows) / games if games else 0.0,
+            "avg_turns": sum(r["decisions"] for r in rows) / games if games else 0.0,
+            "avg_tokens": sum(tokens) / games if games else 0.0,
+            "cost_per_game": sum(game_cost(r, entrant.get("price")) for r in rows) / games if games else 0.0,
+            "avg_game_time": sum(r["wall_time"] for r in rows) / games if games else 0.0,
+        })
+    return summary
+
+
+def print_summary(summary):
+    print(f"{'entrant':<24}{'games':>6}{'win%':>8}{'95% CI':>16}{'turns':>8}{'tokens':>10}{'cost':>10}")
+    for row in summary:
+        low, high = row["win_rate_ci"]
+        print(
+            f"{row['entrant']:<24}{row['games']:>6}{row['win_rate'] * 100:>7.1f}%"
+            f"{f'[{low * 100:.1f}, {high * 100:.1f}]':>16}{row['avg_turns']:>8.1f}"
+            f"{row['avg_tokens']:>10.0f}{row['cost_per_game']:>10.4f}"
+        )
+
+
+def run_tournament(config, restart=False):
+    """对每个参赛者进行 games 局相同种子的对局，返回汇总结果
+
+    所有对局在 workers 个进程中进行，provider_limits 限制每个服务商同时进行的对局数
+    （本地策略不受限制）。每局结束后追加写入 checkpoint，中断后再次运行会跳过已完成的对局。
+    """
+    names = [entrant["name"] for entrant in config["entrants"]]
+    if len(set(names)) != len(names):
+        raise ValueError("参赛者名称不能重复")
+    games = config.get("games", 10)
+    workers = config.get("workers", 4)
+    limits = config.get("provider_limits", {})
+    if any(limit < 1 for limit in limits.values()):
+        raise ValueError("provider_limits 必须大于 0")
+    checkpoint = config.get("checkpoint")
+    if restart and checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    done = load_checkpoint(checkpoint)
+
+    configs = {entrant["name"]: entrant_config(config, entrant) for entrant in config["entrants"]}
+    for entrant_cfg in configs.values():
+        os.makedirs(entrant_cfg["log_dir"], exist_ok=True)
+    # 按局编号交错排列，使各参赛者的进度大致同步
+    pending = [
+        (entrant["name"], game_id)
+        for game_id in range(games)
+        for entrant in config["entrants"]
+        if (entrant["name"], game_id) not in done
+    ]
+    providers = {name: model_provider(cfg["model"]) for name, cfg in configs.items()}
+    print(f"共 {len(pending) + len(done)} 局，已完成 {len(done)} 局")
+
+    results = list(done.values())
+    running = {}
+    in_flight = {}
+    start_time = time.time()
+    out_file = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                # 在总并发数和各服务商的并发上限内提交尽可能多的对局
+                for job in list(pending):
+                    if len(running) >= workers:
+                        break
+                    provider = providers[job[0]]
+                    limit = limits.get(provider)
+                    if provider != "local" and limit is not None and in_flight.get(provider, 0) >= limit:
+                        continue
+                    pending.remove(job)
+                    in_flight[provider] = in_flight.get(provider, 0) + 1
+                    running[executor.submit(play_one, configs[job[0]], job[1])] = job
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, game_id = running.pop(future)
+                    in_flight[providers[name]] -= 1
+                    result = future.result()
+                    result["entrant"] = name
+                    results.append(result)
+                    print(
+                        f"[{len(results)}/{len(results) + len(pending) + len(running)}] {name} game {game_id}: "
+                        f"{result['result']}, decisions={result['decisions']}, time={result['wall_time']:.1f}s"
+                        + (f", error={result['error']}" if result["error"] else "")
+                    )
+                    if out_file:
+                        out_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        out_file.flush()
+    finally:
+        if out_file:
+            out_file.close()
+
+    summary = aggregate(config, results)
+    print_summary(summary)
+    print(f"用时 {time.time() - start_time:.1f}s")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较多个模型和策略的锦标赛")
+    parser.add_argument("--config", type=str, default="config/tournament.yaml", help="锦标赛配置文件")
+    parser.add_argument("--restart", action="store_true", help="忽略已有的 checkpoint，从头开始")
+    parser.add_argument("--output", type=str, default=None, help="汇总结果的 JSON 输出路径（可选）")
+    args = parser.parse_args()
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    summary = run_tournament(config, restart=args.restart)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.environment.log_sink import LogSink
+
+
+class Span:
+    """一段计时区间，作为上下文管理器使用，结束时交给 Tracer 记录"""
+
+    __slots__ = ("tracer", "name", "attrs", "parent", "start", "duration", "_token")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+        self.start = 0.0
+        self.duration = 0.0
+
+    def set(self, **attrs):
+        """补充属性，例如调用结束后才知道的 token 数"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack.get()
+        self.parent = stack[-1].name if stack else None
+        self._token = self.tracer._stack.set(stack + (self,))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        self.tracer._stack.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._finish(self)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTracer:
+    """关闭追踪时使用，所有操作都是空操作"""
+
+    enabled = False
+
+    def span(self, name, **attrs):
+        return _NULL_SPAN
+
+    def count(self, name, value=1, **labels):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class Tracer:
+    """记录 span 和计数器，并交给各个导出器
+
+    每个 span 结束时导出一条记录（名称、父 span、开始时间、耗时和属性），同时按名称累计
+    次数和总耗时；计数器按 (名称, 标签) 累计。两者都可以通过 metrics() 或 Prometheus 文本格式读取。
+    """
+
+    enabled = True
+
+    def __init__(self, exporters=()):
+        self.exporters = list(exporters)
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.span_stats = {}
+        # 当前线程/协程中正在进行的 span，同一事件循环中并发的多局游戏各自维护父子关系
+        self._stack = contextvars.ContextVar(f"tracer_stack_{id(self)}", default=())
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    def count(self, name, value=1, **labels):
+        """累加计数器，labels 为附加的标签"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def _finish(self, span):
+        with self.lock:
+            stats = self.span_stats.setdefault(span.name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += span.duration
+        if self.exporters:
+            record = {
+                "span": span.name,
+                "parent": span.parent,
+                "start": time.time() - span.duration,
+                "duration": span.duration,
+                "pid": os.getpid(),
+            }
+            record.update(span.attrs)
+            for exporter in self.exporters:
+                exporter.export(record)
+
+    def metrics(self):
+        """返回计数器和各 span 的次数与总耗时"""
+        with self.lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.counters.items()
+                ],
+                "spans": {
+                    name: {"count": count, "seconds": seconds}
+                    for name, (count, seconds) in self.span_stats.items()
+                },
+            }
+
+    def prometheus_text(self):
+        """以 Prometheus 文本格式输出指标"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            spans = sorted(self.span_stats.items())
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f"br_{name}_total"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} counter")
+                seen.add(metric)
+            label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        if spans:
+            lines.append("# TYPE br_span_seconds summary")
+            for name, (count, seconds) in spans:
+                lines.append(f'br_span_seconds_count{{span="{name}"}} {count}')
+                lines.append(f'br_span_seconds_sum{{span="{name}"}} {seconds}')
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """导出最终的计数器并关闭导出器"""
+        for exporter in self.exporters:
+            exporter.close(self)
+
+
+class JsonlExporter:
+    """把 span 记录以 JSONL 形式写入文件，关闭时追加一条计数器汇总
+
+    写入由 LogSink 在后台线程完成。path 中的 {pid} 会替换为进程号，便于批量运行时每个进程单独写入。
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path.format(pid=os.getpid())
+        self.sink = LogSink(self.path, flush_interval=flush_interval, max_bytes=0)
+
+    def export(self, record):
+        self.sink.write(json.dumps(record, ensure_ascii=False))
+
+    def close(self, tracer):
+        summary = tracer.metrics()
+        summary["span"] = "summary"
+        summary["pid"] = os.getpid()
+        self.sink.write(json.dumps(summary, ensure_ascii=False))
+        self.sink.close()
+
+
+class PrometheusExporter:
+    """在后台线程中提供 Prometheus 抓取端点 /metrics
+
+    端口被占用时（例如批量运行时多个进程）依次尝试后续端口，实际地址见 address。
+    """
+
+    def __init__(self, tracer, host="127.0.0.1", port=9464, max_port_tries=64):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        for offset in range(max_port_tries):
+            try:
+                self.server = ThreadingHTTPServer((host, port + offset if port else 0), Handler)
+                break
+            except OSError:
+                if not port or offset == max_port_tries - 1:
+                    raise
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def export(self, record):
+        pass
+
+    def close(self, tracer):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_tracer(options):
+    """根据配置创建 Tracer，options 为空时返回 NULL_TRACER
+
+    options 支持 jsonl（JSONL 文件路径）、prometheus_port 和 prometheus_host。
+    """
+    if not options:
+        return NULL_TRACER
+    tracer = Tracer()
+    if options.get("jsonl"):
+        tracer.exporters.append(JsonlExporter(options["jsonl"]))
+    if options.get("prometheus_port") is not None:
+        exporter = PrometheusExporter(
+            tracer,
+            host=options.get("prometheus_host", "127.0.0.1"),
+            port=options["prometheus_port"],
+        )
+        tracer.exporters.append(exporter)
+        print(f"Prometheus 指标端点: http://{exporter.address[0]}:{exporter.address[1]}/metrics")
+    return tracer
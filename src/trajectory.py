@@ -0,0 +1,210 @@
+import gzip
+import json
+import os
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+TRAJECTORY_FORMATS = ("auto", "parquet", "arrow", "jsonl")
+FORMAT_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow", "jsonl": ".jsonl.gz"}
+
+# 每次决策一行：决策前的状态、模型调用、行动、行动后的结果、耗时和本局结果
+COLUMNS = [
+    ("game_id", "int64"),
+    ("worker", "int64"),
+    ("decision", "int64"),
+    ("round", "int64"),
+    ("model", "string"),
+    ("source", "string"),
+    ("player_health", "int64"),
+    ("dealer_health", "int64"),
+    ("max_health", "int64"),
+    ("live_shells", "int64"),
+    ("blank_shells", "int64"),
+    ("player_items", "list<string>"),
+    ("dealer_items", "list<string>"),
+    ("live_probabilities", "list<double>"),
+    ("use_info", "string"),
+    ("state", "string"),
+    ("llm_calls", "int64"),
+    ("prompt_tokens", "int64"),
+    ("completion_tokens", "int64"),
+    ("cached_tokens", "int64"),
+    ("response", "string"),
+    ("action", "string"),
+    ("player_health_after", "int64"),
+    ("dealer_health_after", "int64"),
+    ("reloaded", "bool"),
+    ("model_time", "double"),
+    ("env_time", "double"),
+    ("parse_time", "double"),
+    ("game_result", "string"),
+    ("game_error", "string"),
+]
+
+
+def _arrow_type(name):
+    if name.startswith("list<"):
+        return pa.list_(_arrow_type(name[5:-1]))
+    return {"int64": pa.int64(), "double": pa.float64(), "string": pa.string(), "bool": pa.bool_()}[name]
+
+
+def arrow_schema():
+    return pa.schema([(name, _arrow_type(type_name)) for name, type_name in COLUMNS])
+
+
+def state_columns(state):
+    """决策前状态的列：常用字段单独成列，完整状态（信念状态换成每一发的实弹概率）以 JSON 保存"""
+    belief = state.get("belief")
+    probabilities = belief.probabilities() if belief is not None else None
+    snapshot = {key: value for key, value in state.items() if key != "belief"}
+    snapshot["live_probabilities"] = probabilities
+    return {
+        "player_health": state["player_health"],
+        "dealer_health": state["dealer_health"],
+        "max_health": state["max_health"],
+        "live_shells": state["bullet_types"]["live_shell"],
+        "blank_shells": state["bullet_types"]["blank"],
+        "player_items": list(state["player_items"]),
+        "dealer_items": list(state["dealer_items"]),
+        "live_probabilities": probabilities,
+        "use_info": state["use_info"],
+        "state": json.dumps(snapshot, ensure_ascii=False),
+    }
+
+
+def resolve_format(fmt):
+    """auto 在安装了 pyarrow 时使用 parquet，否则使用 gzip 压缩的 JSONL"""
+    if fmt not in TRAJECTORY_FORMATS:
+        raise ValueError(f"Unsupported trajectory format: {fmt}")
+    if fmt == "auto":
+        return "parquet" if pa is not None else "jsonl"
+    if fmt != "jsonl" and pa is None:
+        raise ImportError(f"trajectory format {fmt} requires pyarrow")
+    return fmt
+
+
+class TrajectoryWriter:
+    """把每次决策的记录分批写入一个文件
+
+    parquet 每批写为一个行组，arrow 每批写为一个 Arrow IPC 记录批，jsonl 每批追加一个 gzip 段。
+    parquet 和 arrow 文件在 close 之后才完整可读。
+    """
+
+    def __init__(self, path, format="auto", batch_size=1024):
+        self.format = resolve_format(format)
+        extension = FORMAT_EXTENSIONS[self.format]
+        self.path = path if path.endswith(extension) else path + extension
+        self.batch_size = batch_size
+        self.rows = []
+        self.written = 0
+        self.lock = threading.Lock()
+        self._writer = None
+        self._sink = None
+
+    def write_game(self, rows, result, game_id=None):
+        """写入一局的所有决策，补上局编号、进程号和本局结果"""
+        for row in rows:
+            row.update({
+                "game_id": game_id,
+                "worker": os.getpid(),
+                "game_result": result.get("result"),
+                "game_error": result.get("error"),
+            })
+        with self.lock:
+            self.rows.extend(rows)
+            if len(self.rows) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        rows, self.rows = self.rows, []
+        if not rows:
+            return
+        if self.format == "jsonl":
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            schema = arrow_schema()
+            table = pa.Table.from_pylist(rows, schema=schema)
+            if self._writer is None:
+                if self.format == "parquet":
+                    self._writer = pq.ParquetWriter(self.path, schema, compression="zstd")
+                else:
+                    self._sink = pa.OSFile(self.path, "wb")
+                    self._writer = pa.ipc.new_file(self._sink, schema)
+            self._writer.write_table(table)
+        self.written += len(rows)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if self._sink is not None:
+                self._sink.close()
+                self._sink = None
+
+
+def trajectory_files(path):
+    """path 为文件时返回它本身，为目录时返回其中所有轨迹文件"""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.endswith(tuple(FORMAT_EXTENSIONS.values()))
+    )
+
+
+def _read_jsonl(path):
+    rows = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            rows.append(json.loads(line))
+    return rows
+
+
+def load_trajectories(path, columns=None):
+    """读取轨迹文件或目录，返回 pyarrow.Table
+
+    parquet 和 arrow 文件以内存映射方式读取（arrow 为零拷贝），columns 可以只读取部分列。
+    没有安装 pyarrow 时只能读取 jsonl 文件，返回字典列表。
+    """
+    files = trajectory_files(path)
+    if pa is None:
+        rows = []
+        for file in files:
+            if not file.endswith(FORMAT_EXTENSIONS["jsonl"]):
+                raise ImportError(f"reading {file} requires pyarrow")
+            rows.extend(_read_jsonl(file))
+        if columns is not None:
+            rows = [{name: row.get(name) for name in columns} for row in rows]
+        return rows
+
+    schema = arrow_schema()
+    tables = []
+    for file in files:
+        if file.endswith(FORMAT_EXTENSIONS["parquet"]):
+            table = pq.read_table(file, columns=columns, memory_map=True)
+        elif file.endswith(FORMAT_EXTENSIONS["arrow"]):
+            table = pa.ipc.open_file(pa.memory_map(file, "r")).read_all()
+            if columns is not None:
+                table = table.select(columns)
+        else:
+            table = pa.Table.from_pylist(_read_jsonl(file), schema=schema)
+            if columns is not None:
+                table = table.select(columns)
+        tables.append(table)
+    if not tables:
+        return schema.empty_table() if columns is None else schema.empty_table().select(columns)
+    return pa.concat_tables(tables)